@@ -11,14 +11,38 @@ from api.models import models
 # Enregistrement des modèles de base
 admin.site.register([
     Utilisateur, Client, Fournisseur, Commande, LigneCommande,
-    MouvementStock, Categorie, Taxe, Produit, Statistique
+    Categorie, Taxe, Statistique
 ])
 
 # Admin produit (exemple d’exclusion de champ)
+@admin.register(Produit)
 class ProduitAdmin(admin.ModelAdmin):
     exclude = ('reference',)
     list_display = ('designation', 'reference', 'prix_vente', 'quantite_stock')
 
+    def get_readonly_fields(self, request, obj=None):
+        # Stock initial saisi à la création, ensuite modifié par les mouvements de stock
+        return ('quantite_stock',) if obj is not None else ()
+
+    def save_model(self, request, obj, form, change):
+        obj.save(utilisateur=request.user)
+
+
+# Journal de stock en ajout seul : consultation et nouveaux mouvements
+# (ajustements) seulement, ni modification ni suppression
+@admin.register(MouvementStock)
+class MouvementStockAdmin(admin.ModelAdmin):
+    list_display = ('date_mouvement', 'produit', 'type_mouvement', 'quantite', 'utilisateur')
+    list_filter = ('type_mouvement',)
+    search_fields = ('produit__designation', 'produit__reference')
+    raw_id_fields = ('produit', 'utilisateur', 'commande', 'fournisseur')
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 
 # INLINE : Détail d’une commande client (affichage simple)
 class LigneCommandeClientInline(admin.TabularInline):
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.utils.previsions import calculer_previsions
+
+class Command(BaseCommand):
+    help = (
+        "Prévoit la demande de chaque produit (lissage exponentiel hebdomadaire) et enregistre "
+        "point de commande et quantité suggérée (à lancer chaque nuit)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--semaines', type=int, default=12, help="Semaines d'historique (défaut: 12, minimum 2)")
+        parser.add_argument('--delai', type=int, default=7, help="Délai de réapprovisionnement en jours (défaut: 7)")
+        parser.add_argument(
+            '--couverture', type=int, default=14,
+            help="Jours de ventes couverts par une commande, en plus du délai (défaut: 14)"
+        )
+        parser.add_argument('--service', type=float, default=0.95, help="Taux de service visé (défaut: 0.95)")
+
+    def handle(self, *args, **options):
+        if options['semaines'] < 2:
+            raise CommandError("Il faut au moins 2 semaines d'historique")
+        if options['delai'] < 1 or options['couverture'] < 0:
+            raise CommandError("Délai (>= 1) ou couverture (>= 0) invalide")
+        if not 0.5 <= options['service'] < 1:
+            raise CommandError("Le taux de service doit être compris entre 0.5 et 1 (exclu)")
+
+        nb_produits = calculer_previsions(
+            semaines=options['semaines'], delai=options['delai'],
+            couverture=options['couverture'], service=options['service']
+        )
+        self.stdout.write(self.style.SUCCESS(f"Prévisions calculées pour {nb_produits} produits"))
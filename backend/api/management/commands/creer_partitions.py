@@ -0,0 +1,48 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api.utils.partitions import (
+    TABLES_PARTITIONNEES, creer_partition, detacher_partition, est_partitionnee,
+    nom_partition, partitions, premier_du_mois
+)
+
+class Command(BaseCommand):
+    help = 'Crée les partitions mensuelles à venir (à lancer chaque mois) et détache les mois archivés'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mois', type=int, default=3,
+            help="Nombre de mois à préparer après le mois courant (défaut: 3)"
+        )
+        parser.add_argument(
+            '--detacher-avant', metavar='AAAA-MM',
+            help="Détache les partitions des mois antérieurs à celui-ci (tables conservées)"
+        )
+
+    def handle(self, *args, **options):
+        limite = None
+        if options['detacher_avant']:
+            try:
+                limite = datetime.strptime(options['detacher_avant'], '%Y-%m').date()
+            except ValueError as e:
+                raise CommandError(f"Mois invalide: {e}")
+
+        mois_courant = premier_du_mois(timezone.localdate())
+        for table in TABLES_PARTITIONNEES:
+            if not est_partitionnee(table):
+                self.stdout.write(self.style.WARNING(f"{table} n'est pas partitionnée, ignorée"))
+                continue
+
+            for decalage in range(options['mois'] + 1):
+                mois = premier_du_mois(mois_courant, decalage)
+                if creer_partition(table, mois):
+                    self.stdout.write(f"Partition {nom_partition(table, mois)} créée")
+
+            if limite:
+                for mois, nom in partitions(table):
+                    if mois < limite:
+                        detacher_partition(table, mois)
+                        self.stdout.write(f"Partition {nom} détachée")
+
+        self.stdout.write(self.style.SUCCESS('Partitions à jour'))
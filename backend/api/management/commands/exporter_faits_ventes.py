@@ -0,0 +1,42 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from api.utils.export_colonnes import FORMATS_COLONNES, exporter_jours, pyarrow_disponible
+
+class Command(BaseCommand):
+    help = (
+        "Exporte la table de faits des ventes (lignes + commande, client, produit, vendeur) "
+        "en Parquet ou Arrow, une partition par jour, seuls les jours absents étant écrits (à lancer chaque nuit)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('dossier', help="Dossier de destination (partitions date=AAAA-MM-JJ)")
+        parser.add_argument('--format', dest='format_fichier', choices=list(FORMATS_COLONNES), default='parquet')
+        parser.add_argument('--depuis', help="Premier jour (AAAA-MM-JJ, défaut: lendemain du dernier exporté)")
+        parser.add_argument('--jusqu-a', help="Dernier jour (AAAA-MM-JJ, défaut: hier)")
+        parser.add_argument(
+            '--reecrire', action='store_true',
+            help="Réécrit les jours déjà exportés de la période (corrections tardives)"
+        )
+
+    def handle(self, *args, **options):
+        if not pyarrow_disponible():
+            raise CommandError("pyarrow n'est pas installé (pip install pyarrow)")
+
+        try:
+            debut, fin = (
+                datetime.strptime(options[nom], '%Y-%m-%d').date() if options[nom] else None
+                for nom in ('depuis', 'jusqu_a')
+            )
+        except ValueError as e:
+            raise CommandError(f"Date invalide: {e}")
+
+        ecrits = exporter_jours(
+            options['dossier'], debut, fin,
+            format_fichier=options['format_fichier'], reecrire=options['reecrire']
+        )
+        for jour, nb_lignes in ecrits:
+            self.stdout.write(f"{jour.strftime('%d/%m/%Y')} : {nb_lignes} lignes")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(ecrits)} jours exportés ({sum(nb for _, nb in ecrits)} lignes)"
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.models import Utilisateur
+from api.utils.reapprovisionnement import generer_commandes_reappro
+
+class Command(BaseCommand):
+    help = (
+        "Crée une commande fournisseur BROUILLON par fournisseur pour les produits sous leur "
+        "point de commande (à lancer après calculer_previsions ; sans effet si relancé)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('utilisateur', help="Nom d'utilisateur créateur des commandes")
+
+    def handle(self, *args, **options):
+        try:
+            utilisateur = Utilisateur.objects.get(username=options['utilisateur'])
+        except Utilisateur.DoesNotExist:
+            raise CommandError(f"Utilisateur inconnu : {options['utilisateur']}")
+
+        resultat = generer_commandes_reappro(utilisateur)
+        if resultat['sans_fournisseur']:
+            ids = ', '.join(map(str, resultat['sans_fournisseur'][:20]))
+            suite = '...' if len(resultat['sans_fournisseur']) > 20 else ''
+            self.stdout.write(self.style.WARNING(
+                f"{len(resultat['sans_fournisseur'])} produits sans fournisseur connu ignorés (ids: {ids}{suite})"
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultat['lignes']} lignes réparties sur {len(resultat['commandes'])} commandes "
+            f"brouillon ({resultat['creees']} nouvelles)"
+        ))
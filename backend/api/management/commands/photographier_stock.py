@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api.utils.inventaire import photographier_stock
+
+class Command(BaseCommand):
+    help = "Photographie le stock de fin de journée de chaque produit (à lancer chaque nuit)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Jour à photographier (AAAA-MM-JJ, défaut: hier)")
+
+    def handle(self, *args, **options):
+        try:
+            jour = (
+                datetime.strptime(options['date'], '%Y-%m-%d').date()
+                if options['date'] else timezone.localdate() - timedelta(days=1)
+            )
+        except ValueError as e:
+            raise CommandError(f"Date invalide: {e}")
+
+        nb_produits = photographier_stock(jour)
+        self.stdout.write(self.style.SUCCESS(
+            f"Stock du {jour.strftime('%d/%m/%Y')} photographié ({nb_produits} produits)"
+        ))
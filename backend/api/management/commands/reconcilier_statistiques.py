@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.models import Statistique
+from api.utils.statistics import recalculer_rollups
+
+class Command(BaseCommand):
+    help = 'Recalcule les statistiques des derniers jours pour corriger les écarts des mises à jour incrémentales'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--jours', type=int, default=2,
+            help="Nombre de jours à recalculer, aujourd'hui compris (défaut: 2)"
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        for decalage in range(options['jours']):
+            jour = today - timedelta(days=decalage)
+            Statistique.update_daily_stats(jour)
+            self.stdout.write(f"Statistiques du {jour.strftime('%d/%m/%Y')} recalculées")
+
+        if options['jours'] > 0:
+            recalculer_rollups(today - timedelta(days=options['jours'] - 1), today)
+            self.stdout.write("Rollups horaires et mensuels recalculés")
+
+        self.stdout.write(self.style.SUCCESS('Statistiques réconciliées avec succès'))
@@ -0,0 +1,103 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+# Les fonctions exécutées par les workers n'importent les modèles qu'à
+# l'intérieur : en mode "spawn" (Windows, macOS) Django doit d'abord être
+# initialisé dans le processus fils.
+
+def _initialiser_worker():
+    import django
+    django.setup()
+
+
+def _calculer_lot(bornes):
+    from api.utils.statistics import calculer_statistiques, calculer_ventes_horaires
+    return calculer_statistiques(*bornes), calculer_ventes_horaires(*bornes)
+
+
+def _decouper(debut, fin, taille_lot):
+    """Découpe [debut, fin] en lots de `taille_lot` jours"""
+    lots = []
+    while debut <= fin:
+        fin_lot = min(debut + timedelta(days=taille_lot - 1), fin)
+        lots.append((debut, fin_lot))
+        debut = fin_lot + timedelta(days=1)
+    return lots
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit les statistiques (heure, jour, mois) sur une période, en parallèle par lots de jours'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--debut', required=True, help='Premier jour (AAAA-MM-JJ)')
+        parser.add_argument('--fin', help="Dernier jour (AAAA-MM-JJ, défaut: aujourd'hui)")
+        parser.add_argument(
+            '--workers', type=int, default=min(4, os.cpu_count() or 1),
+            help='Nombre de processus de calcul (1 = sans parallélisme)'
+        )
+        parser.add_argument(
+            '--taille-lot', type=int, default=31,
+            help='Nombre de jours calculés par lot (défaut: 31)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            debut = datetime.strptime(options['debut'], '%Y-%m-%d').date()
+            fin = (
+                datetime.strptime(options['fin'], '%Y-%m-%d').date()
+                if options['fin'] else timezone.localdate()
+            )
+        except ValueError as e:
+            raise CommandError(f"Date invalide: {e}")
+
+        if debut > fin:
+            raise CommandError("La date de début doit être antérieure à la date de fin")
+        if options['taille_lot'] < 1 or options['workers'] < 1:
+            raise CommandError("--taille-lot et --workers doivent être positifs")
+
+        lots = _decouper(debut, fin, options['taille_lot'])
+
+        executor = None
+        if options['workers'] > 1 and len(lots) > 1:
+            # Les processus fils ouvrent leurs propres connexions
+            connections.close_all()
+            executor = ProcessPoolExecutor(
+                max_workers=options['workers'],
+                initializer=_initialiser_worker
+            )
+            resultats = executor.map(_calculer_lot, lots)
+        else:
+            resultats = map(_calculer_lot, lots)
+
+        from api.models import Statistique
+        from api.utils.statistics import (
+            enregistrer_statistiques, enregistrer_ventes_horaires, reconstruire_statistiques_mensuelles
+        )
+
+        nb_jours = 0
+        try:
+            with transaction.atomic():
+                for (debut_lot, fin_lot), (lignes, heures) in zip(lots, resultats):
+                    enregistrer_statistiques(lignes)
+                    enregistrer_ventes_horaires(debut_lot, fin_lot, heures)
+                    nb_jours += len(lignes)
+                    self.stdout.write(
+                        f"Lot du {debut_lot.strftime('%d/%m/%Y')} au {fin_lot.strftime('%d/%m/%Y')} enregistré"
+                    )
+
+                # La photo du stock n'existe que pour aujourd'hui
+                if debut <= timezone.localdate() <= fin:
+                    Statistique.update_daily_stats()
+
+                # Les mois sont agrégés depuis les lignes quotidiennes à jour
+                reconstruire_statistiques_mensuelles(debut, fin)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(f'{nb_jours} jours de statistiques reconstruits'))
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from api.tasks import (
+    executer_tache, nom_worker, prendre_tache, purger_taches, rendre_tache, reprendre_taches_orphelines
+)
+
+class Command(BaseCommand):
+    help = "Worker des rapports en arrière-plan : traite la file TacheRapport (un ou plusieurs processus)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalle', type=float, default=2,
+            help="Secondes d'attente quand la file est vide (défaut: 2)"
+        )
+        parser.add_argument(
+            '--une-fois', action='store_true',
+            help="Vide la file puis s'arrête (cron) au lieu de tourner en continu"
+        )
+        parser.add_argument(
+            '--conserver', type=int, default=7,
+            help="Jours de conservation des rapports terminés (défaut: 7)"
+        )
+
+    def handle(self, *args, **options):
+        worker = nom_worker()
+        supprimees = purger_taches(options['conserver'])
+        if supprimees:
+            self.stdout.write(f"{supprimees} anciennes tâches supprimées")
+        self.stdout.write(f"Worker {worker} démarré")
+
+        tache = None
+        try:
+            while True:
+                close_old_connections()
+                tache = prendre_tache(worker)
+                if tache is None:
+                    reprises = reprendre_taches_orphelines()
+                    if reprises:
+                        self.stdout.write(self.style.WARNING(f"{reprises} tâches orphelines remises en file"))
+                        continue
+                    if options['une_fois']:
+                        break
+                    time.sleep(options['intervalle'])
+                    continue
+
+                debut = time.monotonic()
+                executer_tache(tache)
+                message = f"Tâche {tache.pk} ({tache.type_rapport}) : {tache.get_statut_display()} en {time.monotonic() - debut:.1f} s"
+                if tache.statut == 'TERMINEE':
+                    self.stdout.write(self.style.SUCCESS(message))
+                else:
+                    self.stdout.write(self.style.ERROR(f"{message} - {tache.erreur}"))
+        except KeyboardInterrupt:
+            # Arrêt en plein calcul : la tâche repart tout de suite dans la file
+            if tache is not None and tache.statut == 'EN_COURS':
+                rendre_tache(tache)
+        self.stdout.write(f"Worker {worker} arrêté")
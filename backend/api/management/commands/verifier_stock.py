@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from api.models import Produit, MouvementStock
+
+class Command(BaseCommand):
+    help = 'Recalcule le stock de chaque produit depuis le journal des mouvements et signale les écarts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corriger', action='store_true',
+            help='Aligne quantite_stock sur le solde du journal pour les produits en écart'
+        )
+
+    def handle(self, *args, **options):
+        # Solde du journal par produit, en une requête groupée
+        solde_journal = (
+            MouvementStock.objects
+            .filter(produit=OuterRef('pk'))
+            .values('produit')
+            .annotate(solde=Sum(MouvementStock.expression_variation()))
+            .values('solde')
+        )
+        ecarts = list(
+            Produit.objects
+            .annotate(solde_journal=Coalesce(Subquery(solde_journal, output_field=IntegerField()), 0))
+            .exclude(quantite_stock=F('solde_journal'))
+            .values('id', 'reference', 'designation', 'quantite_stock', 'solde_journal')
+            .order_by('id')
+        )
+
+        for ecart in ecarts:
+            self.stdout.write(self.style.WARNING(
+                f"{ecart['reference']} {ecart['designation']}: stock {ecart['quantite_stock']}, "
+                f"journal {ecart['solde_journal']} "
+                f"(écart {ecart['quantite_stock'] - ecart['solde_journal']:+d})"
+            ))
+
+        if not ecarts:
+            self.stdout.write(self.style.SUCCESS('Stock conforme au journal des mouvements'))
+            return
+
+        if options['corriger']:
+            with transaction.atomic():
+                produits = []
+                for ecart in ecarts:
+                    produit = Produit(id=ecart['id'], quantite_stock=ecart['solde_journal'])
+                    produit.date_modification = timezone.now()
+                    produits.append(produit)
+                Produit.objects.bulk_update(produits, ['quantite_stock', 'date_modification'], batch_size=500)
+            self.stdout.write(self.style.SUCCESS(f'{len(ecarts)} produits alignés sur le journal'))
+        else:
+            self.stdout.write(self.style.ERROR(f'{len(ecarts)} produits en écart avec le journal'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_remove_client_siret'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='produit',
+            name='code_barre',
+            field=models.CharField(blank=True, db_index=True, max_length=50),
+        ),
+    ]
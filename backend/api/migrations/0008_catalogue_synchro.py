@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_produit_code_barre_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SuppressionCatalogue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modele', models.CharField(choices=[('produit', 'Produit'), ('taxe', 'Taxe'), ('categorie', 'Catégorie')], max_length=20)),
+                ('objet_id', models.BigIntegerField()),
+                ('date_suppression', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='categorie',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='produit',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='taxe',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
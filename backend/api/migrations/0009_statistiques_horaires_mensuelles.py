@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_catalogue_synchro'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatistiqueHoraire',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nb_ventes', models.IntegerField(default=0)),
+                ('nb_ventes_directes', models.IntegerField(default=0)),
+                ('nb_commandes_clients', models.IntegerField(default=0)),
+                ('montant_total', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('montant_ventes_directes', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('montant_commandes', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('periode', models.DateTimeField(unique=True)),
+            ],
+            options={
+                'verbose_name': 'Statistique horaire',
+                'ordering': ['-periode'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StatistiqueMensuelle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nb_ventes', models.IntegerField(default=0)),
+                ('nb_ventes_directes', models.IntegerField(default=0)),
+                ('nb_commandes_clients', models.IntegerField(default=0)),
+                ('montant_total', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('montant_ventes_directes', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('montant_commandes', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('periode', models.DateField(unique=True)),
+            ],
+            options={
+                'verbose_name': 'Statistique mensuelle',
+                'ordering': ['-periode'],
+            },
+        ),
+    ]
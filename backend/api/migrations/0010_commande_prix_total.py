@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:49
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import DecimalField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def calculer_prix_totaux(apps, schema_editor):
+    """Initialise le total stocké des commandes existantes"""
+    Commande = apps.get_model('api', 'Commande')
+    LigneCommande = apps.get_model('api', 'LigneCommande')
+    total_lignes = (
+        LigneCommande.objects
+        .filter(commande=OuterRef('pk'))
+        .values('commande')
+        .annotate(total=Sum('total_ligne_ht'))
+        .values('total')
+    )
+    Commande.objects.update(
+        prix_total=Coalesce(
+            Subquery(total_lignes), Decimal('0'),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_statistiques_horaires_mensuelles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='commande',
+            name='prix_total',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(calculer_prix_totaux, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:50
+
+import re
+
+from django.db import migrations
+
+# INCREMENT BY = api.utils.sequences.TAILLE_BLOC
+SEQUENCES = [
+    ('api_produit_reference_seq', 'Produit', 'reference'),
+    ('api_commandeclient_numero_seq', 'CommandeClient', 'numero_commande'),
+]
+TAILLE_BLOC = 50
+
+
+def creer_sequences(apps, schema_editor):
+    """Crée les séquences en démarrant après les numéros déjà attribués"""
+    for sequence, nom_modele, champ in SEQUENCES:
+        modele = apps.get_model('api', nom_modele)
+        dernier = 0
+        for valeur in modele.objects.values_list(champ, flat=True).iterator():
+            chiffres = re.search(r'(\d+)$', valeur or '')
+            if chiffres:
+                dernier = max(dernier, int(chiffres.group(1)))
+        schema_editor.execute(
+            f"CREATE SEQUENCE {sequence} INCREMENT BY {TAILLE_BLOC} START WITH {dernier + 1}"
+        )
+
+
+def supprimer_sequences(apps, schema_editor):
+    for sequence, _, _ in SEQUENCES:
+        schema_editor.execute(f"DROP SEQUENCE IF EXISTS {sequence}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_commande_prix_total'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_sequences, supprimer_sequences),
+    ]
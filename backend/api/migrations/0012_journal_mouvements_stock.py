@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, F, Sum, When
+from django.db.models.functions import Coalesce
+
+
+def ouvrir_journal(apps, schema_editor):
+    """
+    Ajustement d'ouverture pour chaque produit dont le stock ne correspond
+    pas à ses mouvements, afin que le journal parte d'un solde juste.
+    Insertion directe : le stock lui-même n'est pas modifié.
+    """
+    Produit = apps.get_model('api', 'Produit')
+    MouvementStock = apps.get_model('api', 'MouvementStock')
+    produits = Produit.objects.annotate(
+        solde_journal=Coalesce(Sum(Case(
+            When(mouvements__type_mouvement='sortie', then=-F('mouvements__quantite')),
+            default=F('mouvements__quantite'),
+        )), 0)
+    ).exclude(quantite_stock=F('solde_journal'))
+    MouvementStock.objects.bulk_create([
+        MouvementStock(
+            produit_id=produit.id,
+            type_mouvement='ajustement',
+            quantite=produit.quantite_stock - produit.solde_journal,
+            motif="Solde d'ouverture du journal",
+        )
+        for produit in produits
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_sequences_numerotation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mouvementstock',
+            name='utilisateur',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(ouvrir_journal, migrations.RunPython.noop),
+    ]
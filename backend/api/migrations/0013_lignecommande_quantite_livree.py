@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:54
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def initialiser_quantite_livree(apps, schema_editor):
+    """Les lignes déjà marquées livrées l'ont été en totalité"""
+    LigneCommande = apps.get_model('api', 'LigneCommande')
+    LigneCommande.objects.filter(statut_livraison='LIVREE').update(quantite_livree=F('quantite'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_journal_mouvements_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lignecommande',
+            name='quantite_livree',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(initialiser_quantite_livree, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_lignecommande_quantite_livree'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstantaneStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantite', models.IntegerField()),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='instantanes', to='api.produit')),
+            ],
+            options={
+                'verbose_name': 'Instantané de stock',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'produit'), name='unique_instantane_par_jour')],
+            },
+        ),
+    ]
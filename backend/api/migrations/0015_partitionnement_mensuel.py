@@ -0,0 +1,166 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:57
+
+from datetime import date, datetime, time
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+# Table -> colonne de partition (voir api.utils.partitions)
+TABLES = {
+    'api_mouvementstock': 'date_mouvement',
+    'api_commandeclient': 'date_creation',
+    'api_activitylog': 'timestamp',
+}
+MOIS_D_AVANCE = 3
+
+
+def _mois_suivant(mois):
+    return date(mois.year + mois.month // 12, mois.month % 12 + 1, 1)
+
+
+def _borne(mois):
+    return timezone.make_aware(datetime.combine(mois, time.min)).isoformat()
+
+
+def partitionner(apps, schema_editor):
+    """
+    Transforme chaque table en table partitionnée par mois (RANGE sur la
+    colonne de date) : nouvelle table, une partition par mois de données
+    jusqu'à MOIS_D_AVANCE mois après aujourd'hui, une partition par défaut,
+    copie des lignes puis recréation des index et clés étrangères.
+    La clé primaire devient (id, date) et l'id vient d'une séquence :
+    PostgreSQL impose la colonne de partition dans la clé primaire et
+    n'accepte pas de colonne IDENTITY sur une table partitionnée (< 17).
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    q = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for table, colonne in TABLES.items():
+            cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table])
+            if cursor.fetchone():
+                continue
+
+            # Définitions à recréer sur la table partitionnée (hors clé primaire)
+            cursor.execute(
+                "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+                [table, f"{table}_pkey"]
+            )
+            index = [definition.replace('CREATE UNIQUE INDEX', 'CREATE INDEX') for (definition,) in cursor.fetchall()]
+            cursor.execute(
+                "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+                [table]
+            )
+            cles_etrangeres = cursor.fetchall()
+            cursor.execute(f"SELECT MIN({q(colonne)}), COALESCE(MAX(id), 0) FROM {q(table)}")
+            plus_ancienne, dernier_id = cursor.fetchone()
+
+            ancienne = f"{table}_ancien"
+            cursor.execute(f"ALTER TABLE {q(table)} RENAME TO {q(ancienne)}")
+            cursor.execute(
+                f"CREATE TABLE {q(table)} (LIKE {q(ancienne)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+                f"PARTITION BY RANGE ({q(colonne)})"
+            )
+
+            aujourd_hui = timezone.localdate()
+            mois = (timezone.localtime(plus_ancienne).date() if plus_ancienne else aujourd_hui).replace(day=1)
+            dernier_mois = aujourd_hui.replace(day=1)
+            for _ in range(MOIS_D_AVANCE):
+                dernier_mois = _mois_suivant(dernier_mois)
+            while mois <= dernier_mois:
+                suivant = _mois_suivant(mois)
+                cursor.execute(
+                    f"CREATE TABLE {q(table + '_p' + mois.strftime('%Y%m'))} PARTITION OF {q(table)} "
+                    f"FOR VALUES FROM ('{_borne(mois)}') TO ('{_borne(suivant)}')"
+                )
+                mois = suivant
+            cursor.execute(f"CREATE TABLE {q(table + '_defaut')} PARTITION OF {q(table)} DEFAULT")
+
+            cursor.execute(f"INSERT INTO {q(table)} SELECT * FROM {q(ancienne)}")
+            cursor.execute(f"DROP TABLE {q(ancienne)}")
+
+            sequence = f"{table}_id_seq"
+            cursor.execute(f"CREATE SEQUENCE {q(sequence)} OWNED BY {q(table)}.id")
+            cursor.execute("SELECT setval(%s, %s, %s)", [sequence, max(dernier_id, 1), dernier_id > 0])
+            cursor.execute(f"ALTER TABLE {q(table)} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+            cursor.execute(f"ALTER TABLE {q(table)} ADD PRIMARY KEY (id, {q(colonne)})")
+            cursor.execute(f"CREATE INDEX {q(table + '_' + colonne + '_part')} ON {q(table)} ({q(colonne)})")
+            for definition in index:
+                cursor.execute(definition)
+            for nom, definition in cles_etrangeres:
+                cursor.execute(f"ALTER TABLE {q(table)} ADD CONSTRAINT {q(nom)} {definition}")
+
+
+def departitionner(apps, schema_editor):
+    """
+    Inverse de partitionner : table simple, lignes recopiées, clé primaire
+    (id), index et clés étrangères de la table partitionnée recréés, id
+    repassé en colonne IDENTITY repartant après le plus grand id.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    q = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for table, colonne in TABLES.items():
+            cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table])
+            if not cursor.fetchone():
+                continue
+
+            cursor.execute(
+                "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT IN (%s, %s)",
+                [table, f"{table}_pkey", f"{table}_{colonne}_part"]
+            )
+            index = [definition.replace(' ON ONLY ', ' ON ') for (definition,) in cursor.fetchall()]
+            cursor.execute(
+                "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+                [table]
+            )
+            cles_etrangeres = cursor.fetchall()
+
+            partitionnee = f"{table}_partitionne"
+            cursor.execute(f"ALTER TABLE {q(table)} RENAME TO {q(partitionnee)}")
+            cursor.execute(
+                f"CREATE TABLE {q(table)} (LIKE {q(partitionnee)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            )
+            cursor.execute(f"INSERT INTO {q(table)} SELECT * FROM {q(partitionnee)}")
+            cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {q(table)}")
+            (dernier_id,) = cursor.fetchone()
+            # La séquence disparaît avec la table partitionnée
+            cursor.execute(f"ALTER TABLE {q(table)} ALTER COLUMN id DROP DEFAULT")
+            cursor.execute(f"DROP TABLE {q(partitionnee)}")
+
+            cursor.execute(
+                f"ALTER TABLE {q(table)} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY "
+                f"(RESTART WITH {dernier_id + 1})"
+            )
+            cursor.execute(f"ALTER TABLE {q(table)} ADD PRIMARY KEY (id)")
+            for definition in index:
+                cursor.execute(definition)
+            for nom, definition in cles_etrangeres:
+                cursor.execute(f"ALTER TABLE {q(table)} ADD CONSTRAINT {q(nom)} {definition}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_instantanes_stock'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='commandeclient',
+            name='numero_commande',
+            field=models.CharField(blank=True, db_index=True, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='lignecommandeclient',
+            name='commande',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='lignes', to='api.commandeclient'),
+        ),
+        migrations.RunPython(partitionner, departitionner),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:59
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_partitionnement_mensuel'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['timestamp'], name='activitylog_ts_brin'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['user', '-timestamp'], name='activitylog_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commande',
+            index=models.Index(fields=['utilisateur', 'statut', 'date_validation'], name='commande_util_statut_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commande',
+            index=models.Index(fields=['date_creation'], name='commande_date_creation_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commandeclient',
+            index=models.Index(fields=['statut', 'date_creation'], include=('is_vente_directe', 'total_commande'), name='cmdcli_statut_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commandeclient',
+            index=models.Index(fields=['utilisateur', 'date_creation'], name='cmdcli_util_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mouvementstock',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['date_mouvement'], name='mvt_date_brin'),
+        ),
+        migrations.AddIndex(
+            model_name='mouvementstock',
+            index=models.Index(fields=['produit', 'date_mouvement'], name='mvt_produit_date_idx'),
+        ),
+        # Index B-tree posés au partitionnement (0015), remplacés par les BRIN
+        migrations.RunSQL(
+            "DROP INDEX IF EXISTS api_mouvementstock_date_mouvement_part;"
+            "DROP INDEX IF EXISTS api_activitylog_timestamp_part;",
+            migrations.RunSQL.noop,
+        ),
+    ]
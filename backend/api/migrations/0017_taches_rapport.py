@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_index_rapports'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TacheRapport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_rapport', models.CharField(choices=[('ventes', 'Ventes'), ('produits', 'Produits'), ('clients', 'Clients'), ('fournisseurs', 'Fournisseurs'), ('utilisateurs', 'Utilisateurs'), ('statistiques_commandes', 'Statistiques des commandes')], max_length=30)),
+                ('parametres', models.JSONField(blank=True, default=dict)),
+                ('statut', models.CharField(choices=[('EN_ATTENTE', 'En attente'), ('EN_COURS', 'En cours'), ('TERMINEE', 'Terminée'), ('ECHEC', 'Échec')], default='EN_ATTENTE', max_length=20)),
+                ('resultat', models.JSONField(blank=True, null=True)),
+                ('erreur', models.TextField(blank=True)),
+                ('tentatives', models.PositiveSmallIntegerField(default=0)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_debut', models.DateTimeField(blank=True, null=True)),
+                ('date_fin', models.DateTimeField(blank=True, null=True)),
+                ('utilisateur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='taches_rapport', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Tâche de rapport',
+                'ordering': ['-date_creation'],
+                'indexes': [models.Index(condition=models.Q(('statut__in', ['EN_ATTENTE', 'EN_COURS'])), fields=['statut', 'id'], name='tache_rapport_file_idx'), models.Index(fields=['utilisateur', '-date_creation'], name='tache_rapport_user_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_taches_rapport'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tacherapport',
+            name='type_rapport',
+            field=models.CharField(choices=[('ventes', 'Ventes'), ('produits', 'Produits'), ('clients', 'Clients'), ('fournisseurs', 'Fournisseurs'), ('utilisateurs', 'Utilisateurs'), ('statistiques_commandes', 'Statistiques des commandes'), ('analyse_produits', 'Analyse des produits')], max_length=30),
+        ),
+    ]
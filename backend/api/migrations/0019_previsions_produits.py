@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_analyse_produits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produit',
+            name='date_prevision',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='produit',
+            name='demande_prevue',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='produit',
+            name='point_commande',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='produit',
+            name='quantite_suggeree',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_previsions_produits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produit',
+            name='fournisseur_prefere',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='produits_preferes', to='api.fournisseur'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:22
+
+from django.db import migrations, models
+
+# version_synchro = identifiant (xid8) de la transaction qui écrit la ligne,
+# posé par trigger quel que soit le chemin d'écriture (save, update(),
+# bulk_update, SQL brut). Produits : seulement si une colonne envoyée aux
+# caisses (CHAMPS_PRODUIT) ou est_actif figure dans l'UPDATE.
+COLONNES_PRODUIT = [
+    'reference', 'designation', 'prix_vente', 'quantite_stock', 'seuil_alerte',
+    'unite_mesure', 'code_barre', 'categorie_id', 'tva_id', 'est_actif',
+]
+
+TRIGGERS = [
+    ('api_produit', f"INSERT OR UPDATE OF {', '.join(COLONNES_PRODUIT)}"),
+    ('api_taxe', 'INSERT OR UPDATE'),
+    ('api_categorie', 'INSERT OR UPDATE'),
+    ('api_suppressioncatalogue', 'INSERT'),
+]
+
+FONCTION = """
+    CREATE FUNCTION api_version_synchro() RETURNS trigger AS $$
+    BEGIN
+        NEW.version_synchro := pg_current_xact_id()::text::bigint;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_fournisseur_prefere_produit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categorie',
+            name='version_synchro',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='produit',
+            name='version_synchro',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='suppressioncatalogue',
+            name='version_synchro',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='taxe',
+            name='version_synchro',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunSQL(
+            [FONCTION] + [
+                f"CREATE TRIGGER {table}_version_synchro BEFORE {evenements} ON {table} "
+                f"FOR EACH ROW EXECUTE FUNCTION api_version_synchro()"
+                for table, evenements in TRIGGERS
+            ],
+            [f"DROP TRIGGER {table}_version_synchro ON {table}" for table, _ in TRIGGERS]
+            + ["DROP FUNCTION api_version_synchro()"],
+        ),
+    ]
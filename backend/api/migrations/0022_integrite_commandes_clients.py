@@ -0,0 +1,107 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:10
+
+from django.db import migrations
+
+# api_commandeclient est partitionnée (0015) : PostgreSQL n'y accepte ni
+# contrainte UNIQUE sans la colonne de partition, ni clé étrangère entrante
+# vers id seul. Unicité de numero_commande et intégrité des lignes sont donc
+# tenues par triggers, quel que soit le chemin d'écriture (save, bulk_create,
+# update(), SQL brut).
+
+# Unicité du numéro : verrou consultatif par numéro, puis recherche sur
+# toutes les partitions (index numero_commande) ; deux insertions
+# concurrentes du même numéro s'exécutent l'une après l'autre.
+NUMERO_UNIQUE = """
+    CREATE FUNCTION api_numero_commande_unique() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_advisory_xact_lock(hashtextextended('api_commandeclient.' || NEW.numero_commande, 0));
+        IF EXISTS (
+            SELECT 1 FROM api_commandeclient
+            WHERE numero_commande = NEW.numero_commande AND id <> NEW.id
+        ) THEN
+            RAISE EXCEPTION 'numero_commande déjà utilisé : %', NEW.numero_commande
+                USING ERRCODE = 'unique_violation';
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER api_commandeclient_numero_insert
+        BEFORE INSERT ON api_commandeclient
+        FOR EACH ROW WHEN (NEW.numero_commande <> '')
+        EXECUTE FUNCTION api_numero_commande_unique();
+
+    CREATE TRIGGER api_commandeclient_numero_update
+        BEFORE UPDATE OF numero_commande ON api_commandeclient
+        FOR EACH ROW WHEN (NEW.numero_commande <> '' AND NEW.numero_commande IS DISTINCT FROM OLD.numero_commande)
+        EXECUTE FUNCTION api_numero_commande_unique();
+"""
+
+# Lignes : la commande doit exister (verrou FOR KEY SHARE, comme une clé
+# étrangère) ; une commande qui a encore des lignes ne peut pas être
+# supprimée (ON DELETE NO ACTION ; l'ORM supprime les lignes avant la
+# commande). Contrôle fait en fin d'instruction pour laisser passer les
+# déplacements de ligne entre partitions (UPDATE de date_creation) ;
+# creer_partition, qui vide la partition par défaut avant l'ATTACH, pose
+# api.deplacement_partition.
+LIGNES_COMMANDE = """
+    CREATE FUNCTION api_ligne_commande_client_parent() RETURNS trigger AS $$
+    BEGIN
+        PERFORM 1 FROM api_commandeclient WHERE id = NEW.commande_id FOR KEY SHARE;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'commande client % inexistante', NEW.commande_id
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER api_lignecommandeclient_parent
+        BEFORE INSERT OR UPDATE OF commande_id ON api_lignecommandeclient
+        FOR EACH ROW EXECUTE FUNCTION api_ligne_commande_client_parent();
+
+    CREATE FUNCTION api_commande_client_sans_lignes() RETURNS trigger AS $$
+    BEGIN
+        IF COALESCE(current_setting('api.deplacement_partition', true), '') = 'on' THEN
+            RETURN NULL;
+        END IF;
+        IF EXISTS (SELECT 1 FROM api_lignecommandeclient WHERE commande_id = OLD.id)
+           AND NOT EXISTS (SELECT 1 FROM api_commandeclient WHERE id = OLD.id) THEN
+            RAISE EXCEPTION 'commande client % encore référencée par des lignes', OLD.id
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER api_commandeclient_sans_lignes
+        AFTER DELETE ON api_commandeclient
+        FOR EACH ROW EXECUTE FUNCTION api_commande_client_sans_lignes();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_version_synchro_catalogue'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            NUMERO_UNIQUE,
+            """
+            DROP TRIGGER api_commandeclient_numero_update ON api_commandeclient;
+            DROP TRIGGER api_commandeclient_numero_insert ON api_commandeclient;
+            DROP FUNCTION api_numero_commande_unique();
+            """,
+        ),
+        migrations.RunSQL(
+            LIGNES_COMMANDE,
+            """
+            DROP TRIGGER api_commandeclient_sans_lignes ON api_commandeclient;
+            DROP FUNCTION api_commande_client_sans_lignes();
+            DROP TRIGGER api_lignecommandeclient_parent ON api_lignecommandeclient;
+            DROP FUNCTION api_ligne_commande_client_parent();
+            """,
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:40
+
+from django.core.management import call_command
+from django.db import migrations
+
+TABLE = 'api_cache_rapports'
+
+
+def creer_table(apps, schema_editor):
+    # Table de CACHES['rapports'] (DatabaseCache), sans effet si elle existe
+    call_command('createcachetable', TABLE, database=schema_editor.connection.alias, verbosity=0)
+
+
+def supprimer_table(apps, schema_editor):
+    schema_editor.execute(f"DROP TABLE IF EXISTS {schema_editor.quote_name(TABLE)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_integrite_commandes_clients'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_table, supprimer_table),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:36
+
+from django.db import migrations, models
+
+# Doublons actifs laissés par l'ancienne déduplication : la plus ancienne
+# demande est gardée, les autres passent en échec
+CLORE_DOUBLONS = """
+    UPDATE api_tacherapport SET statut = 'ECHEC', erreur = 'Doublon d''une demande identique', date_fin = now()
+    WHERE id IN (
+        SELECT id FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY utilisateur_id, type_rapport, parametres ORDER BY id
+            ) AS rang
+            FROM api_tacherapport WHERE statut IN ('EN_ATTENTE', 'EN_COURS')
+        ) actives
+        WHERE rang > 1
+    )
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_cache_rapports'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CLORE_DOUBLONS, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='tacherapport',
+            constraint=models.UniqueConstraint(condition=models.Q(('statut__in', ['EN_ATTENTE', 'EN_COURS'])), fields=('utilisateur', 'type_rapport', 'parametres'), name='tache_rapport_active_unique'),
+        ),
+    ]
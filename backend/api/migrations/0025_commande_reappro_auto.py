@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:39
+
+from django.db import migrations, models
+
+# Brouillons générés avant le champ : repérés jusqu'ici par leur libellé
+MARQUER_EXISTANTS = """
+    UPDATE api_commande SET reappro_auto = true
+    WHERE statut = 'BROUILLON' AND type_produit = 'Réapprovisionnement automatique'
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_tache_rapport_active_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='commande',
+            name='reappro_auto',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunSQL(MARQUER_EXISTANTS, migrations.RunSQL.noop),
+    ]
@@ -1,6 +1,6 @@
 # models.py
 import uuid
-from datetime import datetime
+from datetime import datetime, time, timedelta
 from decimal import Decimal
 
 # Django imports
@@ -9,16 +9,21 @@ from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from django.db import transaction
-from django.db.models import Count, Sum, Q, F, DecimalField
+from django.db.models import Count, Sum, Q, F, DecimalField, OuterRef, Subquery, Case, When
 from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import BrinIndex
+
+from .utils.sequences import references_produit, numeros_commande_client
 
 class Taxe(models.Model):
     """Gestion des taxes (TVA, etc.)"""
     nom = models.CharField(max_length=50)  # Nom de la taxe (ex: "TVA 20%")
     taux = models.DecimalField(max_digits=5, decimal_places=2)  # Taux en pourcentage
     code_comptable = models.CharField(max_length=20, blank=True)  # Code compta associé
-    
+    date_modification = models.DateTimeField(auto_now=True)  # Date de dernière modification
+    version_synchro = models.BigIntegerField(default=0, editable=False, db_index=True)  # Transaction d'écriture (trigger), jeton de synchro caisses
+
     def __str__(self):
         return f"{self.nom} ({self.taux}%)"
 
@@ -109,6 +114,8 @@ class Categorie(models.Model):
     """Catégorie pour classer les produits"""
     nom = models.CharField(max_length=100)  # Nom de la catégorie
     description = models.TextField(blank=True, null=True)  # Description
+    date_modification = models.DateTimeField(auto_now=True)  # Date de dernière modification
+    version_synchro = models.BigIntegerField(default=0, editable=False, db_index=True)  # Transaction d'écriture (trigger), jeton de synchro caisses
 
     def __str__(self):
         return self.nom
@@ -132,25 +139,66 @@ class Produit(models.Model):
     prix_vente = models.DecimalField(max_digits=10, decimal_places=2)  # Prix de vente HT
     quantite_stock = models.IntegerField(default=0)  # Stock actuel
     seuil_alerte = models.IntegerField(default=5)  # Seuil pour alerte stock faible
+    demande_prevue = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)  # Ventes/jour prévues (calculer_previsions)
+    point_commande = models.IntegerField(null=True, blank=True, editable=False)  # Seuil calculé, prioritaire sur seuil_alerte
+    quantite_suggeree = models.IntegerField(null=True, blank=True, editable=False)  # Quantité à commander suggérée
+    date_prevision = models.DateTimeField(null=True, blank=True, editable=False)  # Dernier calcul des prévisions
     unite_mesure = models.CharField(max_length=10, choices=UNITE_CHOICES, default='unite')  # Unité de vente
     date_creation = models.DateTimeField(auto_now_add=True)  # Date création fiche
+    date_modification = models.DateTimeField(auto_now=True, db_index=True)  # Date de dernière modification
+    version_synchro = models.BigIntegerField(default=0, editable=False, db_index=True)  # Transaction d'écriture (trigger), jeton de synchro caisses
     est_actif = models.BooleanField(default=True, verbose_name="Actif")  # Produit actif ou non
     image = models.ImageField(upload_to='produits/', blank=True)  # Photo du produit
-    code_barre = models.CharField(max_length=50, blank=True)  # Code barre EAN
+    code_barre = models.CharField(max_length=50, blank=True, db_index=True)  # Code barre EAN
     tva = models.ForeignKey(Taxe, on_delete=models.PROTECT, null=True)  # Taxe applicable
+    fournisseur_prefere = models.ForeignKey(
+        'Fournisseur', on_delete=models.SET_NULL, null=True, blank=True, related_name='produits_preferes'
+    )  # Fournisseur des commandes de réappro automatiques
 
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=['reference'], name='unique_reference')
         ]
 
-    def save(self, *args, **kwargs):
-        """Auto-génère la référence à la création"""
+    def save(self, *args, utilisateur=None, **kwargs):
+        """
+        Auto-génère la référence à la création. quantite_stock ne change
+        que par le journal MouvementStock (UPDATE F()) : à la création, la
+        quantité fournie est inscrite comme ajustement « Stock initial »
+        (par `utilisateur`) ; une sauvegarde complète ne réécrit pas la
+        valeur en mémoire et la relit.
+        """
         if not self.pk and not self.reference:
-            prefix = "PRD"
-            last_id = Produit.objects.order_by('-id').values_list('id', flat=True).first() or 0
-            self.reference = f"{prefix}{str(last_id + 1).zfill(5)}"
+            self.reference = references_produit.suivant()
+        if self._state.adding:
+            stock_initial, self.quantite_stock = self.quantite_stock, 0
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                if stock_initial:
+                    MouvementStock(
+                        produit=self, utilisateur=utilisateur, type_mouvement='ajustement',
+                        quantite=stock_initial, motif='Stock initial'
+                    ).save()
+            self.quantite_stock = stock_initial
+            return
+        if kwargs.get('force_insert') or kwargs.get('update_fields') is not None:
+            return super().save(*args, **kwargs)
+        kwargs['update_fields'] = [
+            champ.name for champ in self._meta.concrete_fields
+            if not champ.primary_key and champ.name != 'quantite_stock'
+        ]
         super().save(*args, **kwargs)
+        self.refresh_from_db(fields=['quantite_stock'])
+
+    @staticmethod
+    def attribuer_references(produits):
+        """Références des produits créés par bulk_create (save() n'est pas appelé)"""
+        return references_produit.attribuer(produits, 'reference')
+
+    @staticmethod
+    def expression_seuil():
+        """Seuil d'alerte effectif en SQL : point de commande calculé, sinon seuil manuel"""
+        return Coalesce(F('point_commande'), F('seuil_alerte'))
 
     def __str__(self):
         return f"{self.designation} ({self.reference})"
@@ -161,8 +209,8 @@ class Produit(models.Model):
         if self.can_be_deleted():
             return super().delete(*args, **kwargs)
         self.est_actif = False
-        self.save()
-        return (1, {}) 
+        self.save(update_fields=['est_actif', 'date_modification'])
+        return (1, {})
     
     def can_be_deleted(self):
         """Vérifie si le produit n'est pas utilisé"""
@@ -171,9 +219,25 @@ class Produit(models.Model):
     def mark_as_inactive(self):
         """Désactive le produit sans supprimer"""
         self.est_actif = False
-        self.save()
+        self.save(update_fields=['est_actif', 'date_modification'])
         return True
 
+class SuppressionCatalogue(models.Model):
+    """Trace des suppressions définitives du catalogue (synchro des caisses)"""
+    MODELE_CHOICES = (
+        ('produit', 'Produit'),
+        ('taxe', 'Taxe'),
+        ('categorie', 'Catégorie'),
+    )
+
+    modele = models.CharField(max_length=20, choices=MODELE_CHOICES)  # Type d'objet supprimé
+    objet_id = models.BigIntegerField()  # Id de l'objet supprimé
+    date_suppression = models.DateTimeField(auto_now_add=True, db_index=True)  # Date/heure
+    version_synchro = models.BigIntegerField(default=0, editable=False, db_index=True)  # Transaction d'écriture (trigger), jeton de synchro caisses
+
+    def __str__(self):
+        return f"{self.modele} #{self.objet_id} supprimé le {self.date_suppression}"
+
 class Commande(models.Model):
     """Commande fournisseur pour réapprovisionnement"""
     STATUS_CHOICES = [
@@ -191,26 +255,59 @@ class Commande(models.Model):
     date_validation = models.DateTimeField(null=True, blank=True)  # Date validation
     statut = models.CharField(max_length=20, choices=STATUS_CHOICES, default='BROUILLON')  # État
     notes = models.TextField(blank=True)  # Notes supplémentaires
+    prix_total = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False, db_index=True)  # Total HT tenu à jour depuis les lignes
+    reappro_auto = models.BooleanField(default=False, editable=False)  # Brouillon généré par le réapprovisionnement automatique
+
+    class Meta:
+        indexes = [
+            # Performance vendeur : commandes validées d'un utilisateur par mois
+            models.Index(fields=['utilisateur', 'statut', 'date_validation'], name='commande_util_statut_idx'),
+            # Statistiques quotidiennes
+            models.Index(fields=['date_creation'], name='commande_date_creation_idx'),
+        ]
 
     def __str__(self):
         return f"{self.code_commande} - {self.fournisseur.nom_fournisseur}"
 
     def generate_code(self):
         """Génère un code unique pour la commande"""
-        date_part = self.date_creation.strftime('%Y%m%d')
+        date_part = (self.date_creation or timezone.now()).strftime('%Y%m%d')
         unique_part = uuid.uuid4().hex[:6].upper()
         return f"CMD-{date_part}-{unique_part}"
 
     def save(self, *args, **kwargs):
-        """Génère le code à la création"""
+        """
+        Génère le code à la création. prix_total n'est écrit que par
+        recalculer_prix_total : une sauvegarde complète ne réécrit pas la
+        valeur en mémoire, éventuellement périmée, et la relit.
+        """
         if not self.code_commande:
             self.code_commande = self.generate_code()
+        if self._state.adding or kwargs.get('force_insert') or kwargs.get('update_fields') is not None:
+            return super().save(*args, **kwargs)
+        kwargs['update_fields'] = [
+            champ.name for champ in self._meta.concrete_fields
+            if not champ.primary_key and champ.name != 'prix_total'
+        ]
         super().save(*args, **kwargs)
+        self.refresh_from_db(fields=['prix_total'])
 
-    @property
-    def prix_total(self):
-        """Calcule le total HT de la commande"""
-        return sum(ligne.total_ligne_ht for ligne in self.lignes.all())
+    @classmethod
+    def recalculer_prix_total(cls, *commande_ids):
+        """Recalcule en une requête le total HT stocké des commandes données"""
+        total_lignes = (
+            LigneCommande.objects
+            .filter(commande=OuterRef('pk'))
+            .values('commande')
+            .annotate(total=Sum('total_ligne_ht'))
+            .values('total')
+        )
+        cls.objects.filter(pk__in=commande_ids).update(
+            prix_total=Coalesce(
+                Subquery(total_lignes), Decimal('0'),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            )
+        )
 
 class LigneCommande(models.Model):
     """Ligne de commande fournisseur"""
@@ -227,11 +324,18 @@ class LigneCommande(models.Model):
     remise_ligne = models.DecimalField(max_digits=5, decimal_places=2, default=0)  # Remise en %
     date_livraison_prevue = models.DateField(null=True, blank=True)  # Date prévue
     statut_livraison = models.CharField(max_length=20, choices=STATUT_LIVRAISON_CHOICES, default='A_LIVRER')  # État livraison
+    quantite_livree = models.IntegerField(default=0)  # Cumul réceptionné
     total_ligne_ht = models.DecimalField(max_digits=10, decimal_places=2, editable=False, default=0)  # Total HT auto-calculé
 
     def __str__(self):
         return f"{self.quantite}x {self.produit.reference}"
 
+    def statut_pour(self, quantite_livree):
+        """Statut de livraison correspondant à une quantité reçue"""
+        if quantite_livree <= 0:
+            return 'A_LIVRER'
+        return 'LIVREE' if quantite_livree >= self.quantite else 'PARTIELLE'
+
     def save(self, *args, **kwargs):
         """Calcule automatiquement le total HT"""
         self.total_ligne_ht = (self.quantite * self.prix_unitaire) * (1 - self.remise_ligne / 100)
@@ -246,17 +350,55 @@ class MouvementStock(models.Model):
     )
     
     produit = models.ForeignKey(Produit, on_delete=models.PROTECT, related_name='mouvements')  # Produit concerné
-    utilisateur = models.ForeignKey(Utilisateur, on_delete=models.PROTECT)  # Responsable
+    utilisateur = models.ForeignKey(Utilisateur, on_delete=models.PROTECT, null=True, blank=True)  # Responsable (vide pour les mouvements système)
     commande = models.ForeignKey(Commande, on_delete=models.SET_NULL, null=True, blank=True)  # Lien commande
     fournisseur = models.ForeignKey(Fournisseur, on_delete=models.SET_NULL, null=True, blank=True)  # Fournisseur
     type_mouvement = models.CharField(max_length=20, choices=TYPE_MOUVEMENT)  # Type mouvement
-    quantite = models.IntegerField()  # Quantité (+ ou - selon type)
+    quantite = models.IntegerField()  # Quantité (positive pour entrée/sortie, signée pour ajustement)
     date_mouvement = models.DateTimeField(auto_now_add=True)  # Date/heure
     motif = models.TextField(blank=True, null=True)  # Raison si nécessaire
 
+    class Meta:
+        indexes = [
+            # Journal en ajout seul : BRIN pour les plages de dates
+            BrinIndex(fields=['date_mouvement'], name='mvt_date_brin'),
+            # Solde d'un produit à une date (instantané + mouvements depuis)
+            models.Index(fields=['produit', 'date_mouvement'], name='mvt_produit_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.type_mouvement} de {self.quantite} {self.produit.unite_mesure} pour {self.produit}"
 
+    # Journal en ajout seul : le stock d'un produit est la somme de ses
+    # mouvements. Une erreur se corrige par un mouvement d'ajustement.
+    def variation_stock(self):
+        """Effet du mouvement sur quantite_stock"""
+        return -self.quantite if self.type_mouvement == 'sortie' else self.quantite
+
+    @staticmethod
+    def expression_variation():
+        """variation_stock() en SQL, pour sommer le journal en base"""
+        return Case(
+            When(type_mouvement='sortie', then=-F('quantite')),
+            default=F('quantite'),
+        )
+
+    def save(self, *args, **kwargs):
+        """Enregistre le mouvement et applique sa variation au stock, atomiquement"""
+        if not self._state.adding:
+            raise ValueError("Un mouvement de stock ne se modifie pas : enregistrer un ajustement")
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # UPDATE ... SET quantite_stock = quantite_stock + n : pas de
+            # lecture préalable, donc pas de mise à jour perdue entre caisses
+            Produit.objects.filter(pk=self.produit_id).update(
+                quantite_stock=F('quantite_stock') + self.variation_stock(),
+                date_modification=timezone.now(),
+            )
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Un mouvement de stock ne se supprime pas : enregistrer un ajustement")
+
 class CommandeClient(models.Model):
     """Commande passée par un client"""
     STATUT_CHOICES = [
@@ -268,7 +410,7 @@ class CommandeClient(models.Model):
         ('LIVRAISON', 'Livraison à domicile'),  # Livraison
     ]
     
-    numero_commande = models.CharField(max_length=20, unique=True, blank=True)  # Numéro auto
+    numero_commande = models.CharField(max_length=20, blank=True, db_index=True)  # Numéro auto (unique par la séquence : pas de contrainte UNIQUE sur une table partitionnée)
     client = models.ForeignKey('Client', on_delete=models.PROTECT, related_name='commandes')  # Client
     utilisateur = models.ForeignKey('Utilisateur', on_delete=models.PROTECT, null=True, blank=True, related_name='commandes_client')  # Vendeur
     tva = models.ForeignKey('Taxe', on_delete=models.PROTECT, null=True, blank=True, default=1)  # TVA applicable
@@ -284,9 +426,23 @@ class CommandeClient(models.Model):
     total_commande = models.DecimalField(max_digits=10, decimal_places=2, default=0, blank=True)  # Total TTC
     notes = models.TextField(blank=True)  # Notes
 
+    # Statuts et champs pris en compte dans Statistique
+    STATUTS_STATISTIQUE = ('VALIDEE', 'LIVREE')
+    CHAMPS_STATISTIQUE = ('date_creation', 'statut', 'is_vente_directe', 'total_commande')
+
     class Meta:
         verbose_name = "Commande client"
         ordering = ['-date_creation']
+        indexes = [
+            # Rapports et stats : statut + plage de dates ; les colonnes
+            # agrégées en INCLUDE permettent un parcours d'index seul
+            models.Index(
+                fields=['statut', 'date_creation'], include=['is_vente_directe', 'total_commande'],
+                name='cmdcli_statut_date_idx'
+            ),
+            # Rapport utilisateurs : vendeur + plage de dates
+            models.Index(fields=['utilisateur', 'date_creation'], name='cmdcli_util_date_idx'),
+        ]
 
     def __str__(self):
         return f"Commande {self.numero_commande} - {self.client.nom_client if self.client else 'Vente directe'}"
@@ -294,11 +450,32 @@ class CommandeClient(models.Model):
     def save(self, *args, **kwargs):
         """Génère le numéro de commande à la création"""
         if not self.numero_commande:
-            prefix = "CMD"
-            last_id = CommandeClient.objects.order_by('-id').values_list('id', flat=True).first() or 0
-            self.numero_commande = f"{prefix}-{str(last_id + 1).zfill(3)}"
+            self.numero_commande = numeros_commande_client.suivant()
         super().save(*args, **kwargs)
 
+    @staticmethod
+    def attribuer_numeros(commandes):
+        """Numéros des commandes créées par bulk_create (save() n'est pas appelé)"""
+        return numeros_commande_client.attribuer(commandes, 'numero_commande')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Mémorise l'état compté dans Statistique (mises à jour incrémentales)"""
+        instance = super().from_db(db, field_names, values)
+        if not instance.get_deferred_fields() & set(cls.CHAMPS_STATISTIQUE):
+            instance._etat_statistique = instance.etat_statistique()
+        return instance
+
+    def etat_statistique(self):
+        """(heure locale, vente directe, montant) si la commande compte dans les stats, sinon None"""
+        if self.statut not in self.STATUTS_STATISTIQUE or self.date_creation is None:
+            return None
+        return (
+            timezone.localtime(self.date_creation).replace(minute=0, second=0, microsecond=0),
+            self.is_vente_directe,
+            self.total_commande or Decimal('0'),
+        )
+
     def can_be_deleted(self):
         """Vérifie si la commande peut être supprimée"""
         return not (self.statut == 'VALIDEE' or self.est_payee)
@@ -343,7 +520,7 @@ class CommandeClient(models.Model):
 
 class LigneCommandeClient(models.Model):
     """Ligne de commande client"""
-    commande = models.ForeignKey(CommandeClient, on_delete=models.CASCADE, related_name='lignes')  # Commande parente
+    commande = models.ForeignKey(CommandeClient, on_delete=models.CASCADE, related_name='lignes', db_constraint=False)  # Commande parente (sans FK en base : commandes partitionnées)
     produit = models.ForeignKey('Produit', on_delete=models.SET_NULL, null=True)  # Produit (peut être supprimé)
     quantite = models.IntegerField(validators=[MinValueValidator(1)])  # Quantité
     prix_unitaire = models.DecimalField(max_digits=10, decimal_places=2)  # Prix unitaire HT
@@ -395,27 +572,45 @@ class Statistique(models.Model):
         return f"Stats du {self.date.strftime('%d/%m/%Y')}"
 
     @classmethod
-    def update_daily_stats(cls):
-        """Met à jour les stats pour aujourd'hui"""
-        today = timezone.now().date()
+    def appliquer_delta(cls, jour, **deltas):
+        """Ajoute des variations (F()) aux compteurs du jour, sans rien recompter"""
+        valeurs = {champ: F(champ) + delta for champ, delta in deltas.items() if delta}
+        if not valeurs:
+            return
+        if not cls.objects.filter(date=jour).update(**valeurs):
+            cls.objects.get_or_create(date=jour)
+            cls.objects.filter(date=jour).update(**valeurs)
+
+    @classmethod
+    def update_daily_stats(cls, jour=None):
+        """Recalcule entièrement les stats d'un jour (aujourd'hui par défaut)"""
+        today = timezone.localdate()
+        jour = jour or today
         
+        # Plage [jour 00:00, lendemain 00:00[ : contrairement à __date, elle
+        # laisse utiliser les index sur les dates et élaguer les partitions
+        debut = timezone.make_aware(datetime.combine(jour, time.min))
+        fin = timezone.make_aware(datetime.combine(jour + timedelta(days=1), time.min))
+
         with transaction.atomic():
-            stats, created = cls.objects.get_or_create(date=today)
+            stats, created = cls.objects.select_for_update().get_or_create(date=jour)
             
             # Commandes fournisseurs
             stats.nb_commandes = Commande.objects.filter(
-                date_creation__date=today
+                date_creation__gte=debut,
+                date_creation__lt=fin
             ).count()
             
             # Commandes clients
             ventes_data = CommandeClient.objects.filter(
-                date_creation__date=today,
-                statut__in=['VALIDEE', 'LIVREE']
+                date_creation__gte=debut,
+                date_creation__lt=fin,
+                statut__in=CommandeClient.STATUTS_STATISTIQUE
             ).aggregate(
                 total=Count('id'),
-                ventes_directes=Count('id', filter=Q(client__isnull=True) | Q(client__id='3')),
+                ventes_directes=Count('id', filter=Q(is_vente_directe=True)),
                 montant_total=Sum('total_commande'),
-                montant_direct=Sum('total_commande', filter=Q(client__isnull=True) | Q(client__id='3'))
+                montant_direct=Sum('total_commande', filter=Q(is_vente_directe=True))
             )
             
             stats.nb_ventes = ventes_data['total'] or 0
@@ -427,38 +622,103 @@ class Statistique(models.Model):
             
             # Autres métriques
             stats.nouveaux_clients = Client.objects.filter(
-                date_creation__date=today
+                date_creation__gte=debut,
+                date_creation__lt=fin
             ).count()
             
             stats.nouveaux_fournisseurs = Fournisseur.objects.filter(
-                date_creation__date=today
-            ).count()
-            
-            stats.produits_actifs = Produit.objects.filter(
-                est_actif=True
-            ).count()
-            
-            stats.produits_rupture = Produit.objects.filter(
-                quantite_stock=0
-            ).count()
-            
-            stats.produits_alerte = Produit.objects.filter(
-                quantite_stock__gt=0,
-                quantite_stock__lte=models.F('seuil_alerte')
+                date_creation__gte=debut,
+                date_creation__lt=fin
             ).count()
             
             stats.mouvements_stock = MouvementStock.objects.filter(
-                date_mouvement__date=today
-            ).count()
-            
-            stats.utilisateurs_actifs = Utilisateur.objects.filter(
-                est_actif=True
+                date_mouvement__gte=debut,
+                date_mouvement__lt=fin
             ).count()
+
+            # État du stock : photo de l'instant, n'a de sens que pour aujourd'hui
+            if jour == today:
+                stats.produits_actifs = Produit.objects.filter(
+                    est_actif=True
+                ).count()
+                
+                stats.produits_rupture = Produit.objects.filter(
+                    quantite_stock=0
+                ).count()
+                
+                stats.produits_alerte = Produit.objects.filter(
+                    quantite_stock__gt=0,
+                    quantite_stock__lte=Produit.expression_seuil()
+                ).count()
+                
+                stats.utilisateurs_actifs = Utilisateur.objects.filter(
+                    is_active=True
+                ).count()
             
             stats.save()
         
         return stats
 
+class CompteursVentes(models.Model):
+    """Compteurs de ventes agrégés sur une période (rollups de Statistique)"""
+    nb_ventes = models.IntegerField(default=0)  # Commandes clients
+    nb_ventes_directes = models.IntegerField(default=0)  # Ventes sans client
+    nb_commandes_clients = models.IntegerField(default=0)  # Commandes avec client
+    montant_total = models.DecimalField(max_digits=15, decimal_places=2, default=0)  # CA total
+    montant_ventes_directes = models.DecimalField(max_digits=15, decimal_places=2, default=0)  # CA vente directe
+    montant_commandes = models.DecimalField(max_digits=15, decimal_places=2, default=0)  # CA commandes
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def appliquer_delta(cls, periode, **deltas):
+        """Ajoute des variations (F()) aux compteurs de la période"""
+        valeurs = {champ: F(champ) + delta for champ, delta in deltas.items() if delta}
+        if not valeurs:
+            return
+        if not cls.objects.filter(periode=periode).update(**valeurs):
+            cls.objects.get_or_create(periode=periode)
+            cls.objects.filter(periode=periode).update(**valeurs)
+
+class StatistiqueHoraire(CompteursVentes):
+    """Ventes par heure (tableau de bord de la journée)"""
+    periode = models.DateTimeField(unique=True)  # Début de l'heure
+
+    class Meta:
+        verbose_name = "Statistique horaire"
+        ordering = ['-periode']
+
+    def __str__(self):
+        return f"Stats du {timezone.localtime(self.periode).strftime('%d/%m/%Y %Hh')}"
+
+class StatistiqueMensuelle(CompteursVentes):
+    """Ventes par mois (tendances sur plusieurs années)"""
+    periode = models.DateField(unique=True)  # Premier jour du mois
+
+    class Meta:
+        verbose_name = "Statistique mensuelle"
+        ordering = ['-periode']
+
+    def __str__(self):
+        return f"Stats de {self.periode.strftime('%m/%Y')}"
+
+class InstantaneStock(models.Model):
+    """Solde d'un produit en fin de journée, photographié chaque nuit depuis le journal"""
+    produit = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name='instantanes')  # Produit concerné
+    date = models.DateField()  # Jour photographié (solde en fin de journée)
+    quantite = models.IntegerField()  # Stock à la fin du jour
+
+    class Meta:
+        verbose_name = "Instantané de stock"
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'produit'], name='unique_instantane_par_jour')
+        ]
+
+    def __str__(self):
+        return f"{self.produit_id} : {self.quantite} au {self.date.strftime('%d/%m/%Y')}"
+
 class ActivityLog(models.Model):
     """Journal des activités utilisateurs"""
     ACTION_CHOICES = [
@@ -478,6 +738,66 @@ class ActivityLog(models.Model):
     class Meta:
         ordering = ['-timestamp']
         verbose_name = "Log d'activité"
+        indexes = [
+            # Table en ajout seul, triée par nature sur timestamp : un BRIN
+            # de quelques pages suffit pour les plages de dates
+            BrinIndex(fields=['timestamp'], name='activitylog_ts_brin'),
+            models.Index(fields=['user', '-timestamp'], name='activitylog_user_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.get_action_display()} à {self.timestamp}"
+
+
+class TacheRapport(models.Model):
+    """Rapport à générer en arrière-plan (file d'attente en base, voir api.tasks)"""
+    TYPE_CHOICES = [
+        ('ventes', 'Ventes'),
+        ('produits', 'Produits'),
+        ('clients', 'Clients'),
+        ('fournisseurs', 'Fournisseurs'),
+        ('utilisateurs', 'Utilisateurs'),
+        ('statistiques_commandes', 'Statistiques des commandes'),
+        ('analyse_produits', 'Analyse des produits'),
+    ]
+    STATUT_CHOICES = [
+        ('EN_ATTENTE', 'En attente'),
+        ('EN_COURS', 'En cours'),
+        ('TERMINEE', 'Terminée'),
+        ('ECHEC', 'Échec'),
+    ]
+    STATUTS_ACTIFS = ('EN_ATTENTE', 'EN_COURS')
+
+    utilisateur = models.ForeignKey(Utilisateur, on_delete=models.CASCADE, related_name='taches_rapport')  # Demandeur
+    type_rapport = models.CharField(max_length=30, choices=TYPE_CHOICES)  # Type de rapport (?type=)
+    parametres = models.JSONField(default=dict, blank=True)  # Autres paramètres (debut, fin, page...)
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='EN_ATTENTE')  # État
+    resultat = models.JSONField(null=True, blank=True)  # Réponse du rapport (telle que rendue par l'API)
+    erreur = models.TextField(blank=True)  # Message en cas d'échec
+    tentatives = models.PositiveSmallIntegerField(default=0)  # Nombre de prises en charge
+    worker = models.CharField(max_length=100, blank=True)  # Worker qui l'a prise en charge
+    date_creation = models.DateTimeField(auto_now_add=True)  # Date de la demande
+    date_debut = models.DateTimeField(null=True, blank=True)  # Prise en charge
+    date_fin = models.DateTimeField(null=True, blank=True)  # Fin du traitement
+
+    class Meta:
+        ordering = ['-date_creation']
+        verbose_name = "Tâche de rapport"
+        indexes = [
+            # Seules les tâches actives sont lues par les workers
+            models.Index(
+                fields=['statut', 'id'], name='tache_rapport_file_idx',
+                condition=Q(statut__in=['EN_ATTENTE', 'EN_COURS'])
+            ),
+            models.Index(fields=['utilisateur', '-date_creation'], name='tache_rapport_user_idx'),
+        ]
+        constraints = [
+            # Une seule demande active par (demandeur, type, paramètres)
+            models.UniqueConstraint(
+                fields=['utilisateur', 'type_rapport', 'parametres'], name='tache_rapport_active_unique',
+                condition=Q(statut__in=['EN_ATTENTE', 'EN_COURS'])
+            ),
+        ]
 
     def __str__(self):
-        return f"{self.user} - {self.get_action_display()} à {self.timestamp}"
\ No newline at end of file
+        return f"Rapport {self.type_rapport} #{self.pk} ({self.get_statut_display()})"
@@ -0,0 +1,40 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class ProduitCursorPagination(CursorPagination):
+    """
+    Pagination par curseur (keyset) sur l'id produit.
+    Activée seulement si le client envoie `cursor` ou `page_size` :
+    sans ces paramètres la liste complète est renvoyée comme avant.
+    """
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (
+            self.cursor_query_param not in request.query_params
+            and self.page_size_query_param not in request.query_params
+        ):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class CommandePagination(PageNumberPagination):
+    """
+    Pagination par numéro de page des commandes fournisseurs, triables
+    (prix_total, date...). Activée seulement si le client envoie `page`
+    ou `page_size`, comme ProduitCursorPagination.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (
+            self.page_query_param not in request.query_params
+            and self.page_size_query_param not in request.query_params
+        ):
+            return None
+        return super().paginate_queryset(queryset, request, view)
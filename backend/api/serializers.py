@@ -3,6 +3,7 @@ from rest_framework import serializers
 from .models import (
     Produit, 
     Taxe,
+    Categorie,
     Commande, 
     LigneCommande,
     Fournisseur,
@@ -14,18 +15,35 @@ from .models import (
 from django.contrib.auth.models import Group, Permission
 from django.core.validators import ValidationError
 
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """ModelSerializer acceptant `fields=[...]` pour ne renvoyer qu'une partie des champs"""
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
 class TaxeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Taxe
         fields = '__all__'
 
-class ProduitSerializer(serializers.ModelSerializer):
+class CategorieSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Categorie
+        fields = '__all__'
+
+class ProduitSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Produit
         fields = '__all__'
         extra_kwargs = {
             'reference': {'read_only': True},
             'date_creation': {'read_only': True},
+            # Stock initial à la création ; ensuite, seulement par les mouvements
+            'quantite_stock': {'min_value': 0, 'required': False},
             'prix_vente': {'min_value': 0}
         }
 
@@ -34,6 +52,23 @@ class ProduitSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Le prix de vente doit être positif")
         return value
 
+    def validate_quantite_stock(self, value):
+        if self.instance is not None and value != self.instance.quantite_stock:
+            raise serializers.ValidationError(
+                "Le stock se modifie par un mouvement de stock (ajustement), pas sur la fiche"
+            )
+        return value
+
+    def create(self, validated_data):
+        # Stock initial inscrit au journal au nom de l'utilisateur (Produit.save)
+        produit = Produit(**validated_data)
+        produit.save(utilisateur=getattr(self.context.get('request'), 'user', None))
+        return produit
+
+    def update(self, instance, validated_data):
+        validated_data.pop('quantite_stock', None)
+        return super().update(instance, validated_data)
+
 class FournisseurSerializer(serializers.ModelSerializer):
     class Meta:
         model = Fournisseur
@@ -118,7 +153,7 @@ class CommandeClientSerializer(serializers.ModelSerializer):
             'is_vente_directe', 'notes', 'lignes', 'total_commande',
             'utilisateur', 'numero_commande'
         ]
-        read_only_fields = ['id', 'date_creation', 'total_commande', 'utilisateur', 'client']
+        read_only_fields = ['id', 'numero_commande', 'date_creation', 'total_commande', 'utilisateur', 'client']
 
     def validate(self, data):
         if not data.get('is_vente_directe') and not data.get('client'):
@@ -155,6 +190,16 @@ class CommandeClientSerializer(serializers.ModelSerializer):
 
         return instance
 
+
+class LigneCommandeClientResumeSerializer(LigneCommandeClientSerializer):
+    """Ligne de commande avec le produit réduit à son id et sa désignation"""
+    produit = ProduitSerializer(read_only=True, fields=['id', 'designation'])
+
+
+class CommandeClientResumeSerializer(CommandeClientSerializer):
+    """Commande client en lecture avec des lignes allégées (listes, historiques)"""
+    lignes = LigneCommandeClientResumeSerializer(many=True, read_only=True)
+
     
 class PermissionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -227,8 +272,9 @@ class LigneCommandeSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'produit', 'produit_id', 'quantite', 
             'prix_unitaire', 'remise_ligne', 'total_ligne_ht',
-            'date_livraison_prevue', 'statut_livraison'
+            'date_livraison_prevue', 'statut_livraison', 'quantite_livree'
         ]
+        read_only_fields = ['quantite_livree', 'statut_livraison']  # Tenus par la réception (receptionner_commande)
         extra_kwargs = {
             'quantite': {'min_value': 1},
             'prix_unitaire': {'min_value': 0}
@@ -244,7 +290,7 @@ class CommandeSerializer(serializers.ModelSerializer):
     )
     lignes = LigneCommandeSerializer(many=True, required=False)
     prix_total = serializers.DecimalField(
-        max_digits=10, 
+        max_digits=12, 
         decimal_places=2, 
         read_only=True
     )
@@ -264,7 +310,9 @@ class CommandeSerializer(serializers.ModelSerializer):
         
         for ligne_data in lignes_data:
             LigneCommande.objects.create(commande=commande, **ligne_data)
-            
+
+        # Total recalculé en base par les lignes
+        commande.refresh_from_db(fields=['prix_total'])
         return commande
 
     def update(self, instance, validated_data):
@@ -283,6 +331,8 @@ class CommandeSerializer(serializers.ModelSerializer):
             # Créer les nouvelles lignes
             for ligne_data in lignes_data:
                 LigneCommande.objects.create(commande=instance, **ligne_data)
+
+            instance.refresh_from_db(fields=['prix_total'])
         
         return instance
     
@@ -306,3 +356,61 @@ class RapportCommandeSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'numero_commande', 'client', 'total_commande', 'statut', 'date_creation', 'is_vente_directe'
         ]
+
+from .models import MouvementStock
+
+class MouvementStockLigneSerializer(serializers.Serializer):
+    """
+    Ligne d'un envoi en masse de mouvements de stock. Les références
+    (produit, commande, fournisseur) sont des id vérifiés en bloc par la vue,
+    pour ne pas faire une requête par ligne.
+    """
+    produit = serializers.IntegerField()
+    type_mouvement = serializers.ChoiceField(choices=MouvementStock.TYPE_MOUVEMENT)
+    quantite = serializers.IntegerField()
+    commande = serializers.IntegerField(required=False, allow_null=True)
+    fournisseur = serializers.IntegerField(required=False, allow_null=True)
+    motif = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+    def validate(self, data):
+        if data['type_mouvement'] == 'ajustement':
+            if data['quantite'] == 0:
+                raise serializers.ValidationError({'quantite': "Un ajustement ne peut pas être nul"})
+        elif data['quantite'] <= 0:
+            raise serializers.ValidationError(
+                {'quantite': "La quantité doit être positive pour une entrée ou une sortie"}
+            )
+        return data
+
+
+from datetime import datetime
+from .models import TacheRapport
+
+class TacheRapportSerializer(serializers.ModelSerializer):
+    """Demande de rapport en arrière-plan : mêmes paramètres que GET /api/rapports/"""
+
+    class Meta:
+        model = TacheRapport
+        fields = [
+            'id', 'type_rapport', 'parametres', 'statut', 'erreur',
+            'tentatives', 'date_creation', 'date_debut', 'date_fin'
+        ]
+        read_only_fields = ['statut', 'erreur', 'tentatives', 'date_creation', 'date_debut', 'date_fin']
+
+    def validate_parametres(self, parametres):
+        if not isinstance(parametres, dict):
+            raise serializers.ValidationError("Objet {nom: valeur} attendu")
+        if any(isinstance(valeur, (dict, list)) for valeur in parametres.values()):
+            raise serializers.ValidationError("Les valeurs doivent être simples (texte ou nombre)")
+        parametres = {nom: valeur for nom, valeur in parametres.items() if nom != 'type'}
+
+        dates = {}
+        for nom in ('debut', 'fin'):
+            if parametres.get(nom):
+                try:
+                    dates[nom] = datetime.strptime(str(parametres[nom]), '%Y-%m-%d').date()
+                except ValueError:
+                    raise serializers.ValidationError({nom: "Date attendue au format AAAA-MM-JJ"})
+        if len(dates) == 2 and dates['debut'] > dates['fin']:
+            raise serializers.ValidationError("La date de début doit être antérieure à la date de fin")
+        return parametres
@@ -1,35 +1,100 @@
-
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from django.db import transaction
+from django.utils import timezone
 from api.models import (
-    Commande, CommandeClient, Client, 
-    Fournisseur, Produit, MouvementStock
+    Categorie, Client, Commande, CommandeClient, Fournisseur, LigneCommande,
+    LigneCommandeClient, MouvementStock, Produit, SuppressionCatalogue, Taxe, Utilisateur
 )
+from .utils.barcode import cache_codes_barres
+from .utils.cache_rapports import invalider_rapports
+from .utils.statistics import appliquer_changement_vente
+
+
+@receiver(pre_save, sender=CommandeClient)
+def memoriser_etat_commande_client(sender, instance, **kwargs):
+    """Relit l'état compté en base si l'instance n'a pas été chargée entièrement"""
+    if instance._state.adding or hasattr(instance, '_etat_statistique'):
+        return
+    ancienne = (
+        CommandeClient.objects
+        .filter(pk=instance.pk)
+        .only(*CommandeClient.CHAMPS_STATISTIQUE)
+        .first()
+    )
+    instance._etat_statistique = ancienne.etat_statistique() if ancienne else None
 
-@receiver([post_save, post_delete], sender=CommandeClient)
+
+@receiver(post_save, sender=CommandeClient)
 def update_stats_on_commande_client(sender, instance, **kwargs):
-    """Met à jour les stats quand une commande client change"""
-    from .utils.statistics import update_daily_stats
-    transaction.on_commit(update_daily_stats)
+    """Applique aux stats du jour la variation due à la commande (sans recalcul)"""
+    nouvel_etat = instance.etat_statistique()
+    appliquer_changement_vente(getattr(instance, '_etat_statistique', None), nouvel_etat)
+    instance._etat_statistique = nouvel_etat
 
-# signals.py
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from .models import Utilisateur
 
+@receiver(post_delete, sender=CommandeClient)
+def retirer_stats_commande_client(sender, instance, **kwargs):
+    appliquer_changement_vente(getattr(instance, '_etat_statistique', None), None)
+
+
+@receiver(post_save, sender=LigneCommande)
+@receiver(post_delete, sender=LigneCommande)
+def maj_prix_total_commande(sender, instance, **kwargs):
+    """Tient à jour le total HT stocké de la commande fournisseur"""
+    Commande.recalculer_prix_total(instance.commande_id)
+    invalider_rapports(_jour(instance.commande.date_creation))
+
+
+def _jour(instant):
+    return timezone.localdate(instant) if instant else None
+
+
+@receiver(post_save, sender=CommandeClient)
+@receiver(post_delete, sender=CommandeClient)
+@receiver(post_save, sender=Commande)
+@receiver(post_delete, sender=Commande)
+def invalider_rapports_commande(sender, instance, **kwargs):
+    invalider_rapports(_jour(instance.date_creation))
+
+
+@receiver(post_save, sender=LigneCommandeClient)
+@receiver(post_delete, sender=LigneCommandeClient)
+def invalider_rapports_ligne_client(sender, instance, **kwargs):
+    invalider_rapports(_jour(instance.commande.date_creation))
+
+
+@receiver(post_save, sender=MouvementStock)
+def invalider_rapports_mouvement(sender, instance, **kwargs):
+    invalider_rapports(_jour(instance.date_mouvement))
+
+
+@receiver(post_save, sender=Produit)
+@receiver(post_delete, sender=Produit)
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+@receiver(post_save, sender=Fournisseur)
+@receiver(post_delete, sender=Fournisseur)
 @receiver(post_save, sender=Utilisateur)
-def assign_user_modules(sender, instance, created, **kwargs):
-    if created:
-        instance.assign_default_modules()
+@receiver(post_delete, sender=Utilisateur)
+def invalider_rapports_referentiel(sender, instance, **kwargs):
+    """Noms et fiches affichés aussi dans les rapports des périodes closes"""
+    # Une connexion (last_login) ne change rien aux rapports
+    if kwargs.get('update_fields') == {'last_login'}:
+        return
+    invalider_rapports(historique=True)
 
 
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
-from api.models import LigneCommandeClient, CommandeClient
+@receiver([post_save, post_delete], sender=Produit)
+def invalider_cache_code_barre(sender, instance, **kwargs):
+    cache_codes_barres.invalider(instance.pk, instance.code_barre or None)
+
 
-@receiver([post_save, post_delete], sender=LigneCommandeClient)
-def update_total_commande(sender, instance, **kwargs):
-    commande = instance.commande
-    if commande:
-        commande.calculer_total_commande()
+@receiver(post_delete, sender=Produit)
+@receiver(post_delete, sender=Taxe)
+@receiver(post_delete, sender=Categorie)
+def tracer_suppression_catalogue(sender, instance, **kwargs):
+    """Suppressions définitives transmises aux caisses par la synchro"""
+    SuppressionCatalogue.objects.create(
+        modele=sender._meta.model_name,
+        objet_id=instance.pk,
+    )
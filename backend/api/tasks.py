@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+import socket
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from api.models import TacheRapport
+
+logger = logging.getLogger(__name__)
+
+# Une tâche EN_COURS depuis plus longtemps est considérée comme orpheline
+# (worker arrêté en plein calcul) et remise en file, au plus MAX_TENTATIVES fois
+DELAI_REPRISE = timedelta(minutes=30)
+MAX_TENTATIVES = 3
+
+
+def nom_worker():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def soumettre_rapport(utilisateur, type_rapport, parametres):
+    """
+    Met un rapport en file. Une demande identique encore active du même
+    utilisateur est réutilisée plutôt que dupliquée.
+    """
+    actives = TacheRapport.objects.filter(
+        utilisateur=utilisateur, type_rapport=type_rapport,
+        parametres=parametres, statut__in=TacheRapport.STATUTS_ACTIFS
+    )
+    while True:
+        existante = actives.order_by('id').first()
+        if existante is not None:
+            return existante, False
+        try:
+            # Contrainte tache_rapport_active_unique : une demande identique
+            # concurrente ne peut pas créer un doublon
+            with transaction.atomic():
+                tache = TacheRapport.objects.create(
+                    utilisateur=utilisateur, type_rapport=type_rapport, parametres=parametres
+                )
+            return tache, True
+        except IntegrityError:
+            continue
+
+
+def prendre_tache(worker=None):
+    """
+    Réserve la plus ancienne tâche en attente. SKIP LOCKED : plusieurs
+    workers se partagent la file sans s'attendre ni prendre la même tâche.
+    Retourne None si la file est vide.
+    """
+    with transaction.atomic():
+        tache = (
+            TacheRapport.objects
+            .select_for_update(skip_locked=True)
+            .filter(statut='EN_ATTENTE')
+            .order_by('id')
+            .first()
+        )
+        if tache is None:
+            return None
+        tache.statut = 'EN_COURS'
+        tache.date_debut = timezone.now()
+        tache.tentatives += 1
+        tache.worker = worker or nom_worker()
+        tache.save(update_fields=['statut', 'date_debut', 'tentatives', 'worker'])
+    return tache
+
+
+def calculer_rapport(tache):
+    """
+    Calcule le rapport comme GET /api/rapports/ pour le demandeur (mêmes
+    handlers) et retourne la réponse DRF. Calcul toujours refait : le
+    worker ne sert pas de résultat en cache.
+    """
+    from api.views import RapportAPIView
+
+    http = HttpRequest()
+    http.method = 'GET'
+    http.GET = QueryDict(mutable=True)
+    http.GET.update({nom: str(valeur) for nom, valeur in tache.parametres.items()})
+    http.GET['type'] = tache.type_rapport
+    requete = Request(http)
+    requete.user = tache.utilisateur
+    return RapportAPIView(utiliser_cache=False).get(requete)
+
+
+def executer_tache(tache):
+    """Calcule une tâche réservée et enregistre son résultat ou son erreur"""
+    try:
+        reponse = calculer_rapport(tache)
+        contenu = json.loads(JSONRenderer().render(reponse.data))
+        if reponse.status_code == 200:
+            tache.statut, tache.resultat, tache.erreur = 'TERMINEE', contenu, ''
+        else:
+            tache.statut = 'ECHEC'
+            tache.erreur = contenu.get('error', '') if isinstance(contenu, dict) else str(contenu)
+    except Exception as e:
+        logger.error(f"Erreur tâche rapport {tache.pk}: {str(e)}", exc_info=True)
+        tache.statut, tache.erreur = 'ECHEC', str(e)
+
+    tache.date_fin = timezone.now()
+    # Ne pas écraser une reprise si la tâche a été rendue à la file entre-temps
+    TacheRapport.objects.filter(pk=tache.pk, statut='EN_COURS', worker=tache.worker).update(
+        statut=tache.statut, resultat=tache.resultat, erreur=tache.erreur, date_fin=tache.date_fin
+    )
+    return tache
+
+
+def rendre_tache(tache):
+    """Remet en file une tâche réservée par ce worker (arrêt du worker)"""
+    TacheRapport.objects.filter(pk=tache.pk, statut='EN_COURS', worker=tache.worker).update(
+        statut='EN_ATTENTE', worker=''
+    )
+
+
+def reprendre_taches_orphelines(delai=DELAI_REPRISE):
+    """
+    Remet en file les tâches EN_COURS depuis plus de `delai`, ou les passe
+    en ECHEC après MAX_TENTATIVES. Retourne le nombre de tâches reprises.
+    """
+    orphelines = TacheRapport.objects.filter(statut='EN_COURS', date_debut__lt=timezone.now() - delai)
+    orphelines.filter(tentatives__gte=MAX_TENTATIVES).update(
+        statut='ECHEC', erreur="Abandonnée après plusieurs interruptions du worker", date_fin=timezone.now()
+    )
+    return orphelines.update(statut='EN_ATTENTE', worker='')
+
+
+def purger_taches(jours):
+    """Supprime les tâches terminées (ou en échec) depuis plus de `jours` jours"""
+    limite = timezone.now() - timedelta(days=jours)
+    supprimees, _ = TacheRapport.objects.filter(
+        statut__in=['TERMINEE', 'ECHEC'], date_fin__lt=limite
+    ).delete()
+    return supprimees
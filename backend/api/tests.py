@@ -1,3 +1,1581 @@
-from django.test import TestCase
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import (
+    Client, Commande, CommandeClient, Fournisseur, InstantaneStock, LigneCommande, LigneCommandeClient,
+    MouvementStock, Produit, Statistique, StatistiqueHoraire, StatistiqueMensuelle, TacheRapport, Taxe,
+    Utilisateur
+)
+from .tasks import executer_tache, prendre_tache, soumettre_rapport
+from .views import RapportAPIView
+from .utils.barcode import cache_codes_barres, rechercher_par_code_barre
+from .utils.cache_rapports import cle_rapport, verifier_cache_partage
+from .utils.export_colonnes import chemin_partition, exporter_jours, pyarrow_disponible
+from .utils.inventaire import photographier_stock, stock_a_date
+from .utils.partitions import creer_partition, nom_partition, premier_du_mois
+from .utils.previsions import calculer_previsions, lisser, prevoir
+from .utils.reapprovisionnement import TYPE_REAPPRO, generer_commandes_reappro
+from .utils.sequences import TAILLE_BLOC, GenerateurSequence
+from .utils.statistics import serie_ventes
+from .utils.stock import reserver_stock
+from .utils.sync import jeton_courant
+
+
+class SynchroCatalogueTests(TestCase):
+    """Jeton de synchro des caisses ordonné par les commits"""
+
+    def setUp(self):
+        self.tva = Taxe.objects.create(nom='TVA 18%', taux=Decimal('18'))
+        self.produit = Produit.objects.create(designation='Stylo', prix_vente=Decimal('2'), tva=self.tva)
+        self.api = APIClient()
+        self.api.force_authenticate(Utilisateur.objects.create_user(username='caisse', password='x'))
+
+    def version(self):
+        return Produit.objects.values_list('version_synchro', flat=True).get(pk=self.produit.pk)
+
+    def test_ecriture_non_validee_couverte_par_le_jeton(self):
+        # La transaction du test est encore ouverte : ses écritures sont
+        # postérieures ou égales au jeton et seront renvoyées au prochain appel
+        self.assertGreaterEqual(self.version(), jeton_courant())
+        reponse = self.api.get(reverse('sync-catalog'), {'since': str(jeton_courant())})
+        self.assertEqual([produit['id'] for produit in reponse.data['produits']], [self.produit.pk])
+
+    def test_trigger_sur_tous_les_chemins_d_ecriture(self):
+        Produit.objects.filter(pk=self.produit.pk).update(version_synchro=0)
+        # Champs non envoyés aux caisses : pas de nouvelle version
+        Produit.objects.filter(pk=self.produit.pk).update(demande_prevue=Decimal('1.5'))
+        self.assertEqual(self.version(), 0)
+        # update() ensembliste (sans auto_now ni signal) : nouvelle version
+        Produit.objects.filter(pk=self.produit.pk).update(quantite_stock=F('quantite_stock') + 1)
+        self.assertGreater(self.version(), 0)
+
+        reponse = self.api.get(reverse('sync-catalog'), {'since': '1'})
+        self.assertEqual([produit['id'] for produit in reponse.data['produits']], [self.produit.pk])
+        self.assertFalse(reponse.data['complet'])
+
+    def test_ancien_jeton_horodate_synchro_complete(self):
+        reponse = self.api.get(reverse('sync-catalog'), {'since': '2026-01-01T00:00:00.000000Z'})
+        self.assertTrue(reponse.data['complet'])
+        self.assertEqual(self.api.get(reverse('sync-catalog'), {'since': 'abc'}).status_code, 400)
+
+
+class ScanCodeBarreTests(TransactionTestCase):
+    """
+    Scan par code barre : fiche en cache revérifiée par version_synchro.
+    TransactionTestCase : chaque écriture doit être sa propre transaction.
+    """
+
+    def setUp(self):
+        cache_codes_barres.clear()
+        self.utilisateur = Utilisateur.objects.create_user(username='caissier', password='x')
+        tva = Taxe.objects.create(nom='TVA 18%', taux=Decimal('18'))
+        self.produit = Produit.objects.create(
+            designation='Stylo', prix_vente=Decimal('12'), tva=tva, code_barre='3017620422003'
+        )
+        self.api = APIClient()
+        self.api.force_authenticate(self.utilisateur)
+        self.url = reverse('produit-by-barcode', args=['3017620422003'])
+
+    def test_scan(self):
+        reponse = self.api.get(self.url)
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual((reponse.data['id'], reponse.data['prix_vente']), (self.produit.pk, '12.00'))
+        # En cache : seule la version est relue
+        with CaptureQueriesContext(connection) as requetes:
+            self.assertEqual(rechercher_par_code_barre('3017620422003')['id'], self.produit.pk)
+        self.assertEqual(len(requetes.captured_queries), 1)
+        self.assertIn('version_synchro', requetes.captured_queries[0]['sql'])
+
+        self.assertEqual(self.api.get(reverse('produit-by-barcode', args=['0000000000000'])).status_code, 404)
+
+    def test_ecritures_sans_signal_invalident(self):
+        self.assertEqual(self.api.get(self.url).data['prix_vente'], '12.00')
+        Produit.objects.filter(pk=self.produit.pk).update(prix_vente=Decimal('15'))
+        self.assertEqual(self.api.get(self.url).data['prix_vente'], '15.00')
+
+        self.produit.prix_vente = Decimal('16')
+        Produit.objects.bulk_update([self.produit], ['prix_vente'])
+        self.assertEqual(self.api.get(self.url).data['prix_vente'], '16.00')
+
+        Produit.objects.filter(pk=self.produit.pk).update(est_actif=False)
+        self.assertEqual(self.api.get(self.url).status_code, 404)
+
+    def test_signal_invalide(self):
+        self.assertEqual(self.api.get(self.url).status_code, 200)
+        self.produit.code_barre = '5000112637922'
+        self.produit.save()
+        self.assertEqual(self.api.get(self.url).status_code, 404)
+        self.assertEqual(rechercher_par_code_barre('5000112637922')['id'], self.produit.pk)
+
+
+class ProduitListeTests(TestCase):
+    """Liste des produits : pagination par curseur optionnelle et ?fields="""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tva = Taxe.objects.create(nom='TVA 18%', taux=Decimal('18'))
+        cls.produits = [
+            Produit.objects.create(designation=f'Produit {i}', prix_vente=Decimal('10'), tva=cls.tva)
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(Utilisateur.objects.create_user(username='caisse', password='x'))
+
+    def test_liste_non_paginee_sans_parametre(self):
+        # Le frontend consomme la liste brute
+        reponse = self.api.get(reverse('produit-list'))
+        self.assertEqual(reponse.status_code, 200)
+        self.assertIsInstance(reponse.data, list)
+        self.assertEqual({produit['id'] for produit in reponse.data}, {produit.pk for produit in self.produits})
+
+    def test_page_par_curseur(self):
+        reponse = self.api.get(reverse('produit-list'), {'page_size': 2})
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual([produit['id'] for produit in reponse.data['results']], [p.pk for p in self.produits[:2]])
+        self.assertIsNotNone(reponse.data['next'])
+
+    def test_ordre_stable_entre_les_pages(self):
+        vus = []
+        suivante = reverse('produit-list') + '?page_size=2'
+        while suivante:
+            reponse = self.api.get(suivante)
+            vus += [produit['id'] for produit in reponse.data['results']]
+            if len(vus) == 2:
+                # Une insertion entre deux pages ne décale ni ne duplique rien
+                nouveau = Produit.objects.create(designation='Nouveau', prix_vente=Decimal('1'), tva=self.tva)
+            suivante = reponse.data['next']
+        self.assertEqual(vus, [p.pk for p in self.produits] + [nouveau.pk])
+
+    def test_champs_demandes(self):
+        with CaptureQueriesContext(connection) as requetes:
+            reponse = self.api.get(reverse('produit-list'), {'fields': 'id,designation'})
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(set(reponse.data[0]), {'id', 'designation'})
+        sql = next(q['sql'] for q in requetes.captured_queries if 'FROM "api_produit"' in q['sql'])
+        self.assertNotIn('"description"', sql)
+
+    def test_champ_inconnu(self):
+        reponse = self.api.get(reverse('produit-list'), {'fields': 'id,inconnu'})
+        self.assertEqual(reponse.status_code, 400)
+        self.assertIn('inconnu', reponse.data['fields'])
+
+
+class SerieVentesTests(TestCase):
+    """Séries lues dans les rollups, totaux limités à la période demandée"""
+
+    def test_mois_entames_limites_aux_jours_demandes(self):
+        Statistique.objects.create(date=date(2025, 1, 5), nb_ventes=4, montant_total=Decimal('40'))
+        Statistique.objects.create(date=date(2025, 1, 20), nb_ventes=1, montant_total=Decimal('10'))
+        Statistique.objects.create(date=date(2025, 3, 2), nb_ventes=7, montant_total=Decimal('70'))
+        StatistiqueMensuelle.objects.create(periode=date(2025, 1, 1), nb_ventes=5, montant_total=Decimal('50'))
+        StatistiqueMensuelle.objects.create(periode=date(2025, 2, 1), nb_ventes=2, montant_total=Decimal('20'))
+        StatistiqueMensuelle.objects.create(periode=date(2025, 3, 1), nb_ventes=7, montant_total=Decimal('70'))
+
+        granularite, debut, serie, totaux = serie_ventes(date(2025, 1, 15), date(2025, 2, 28), 'mois')
+
+        self.assertEqual((granularite, debut), ('mois', date(2025, 1, 15)))
+        self.assertEqual([(point['date'], point['ventes']) for point in serie], [('2025-01', 1), ('2025-02', 2)])
+        self.assertEqual((totaux['nb_ventes'], totaux['montant_total']), (3, Decimal('30')))
+
+        _, _, serie, totaux = serie_ventes(date(2025, 2, 1), date(2025, 3, 1), 'mois')
+        self.assertEqual([point['ventes'] for point in serie], [2, 0])
+        self.assertEqual(totaux['nb_ventes'], 2)
+
+
+class StatistiquesIncrementalesTests(TestCase):
+    """Stats du jour, de l'heure et du mois tenues par variations à chaque écriture de commande client"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = Utilisateur.objects.create_user(username='vendeur', password='x')
+        cls.tva = Taxe.objects.create(nom='TVA 18%', taux=Decimal('18'))
+        cls.client_commande = Client.objects.create(
+            nom_client='Client stats', adresse='1 rue du Test', code_postal='75000',
+            ville='Paris', telephone='0600000000', email='stats@test.fr'
+        )
+
+    def creer(self, **champs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return CommandeClient.objects.create(
+                client=self.client_commande, utilisateur=self.utilisateur, tva=self.tva,
+                statut='VALIDEE', **champs
+            )
+
+    def enregistrer(self, commande):
+        with self.captureOnCommitCallbacks(execute=True):
+            commande.save()
+
+    def compteurs(self, commande=None):
+        """Compteurs de ventes du jour, de l'heure et du mois de la commande (maintenant par défaut)"""
+        champs = ['nb_ventes', 'nb_ventes_directes', 'nb_commandes_clients',
+                  'montant_total', 'montant_ventes_directes', 'montant_commandes']
+        instant = timezone.localtime(commande.date_creation if commande else None)
+        heure = instant.replace(minute=0, second=0, microsecond=0)
+        lignes = [
+            Statistique.objects.filter(date=instant.date()),
+            StatistiqueHoraire.objects.filter(periode=heure),
+            StatistiqueMensuelle.objects.filter(periode=instant.date().replace(day=1)),
+        ]
+        valeurs = [ligne.values_list(*champs).first() or (0, 0, 0, 0, 0, 0) for ligne in lignes]
+        # Les trois niveaux avancent ensemble
+        self.assertEqual(len(set(valeurs)), 1, valeurs)
+        return valeurs[0]
+
+    def test_creation(self):
+        commande = self.creer(total_commande=Decimal('50'))
+        self.creer(total_commande=Decimal('20'), is_vente_directe=True)
+        self.assertEqual(self.compteurs(commande), (2, 1, 1, Decimal('70'), Decimal('20'), Decimal('50')))
+
+    def test_changement_de_statut(self):
+        commande = self.creer(total_commande=Decimal('50'))
+        commande.statut = 'ANNULEE'
+        self.enregistrer(commande)
+        self.assertEqual(self.compteurs(commande), (0, 0, 0, 0, 0, 0))
+
+        commande.statut = 'LIVREE'
+        self.enregistrer(commande)
+        self.assertEqual(self.compteurs(commande), (1, 0, 1, Decimal('50'), 0, Decimal('50')))
+
+    def test_changement_de_montant_et_de_type(self):
+        commande = self.creer(total_commande=Decimal('50'))
+        commande.total_commande = Decimal('80')
+        self.enregistrer(commande)
+        self.assertEqual(self.compteurs(commande), (1, 0, 1, Decimal('80'), 0, Decimal('80')))
+
+        # Instance chargée partiellement : l'état compté est relu en base (pre_save)
+        partielle = CommandeClient.objects.only('id').get(pk=commande.pk)
+        partielle.is_vente_directe = True
+        with self.captureOnCommitCallbacks(execute=True):
+            partielle.save(update_fields=['is_vente_directe'])
+        self.assertEqual(self.compteurs(commande), (1, 1, 0, Decimal('80'), Decimal('80'), 0))
+
+    def test_suppression(self):
+        commande = self.creer(total_commande=Decimal('50'))
+        with self.captureOnCommitCallbacks(execute=True):
+            commande.delete()
+        self.assertEqual(self.compteurs(commande), (0, 0, 0, 0, 0, 0))
+
+    def test_annulation_de_transaction_sans_variation(self):
+        with self.captureOnCommitCallbacks(execute=True) as rappels:
+            with transaction.atomic():
+                CommandeClient.objects.create(
+                    client=self.client_commande, utilisateur=self.utilisateur, tva=self.tva,
+                    statut='VALIDEE', total_commande=Decimal('50')
+                )
+                transaction.set_rollback(True)
+        self.assertEqual(rappels, [])
+        self.assertEqual(self.compteurs(), (0, 0, 0, 0, 0, 0))
+
+    def test_reconciliation(self):
+        commande = self.creer(total_commande=Decimal('50'))
+        # Écriture sans signal : les compteurs ne la voient pas
+        CommandeClient.objects.filter(pk=commande.pk).update(total_commande=Decimal('65'))
+        self.assertEqual(self.compteurs(commande)[3], Decimal('50'))
+
+        call_command('reconcilier_statistiques', jours=1, stdout=StringIO())
+        self.assertEqual(self.compteurs(commande), (1, 0, 1, Decimal('65'), 0, Decimal('65')))
+
+
+class ReconstructionStatistiquesTests(TransactionTestCase):
+    """La reconstruction parallèle redonne les compteurs tenus par le chemin incrémental"""
+
+    CHAMPS = ('nb_ventes', 'nb_ventes_directes', 'nb_commandes_clients',
+              'montant_total', 'montant_ventes_directes', 'montant_commandes')
+
+    def setUp(self):
+        utilisateur = Utilisateur.objects.create_user(username='vendeur', password='x')
+        tva = Taxe.objects.create(nom='TVA 18%', taux=Decimal('18'))
+        client_commande = Client.objects.create(
+            nom_client='Client stats', adresse='1 rue du Test', code_postal='75000',
+            ville='Paris', telephone='0600000000', email='stats@test.fr'
+        )
+        self.aujourdhui = timezone.localdate()
+        self.debut = self.aujourdhui - timedelta(days=3)
+        ventes = [
+            (3, time(9, 15), 'VALIDEE', False, '50'),
+            (3, time(9, 45), 'LIVREE', True, '12.50'),
+            (3, time(16, 0), 'VALIDEE', False, '30'),
+            (2, time(11, 0), 'ANNULEE', False, '99'),
+            (1, time(23, 30), 'VALIDEE', True, '8'),
+        ]
+        # Commandes datées dans le passé : les signaux tiennent les
+        # compteurs du jour, de l'heure et du mois de leur date de création
+        for jours, heure, statut, directe, montant in ventes:
+            instant = timezone.make_aware(datetime.combine(self.aujourdhui - timedelta(days=jours), heure))
+            with mock.patch('django.utils.timezone.now', return_value=instant):
+                CommandeClient.objects.create(
+                    client=client_commande, utilisateur=utilisateur, tva=tva, statut=statut,
+                    is_vente_directe=directe, total_commande=Decimal(montant)
+                )
+        CommandeClient.objects.create(
+            client=client_commande, utilisateur=utilisateur, tva=tva, statut='VALIDEE',
+            total_commande=Decimal('20')
+        )
+
+    def compteurs(self):
+        # La reconstruction écrit une ligne par jour, même sans vente
+        return (
+            list(Statistique.objects.filter(date__gte=self.debut).exclude(nb_ventes=0).order_by('date').values_list('date', *self.CHAMPS)),
+            list(StatistiqueHoraire.objects.order_by('periode').values_list('periode', *self.CHAMPS)),
+            list(StatistiqueMensuelle.objects.order_by('periode').values_list('periode', *self.CHAMPS)),
+        )
+
+    def reconstruire(self, workers):
+        Statistique.objects.all().delete()
+        StatistiqueHoraire.objects.all().delete()
+        StatistiqueMensuelle.objects.all().delete()
+        call_command(
+            'reconstruire_statistiques', debut=self.debut.strftime('%Y-%m-%d'),
+            workers=workers, taille_lot=1, stdout=StringIO()
+        )
+        return self.compteurs()
+
+    def test_parallele_identique_a_l_incremental(self):
+        incremental = self.compteurs()
+        self.assertEqual(len(incremental[1]), 4)
+
+        # Quatre lots d'un jour répartis sur deux processus
+        self.assertEqual(self.reconstruire(workers=2), incremental)
+        self.assertEqual(self.reconstruire(workers=1), incremental)
+
+
+class CommandeClientRequetesTests(TestCase):
+    """Le nombre de requêtes de la liste des commandes clients ne dépend pas du volume"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = Utilisateur.objects.create_user(username='vendeur', password='x')
+        cls.tva = Taxe.objects.create(nom='TVA 18%', taux=Decimal('18'))
+        cls.client_commande = Client.objects.create(
+            nom_client='Client test', adresse='1 rue du Test', code_postal='75000',
+            ville='Paris', telephone='0600000000', email='client@test.fr'
+        )
+        cls.produits = [
+            Produit.objects.create(designation=f'Produit {i}', prix_vente=Decimal('10'), tva=cls.tva)
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.utilisateur)
+
+    def creer_commandes(self, nombre):
+        debut = CommandeClient.objects.count()
+        commandes = CommandeClient.objects.bulk_create([
+            CommandeClient(
+                numero_commande=f'TEST-{debut + i}', client=self.client_commande,
+                utilisateur=self.utilisateur, tva=self.tva
+            )
+            for i in range(nombre)
+        ])
+        LigneCommandeClient.objects.bulk_create([
+            LigneCommandeClient(commande=commande, produit=produit, quantite=1, prix_unitaire=produit.prix_vente)
+            for commande in commandes
+            for produit in self.produits
+        ])
+        return commandes
+
+    def test_liste_nombre_de_requetes_constant(self):
+        url = reverse('commandeclient-list')
+        self.creer_commandes(2)
+        # Commandes (client, tva, vendeur joints) + lignes + produits
+        with self.assertNumQueries(3):
+            self.api.get(url)
+
+        self.creer_commandes(20)
+        with self.assertNumQueries(3):
+            reponse = self.api.get(url)
+        self.assertEqual(len(reponse.json()), 22)
+
+    def test_detail_nombre_de_requetes(self):
+        commande = self.creer_commandes(1)[0]
+        with self.assertNumQueries(3):
+            reponse = self.api.get(reverse('commandeclient-detail', args=[commande.pk]))
+        self.assertEqual(len(reponse.json()['lignes']), 5)
+
+    def test_lignes_resume(self):
+        self.creer_commandes(10)
+        with self.assertNumQueries(3):
+            reponse = self.api.get(reverse('commandeclient-list'), {'lignes': 'resume'})
+
+        ligne = reponse.json()[0]['lignes'][0]
+        self.assertEqual(set(ligne['produit']), {'id', 'designation'})
+        self.assertIn('total_ligne_ht', ligne)
+
+
+class SequencesTests(TestCase):
+    """Numéros tirés par blocs (hi/lo) : uniques entre processus, sans requête dans un bloc"""
+
+    def generateur(self):
+        return GenerateurSequence('api_produit_reference_seq', '{}')
+
+    def test_blocs_sans_chevauchement(self):
+        # Deux workers sur la même séquence
+        premier, second = self.generateur(), self.generateur()
+        numeros = premier.reserver(3) + second.reserver(3) + premier.reserver(TAILLE_BLOC) + second.reserver(5)
+        self.assertEqual(len(set(numeros)), len(numeros))
+
+        debut_premier, debut_second = int(numeros[0]), int(numeros[3])
+        self.assertGreaterEqual(abs(debut_second - debut_premier), TAILLE_BLOC)
+
+    def test_passage_de_bloc(self):
+        generateur = self.generateur()
+        with self.assertNumQueries(1):
+            numeros = generateur.reserver(TAILLE_BLOC - 1)
+        with self.assertNumQueries(0):
+            numeros += generateur.reserver(1)
+        # Le bloc est épuisé : un seul nextval() pour tout le lot suivant
+        with self.assertNumQueries(1):
+            numeros += generateur.reserver(2)
+        entiers = [int(numero) for numero in numeros]
+        self.assertEqual(entiers[:TAILLE_BLOC], list(range(entiers[0], entiers[0] + TAILLE_BLOC)))
+        self.assertGreaterEqual(entiers[TAILLE_BLOC], entiers[0] + TAILLE_BLOC)
+        self.assertEqual(entiers[TAILLE_BLOC + 1], entiers[TAILLE_BLOC] + 1)
+
+    def test_processus_fils_prend_un_nouveau_bloc(self):
+        generateur = self.generateur()
+        generateur.reserver(1)
+        with mock.patch('api.utils.sequences.os.getpid', return_value=-1), self.assertNumQueries(1):
+            generateur.reserver(1)
+
+    def test_demarrage_apres_les_numeros_existants(self):
+        tva = Taxe.objects.create(nom='TVA 18%', taux=Decimal('18'))
+        client_commande = Client.objects.create(
+            nom_client='Client numéros', adresse='1 rue du Test', code_postal='75000',
+            ville='Paris', telephone='0600000000', email='numeros@test.fr'
+        )
+        produit = Produit.objects.create(designation='Ancien', prix_vente=Decimal('1'), tva=tva)
+        Produit.objects.filter(pk=produit.pk).update(reference='REF-120')
+        Produit.objects.create(designation='Sans chiffres', prix_vente=Decimal('1'), tva=tva, reference='REF-X')
+        for numero in ('CMD-007', 'CMD-315'):
+            CommandeClient.objects.create(client=client_commande, tva=tva, numero_commande=numero)
+
+        migration = importlib.import_module('api.migrations.0011_sequences_numerotation')
+        sequences = [
+            ('test_reference_seq', 'Produit', 'reference'),
+            ('test_numero_seq', 'CommandeClient', 'numero_commande'),
+        ]
+        with mock.patch.object(migration, 'SEQUENCES', sequences), connection.schema_editor() as editeur:
+            migration.creer_sequences(django_apps, editeur)
+
+        self.assertEqual(GenerateurSequence('test_reference_seq', 'REF-{}').suivant(), 'REF-121')
+        self.assertEqual(GenerateurSequence('test_numero_seq', 'CMD-{:03d}').suivant(), 'CMD-316')
+
+
+class VenteDirecteTests(TestCase):
+    """Vente directe : décrément du stock en une requête (reserver_stock) après l'écriture de la commande"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = Utilisateur.objects.create_user(username='caisse', password='x')
+        cls.tva = Taxe.objects.create(nom='TVA 18%', taux=Decimal('18'))
+        cls.client_commande = Client.objects.create(
+            nom_client='Client comptoir', adresse='1 rue du Test', code_postal='75000',
+            ville='Paris', telephone='0600000000', email='comptoir@test.fr'
+        )
+        cls.stylo = Produit.objects.create(designation='Stylo', prix_vente=Decimal('2'), tva=cls.tva, quantite_stock=10)
+        cls.gomme = Produit.objects.create(designation='Gomme', prix_vente=Decimal('1'), tva=cls.tva, quantite_stock=1)
+        cls.regle = Produit.objects.create(designation='Règle', prix_vente=Decimal('3'), tva=cls.tva, quantite_stock=5)
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.utilisateur)
+
+    def vendre(self, *lignes):
+        return self.api.post(reverse('commandeclient-list'), {
+            'client_id': self.client_commande.pk, 'tva': self.tva.pk, 'is_vente_directe': True,
+            'lignes': [
+                {'produit_id': produit.pk, 'quantite': quantite, 'prix_unitaire': str(produit.prix_vente), 'remise_ligne': '0'}
+                for produit, quantite in lignes
+            ],
+        }, format='json')
+
+    def stocks(self):
+        return dict(
+            Produit.objects.filter(pk__in=[self.stylo.pk, self.gomme.pk]).values_list('designation', 'quantite_stock')
+        )
+
+    def test_vente(self):
+        reponse = self.vendre((self.stylo, 3), (self.gomme, 1))
+        self.assertEqual(reponse.status_code, 201)
+        self.assertEqual(self.stocks(), {'Stylo': 7, 'Gomme': 0})
+
+        sorties = MouvementStock.objects.filter(type_mouvement='sortie').order_by('produit_id')
+        self.assertEqual(
+            [(mouvement.produit_id, mouvement.quantite, mouvement.utilisateur_id) for mouvement in sorties],
+            [(self.stylo.pk, 3, self.utilisateur.pk), (self.gomme.pk, 1, self.utilisateur.pk)]
+        )
+        self.assertEqual(sorties[0].motif, f"Vente {reponse.data['numero_commande']}")
+
+    def test_rupture_annule_toute_la_vente(self):
+        reponse = self.vendre((self.regle, 2), (self.stylo, 11), (self.gomme, 2))
+        self.assertEqual(reponse.status_code, 400)
+        # Un message par ligne en rupture, dans l'ordre des produits
+        self.assertEqual(len(reponse.data), 2)
+        self.assertIn('Stock insuffisant pour Stylo. Stock actuel: 10', str(reponse.data[0]))
+        self.assertIn('Stock insuffisant pour Gomme. Stock actuel: 1', str(reponse.data[1]))
+
+        # La ligne suffisante (règle) a été décrémentée puis annulée avec le reste
+        self.assertEqual(self.stocks(), {'Stylo': 10, 'Gomme': 1})
+        self.assertEqual(Produit.objects.get(pk=self.regle.pk).quantite_stock, 5)
+        self.assertFalse(MouvementStock.objects.filter(type_mouvement='sortie').exists())
+        self.assertFalse(CommandeClient.objects.exists())
+
+    def test_quantites_d_un_meme_produit_sommees(self):
+        with transaction.atomic():
+            # 6 + 5 > 10 : refusé alors que chaque quantité seule passerait
+            self.assertEqual(
+                [rupture['produit_id'] for rupture in reserver_stock({self.stylo.pk: 6 + 5})], [self.stylo.pk]
+            )
+            transaction.set_rollback(True)
+        self.assertEqual(reserver_stock({self.stylo.pk: 6 + 4, self.gomme.pk: 1}), [])
+        self.assertEqual(self.stocks(), {'Stylo': 0, 'Gomme': 0})
+
+        # Un produit en double dans la même vente est refusé avant toute écriture
+        reponse = self.vendre((self.gomme, 1), (self.gomme, 1))
+        self.assertEqual(reponse.status_code, 400)
+
+    def test_reservation_apres_ecriture_de_la_commande(self):
+        appels = []
+
+        def reserver(quantites, **options):
+            # La commande et ses lignes existent déjà quand le stock est réservé
+            commande = CommandeClient.objects.get()
+            appels.append((quantites, options['motif'], commande.lignes.count()))
+            return reserver_stock(quantites, **options)
+
+        with mock.patch('api.views.reserver_stock', side_effect=reserver):
+            reponse = self.vendre((self.stylo, 2), (self.gomme, 1))
+        self.assertEqual(reponse.status_code, 201)
+        self.assertEqual(
+            appels, [({self.stylo.pk: 2, self.gomme.pk: 1}, f"Vente {reponse.data['numero_commande']}", 2)]
+        )
+
+
+class ExportTests(TestCase):
+    """Exports des ventes : flux CSV/NDJSON et table de faits colonnaire (Parquet/Arrow)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = Utilisateur.objects.create_user(username='exports', password='x')
+        cls.tva = Taxe.objects.create(nom='TVA 18%', taux=Decimal('18'))
+        cls.client_commande = Client.objects.create(
+            nom_client='Client export', adresse='1 rue du Test', code_postal='75000',
+            ville='Paris', telephone='0600000000', email='export@test.fr'
+        )
+        cls.produits = [
+            Produit.objects.create(designation=f'Produit {i}', prix_vente=Decimal('10'), tva=cls.tva)
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.utilisateur)
+
+    def creer_commandes(self, nombre):
+        commandes = CommandeClient.objects.bulk_create([
+            CommandeClient(
+                numero_commande=f'EXPORT-{i}', client=self.client_commande,
+                utilisateur=self.utilisateur, tva=self.tva
+            )
+            for i in range(nombre)
+        ])
+        LigneCommandeClient.objects.bulk_create([
+            LigneCommandeClient(commande=commande, produit=produit, quantite=1, prix_unitaire=produit.prix_vente)
+            for commande in commandes
+            for produit in self.produits
+        ])
+        return commandes
+
+    def test_export_ventes(self):
+        commandes = self.creer_commandes(3)
+        url = reverse('exports', args=['ventes', 'csv'])
+        # Curseur serveur sur les commandes + lignes du lot
+        with self.assertNumQueries(2):
+            reponse = self.api.get(url)
+            lignes = b''.join(reponse.streaming_content).decode().splitlines()
+        self.assertEqual(len(lignes), 1 + 3 * len(self.produits))
+        self.assertTrue(lignes[0].startswith('id,numero_commande,'))
+
+        reponse = self.api.get(reverse('exports', args=['ventes', 'ndjson']))
+        documents = [json.loads(ligne) for ligne in b''.join(reponse.streaming_content).decode().splitlines()]
+        self.assertEqual([document['id'] for document in documents], [commande.pk for commande in commandes])
+        self.assertEqual(documents[0]['lignes'][0]['prix_unitaire'], '10.00')
+
+
+    @skipUnless(pyarrow_disponible(), "pyarrow non installé")
+    def test_export_faits_incremental(self):
+        import pyarrow.parquet as pq
+
+        self.creer_commandes(2)
+        aujourd_hui = timezone.localdate()
+        with tempfile.TemporaryDirectory() as dossier:
+            ecrits = exporter_jours(dossier, aujourd_hui, aujourd_hui)
+            self.assertEqual(ecrits, [(aujourd_hui, 2 * len(self.produits))])
+            # Jour déjà présent : rien n'est réécrit
+            self.assertEqual(exporter_jours(dossier, aujourd_hui, aujourd_hui), [])
+
+            table = pq.read_table(chemin_partition(dossier, aujourd_hui))
+            self.assertEqual(table.schema.field('prix_unitaire').type.scale, 2)
+            self.assertEqual(table.column('prix_unitaire')[0].as_py(), Decimal('10.00'))
+
+    @skipUnless(pyarrow_disponible(), "pyarrow non installé")
+    def test_export_colonnaire_http(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.creer_commandes(2)
+        reponse = self.api.get(reverse('exports', args=['ventes', 'parquet']))
+        self.assertEqual(reponse.status_code, 200)
+        self.assertIn('attachment', reponse['Content-Disposition'])
+        table = pq.read_table(pa.BufferReader(b''.join(reponse.streaming_content)))
+        self.assertEqual(table.num_rows, 2 * len(self.produits))
+        self.assertEqual(table.column('prix_unitaire')[0].as_py(), Decimal('10.00'))
+
+        reponse = self.api.get(reverse('exports', args=['ventes', 'arrow']))
+        self.assertEqual(reponse.status_code, 200)
+        table = pa.ipc.open_file(pa.BufferReader(b''.join(reponse.streaming_content))).read_all()
+        self.assertEqual(table.num_rows, 2 * len(self.produits))
+
+        # Format colonnaire réservé aux ventes
+        self.assertEqual(self.api.get(reverse('exports', args=['produits', 'parquet'])).status_code, 404)
+
+    def test_export_colonnaire_sans_pyarrow(self):
+        with mock.patch('api.views.pyarrow_disponible', return_value=False):
+            reponse = self.api.get(reverse('exports', args=['ventes', 'parquet']))
+        self.assertEqual(reponse.status_code, 501)
+        self.assertIn('pyarrow', reponse.json()['error'])
+
+
+class PartitionnementTests(TestCase):
+    """Commandes clients partitionnées par mois : routage, élagage, intégrité tenue par triggers"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = Utilisateur.objects.create_user(username='vendeur', password='x')
+        cls.tva = Taxe.objects.create(nom='TVA 18%', taux=Decimal('18'))
+        cls.produit = Produit.objects.create(designation='Produit', prix_vente=Decimal('10'), tva=cls.tva)
+        cls.client_commande = Client.objects.create(
+            nom_client='Client test', adresse='1 rue du Test', code_postal='75000',
+            ville='Paris', telephone='0600000000', email='client@test.fr'
+        )
+
+    def creer_commande(self):
+        commande = CommandeClient.objects.create(
+            utilisateur=self.utilisateur, tva=self.tva, client=self.client_commande
+        )
+        LigneCommandeClient.objects.create(
+            commande=commande, produit=self.produit, quantite=1, prix_unitaire=Decimal('10')
+        )
+        return commande
+
+    def partition_de(self, commande):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT tableoid::regclass::text FROM api_commandeclient WHERE id = %s", [commande.pk])
+            return cursor.fetchone()[0]
+
+    def test_insertion_dans_la_partition_du_mois(self):
+        commande = self.creer_commande()
+        mois = premier_du_mois(timezone.localdate())
+        self.assertEqual(self.partition_de(commande), nom_partition('api_commandeclient', mois))
+
+    def test_filtre_sur_la_date_limite_aux_partitions_du_mois(self):
+        debut = timezone.make_aware(datetime.combine(premier_du_mois(timezone.localdate()), time.min))
+        requete = CommandeClient.objects.filter(
+            date_creation__gte=debut, date_creation__lt=debut + timedelta(days=1)
+        )
+        plan = requete.explain()
+        self.assertIn(nom_partition('api_commandeclient', debut.date()), plan)
+        self.assertNotIn('api_commandeclient_defaut', plan)
+        self.assertNotIn(nom_partition('api_commandeclient', premier_du_mois(debut.date(), 1)), plan)
+
+    def test_creer_partition_vide_la_partition_par_defaut(self):
+        commande = self.creer_commande()
+        mois = date(2100, 1, 1)
+        CommandeClient.objects.filter(pk=commande.pk).update(
+            date_creation=timezone.make_aware(datetime(2100, 1, 15))
+        )
+        self.assertEqual(self.partition_de(commande), 'api_commandeclient_defaut')
+
+        self.assertTrue(creer_partition('api_commandeclient', mois))
+        self.assertEqual(self.partition_de(commande), nom_partition('api_commandeclient', mois))
+        self.assertEqual(commande.lignes.count(), 1)
+
+    def test_numero_unique_sur_toutes_les_partitions(self):
+        commande = self.creer_commande()
+        CommandeClient.objects.filter(pk=commande.pk).update(
+            date_creation=timezone.make_aware(datetime(2100, 1, 15))
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CommandeClient.objects.bulk_create([
+                CommandeClient(
+                    numero_commande=commande.numero_commande, client=self.client_commande,
+                    utilisateur=self.utilisateur, tva=self.tva
+                )
+            ])
+
+    def test_ligne_orpheline_refusee(self):
+        commande = self.creer_commande()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            LigneCommandeClient.objects.create(
+                commande_id=commande.pk + 1000, produit=self.produit, quantite=1, prix_unitaire=Decimal('10')
+            )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("DELETE FROM api_commandeclient WHERE id = %s", [commande.pk])
+
+        # L'ORM supprime les lignes avant la commande
+        commande.delete()
+        self.assertFalse(LigneCommandeClient.objects.exists())
+
+    def test_numero_non_modifiable_par_l_api(self):
+        commande = self.creer_commande()
+        api = APIClient()
+        api.force_authenticate(self.utilisateur)
+        reponse = api.patch(
+            reverse('commandeclient-detail', args=[commande.pk]),
+            {'numero_commande': 'CMD-001', 'client_id': self.client_commande.pk}, format='json'
+        )
+        self.assertEqual(reponse.status_code, 200)
+        commande.refresh_from_db()
+        self.assertNotEqual(commande.numero_commande, 'CMD-001')
+
+
+class CommandeFournisseurTests(TestCase):
+    """Total HT stocké des commandes fournisseurs et liste triée en SQL"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = Utilisateur.objects.create_user(username='acheteur', password='x', role='gestionnaire')
+        cls.tva = Taxe.objects.create(nom='TVA 18%', taux=Decimal('18'))
+        cls.fournisseur = Fournisseur.objects.create(
+            nom_fournisseur='Grossiste', adresse='-', code_postal='0', ville='-',
+            telephone='0', email='f@exemple.com', siret='0'
+        )
+        cls.produits = [
+            Produit.objects.create(designation=f'Article {i}', prix_vente=Decimal('10'), tva=cls.tva)
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.utilisateur)
+
+    def creer_commande(self, **valeurs):
+        commande = Commande.objects.create(
+            utilisateur=self.utilisateur, fournisseur=self.fournisseur, type_produit='Divers', **valeurs
+        )
+        for produit in self.produits:
+            LigneCommande.objects.create(
+                commande=commande, produit=produit, quantite=2,
+                prix_unitaire=Decimal('5'), remise_ligne=Decimal('0')
+            )
+        return commande
+
+    def test_sauvegarde_complete_ne_reecrit_pas_le_total(self):
+        commande = Commande.objects.create(
+            utilisateur=self.utilisateur, fournisseur=self.fournisseur, type_produit='Divers'
+        )
+        perimee = Commande.objects.get(pk=commande.pk)
+        LigneCommande.objects.create(
+            commande=commande, produit=self.produits[0], quantite=4,
+            prix_unitaire=Decimal('5'), remise_ligne=Decimal('0')
+        )
+
+        perimee.notes = 'Livraison le matin'
+        perimee.save()
+        self.assertEqual(perimee.prix_total, Decimal('20.00'))
+        self.assertEqual(Commande.objects.get(pk=commande.pk).prix_total, Decimal('20.00'))
+
+    def test_liste_nombre_de_requetes_constant(self):
+        url = reverse('commande-list')
+        parametres = {'ordering': '-prix_total', 'page_size': 50}
+        for _ in range(2):
+            self.creer_commande()
+        # Page (count + commandes) + lignes + produits des lignes
+        with self.assertNumQueries(4):
+            self.api.get(url, parametres)
+
+        for _ in range(15):
+            self.creer_commande()
+        with self.assertNumQueries(4):
+            reponse = self.api.get(url, parametres)
+        self.assertEqual(reponse.data['count'], 17)
+        self.assertEqual(reponse.data['results'][0]['prix_total'], '30.00')
+
+
+class JournalStockTests(TestCase):
+    """Le journal MouvementStock est la seule source des variations de stock"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = Utilisateur.objects.create_superuser(username='magasinier', password='x')
+        cls.tva = Taxe.objects.create(nom='TVA 18%', taux=Decimal('18'))
+
+    def setUp(self):
+        self.produit = Produit.objects.create(designation='Cahier', prix_vente=Decimal('3'), tva=self.tva)
+
+    def stock(self):
+        return Produit.objects.values_list('quantite_stock', flat=True).get(pk=self.produit.pk)
+
+    def test_variations_atomiques_sans_ecrasement(self):
+        perime = Produit.objects.get(pk=self.produit.pk)
+        MouvementStock(produit=self.produit, type_mouvement='entree', quantite=10).save()
+        MouvementStock(produit=self.produit, type_mouvement='sortie', quantite=3).save()
+        MouvementStock(produit=self.produit, type_mouvement='ajustement', quantite=-2).save()
+        self.assertEqual(self.stock(), 5)
+
+        # Fiche chargée avant les mouvements : sa sauvegarde ne touche pas au stock
+        perime.designation = 'Cahier 96 pages'
+        perime.save()
+        self.assertEqual((self.stock(), perime.quantite_stock), (5, 5))
+        self.produit.mark_as_inactive()
+        self.assertEqual(self.stock(), 5)
+
+    def test_mouvement_ni_modifie_ni_supprime(self):
+        mouvement = MouvementStock(produit=self.produit, type_mouvement='entree', quantite=4)
+        mouvement.save()
+        with self.assertRaises(ValueError):
+            mouvement.save()
+        with self.assertRaises(ValueError):
+            mouvement.delete()
+        self.assertEqual(self.stock(), 4)
+
+    def test_stock_initial_inscrit_au_journal(self):
+        api = APIClient()
+        api.force_authenticate(self.utilisateur)
+        reponse = api.post(
+            reverse('produit-list'),
+            {'designation': 'Classeur', 'prix_vente': '4.00', 'quantite_stock': 7, 'tva': self.tva.pk},
+            format='json'
+        )
+        self.assertEqual(reponse.status_code, 201)
+        self.assertEqual(reponse.data['quantite_stock'], 7)
+        mouvement = MouvementStock.objects.get(produit_id=reponse.data['id'])
+        self.assertEqual(
+            (mouvement.type_mouvement, mouvement.quantite, mouvement.utilisateur, mouvement.motif),
+            ('ajustement', 7, self.utilisateur, 'Stock initial')
+        )
+
+        # Création directe par l'ORM : même chemin, journal et stock concordent
+        Produit.objects.create(designation='Agenda', prix_vente=Decimal('9'), tva=self.tva, quantite_stock=4)
+        sortie = StringIO()
+        call_command('verifier_stock', stdout=sortie)
+        self.assertIn('Stock conforme au journal', sortie.getvalue())
+
+    def test_stock_non_modifiable_sur_la_fiche(self):
+        api = APIClient()
+        api.force_authenticate(self.utilisateur)
+        url = reverse('produit-detail', args=[self.produit.pk])
+        reponse = api.patch(url, {'quantite_stock': 999, 'designation': 'Cahier A4', 'prix_vente': '3.00'}, format='json')
+        self.assertEqual(reponse.status_code, 400)
+        self.assertEqual(self.stock(), 0)
+
+        # Valeur inchangée (formulaire d'édition complet) : acceptée
+        reponse = api.patch(url, {'quantite_stock': 0, 'designation': 'Cahier A4', 'prix_vente': '3.00'}, format='json')
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.data['designation'], 'Cahier A4')
+
+    def test_admin_journal_sans_modification_ni_suppression(self):
+        MouvementStock(produit=self.produit, type_mouvement='entree', quantite=2).save()
+        self.client.force_login(self.utilisateur)
+        liste = self.client.get(reverse('admin:api_mouvementstock_changelist'))
+        self.assertEqual(liste.status_code, 200)
+        self.assertNotIn('delete_selected', liste.context['cl'].model_admin.get_actions(liste.wsgi_request))
+
+        mouvement = MouvementStock.objects.get()
+        reponse = self.client.post(
+            reverse('admin:api_mouvementstock_change', args=[mouvement.pk]), {'quantite': 50}
+        )
+        self.assertEqual(reponse.status_code, 403)
+        self.assertEqual(self.stock(), 2)
+
+
+class StockADateTests(TestCase):
+    """Stock en fin de journée : instantané le plus proche corrigé du journal"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = Utilisateur.objects.create_user(username='inventaire', password='x')
+        tva = Taxe.objects.create(nom='TVA 18%', taux=Decimal('18'))
+        cls.produit = Produit.objects.create(
+            designation='Carton', prix_vente=Decimal('5'), prix_achat=Decimal('2'), tva=tva
+        )
+        cls.aujourd_hui = timezone.localdate()
+        cls.mouvement('entree', 10, 10)
+        cls.mouvement('sortie', 3, 5)
+        cls.mouvement('ajustement', -1, 2)
+        cls.mouvement('entree', 4, 0)
+
+    @classmethod
+    def mouvement(cls, type_mouvement, quantite, il_y_a):
+        mouvement = MouvementStock(produit=cls.produit, type_mouvement=type_mouvement, quantite=quantite)
+        mouvement.save()
+        jour = cls.aujourd_hui - timedelta(days=il_y_a)
+        MouvementStock.objects.filter(pk=mouvement.pk).update(
+            date_mouvement=timezone.make_aware(datetime.combine(jour, time(12)))
+        )
+        return mouvement
+
+    def jour(self, il_y_a):
+        return self.aujourd_hui - timedelta(days=il_y_a)
+
+    def stock(self, il_y_a):
+        return stock_a_date(self.jour(il_y_a)).get(self.produit.pk)
+
+    def test_sans_instantane_journal_rejoue(self):
+        self.assertIsNone(self.stock(11))
+        self.assertEqual([self.stock(il_y_a) for il_y_a in (10, 6, 5, 2, 1, 0)], [10, 10, 7, 6, 6, 10])
+
+    def test_instantane_le_plus_proche(self):
+        self.assertEqual(photographier_stock(self.jour(5)), 1)
+        self.assertEqual(InstantaneStock.objects.get(date=self.jour(5)).quantite, 7)
+        # Instantané suivant construit depuis le précédent
+        photographier_stock(self.jour(2))
+        self.assertEqual(InstantaneStock.objects.get(date=self.jour(2)).quantite, 6)
+
+        # Mouvement antérieur aux instantanés altéré hors journal : plus relu
+        MouvementStock.objects.filter(type_mouvement='entree', quantite=10).update(quantite=1000)
+        self.assertEqual(self.stock(4), 7)  # instantané J-5 + mouvements depuis
+        self.assertEqual(self.stock(6), 10)  # instantané J-5 - mouvements de J-5
+        self.assertEqual(self.stock(1), 6)  # instantané J-2
+
+    def test_date_future(self):
+        photographier_stock(self.jour(2))
+        self.assertEqual(stock_a_date(self.aujourd_hui + timedelta(days=30))[self.produit.pk], 10)
+
+        api = APIClient()
+        api.force_authenticate(self.utilisateur)
+        reponse = api.get(reverse('produit-as-of'), {'date': (self.aujourd_hui + timedelta(days=30)).strftime('%Y-%m-%d')})
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.data['produits'][0]['quantite'], 10)
+        self.assertEqual(reponse.data['valeur_totale'], Decimal('20'))
+
+    def test_parametres_invalides(self):
+        api = APIClient()
+        api.force_authenticate(self.utilisateur)
+        url = reverse('produit-as-of')
+        for parametres in ({}, {'date': '18/10/2026'}, {'date': '2026-02-30'}, {'date': '2026-01-01', 'produits': '1,x'}):
+            with self.subTest(parametres=parametres):
+                self.assertEqual(api.get(url, parametres).status_code, 400)
+
+        reponse = api.get(url, {'date': self.jour(5).strftime('%Y-%m-%d'), 'produits': str(self.produit.pk)})
+        self.assertEqual(reponse.data['produits'][0]['quantite'], 7)
+
+
+class MouvementsBulkTests(TestCase):
+    """Envoi en masse de mouvements : tout ou rien, erreurs ligne par ligne"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = Utilisateur.objects.create_user(username='inventaire', password='x')
+        tva = Taxe.objects.create(nom='TVA 18%', taux=Decimal('18'))
+        produits = [Produit(designation=f'Vis {i}', prix_vente=Decimal('1'), tva=tva) for i in range(50)]
+        Produit.attribuer_references(produits)
+        cls.produits = Produit.objects.bulk_create(produits)
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.utilisateur)
+
+    def envoyer(self, mouvements):
+        return self.api.post(reverse('mouvements-bulk'), {'mouvements': mouvements}, format='json')
+
+    def test_cinq_mille_lignes_en_requetes_constantes(self):
+        mouvements = [
+            {'produit': self.produits[index % 50].pk, 'type_mouvement': 'entree', 'quantite': 2}
+            for index in range(5000)
+        ]
+        with CaptureQueriesContext(connection) as requetes:
+            reponse = self.envoyer(mouvements)
+        self.assertEqual(reponse.status_code, 201)
+        self.assertEqual(reponse.data['nb_mouvements'], 5000)
+        self.assertEqual(MouvementStock.objects.count(), 5000)
+        # Produits vérifiés + UPDATE du stock + 10 lots d'INSERT (500 lignes)
+        self.assertLess(len(requetes), 20)
+        self.assertEqual(set(Produit.objects.values_list('quantite_stock', flat=True)), {200})
+
+        self.assertEqual(self.envoyer(mouvements + [{}]).status_code, 400)
+
+    def test_erreurs_par_ligne(self):
+        valide = {'produit': self.produits[0].pk, 'type_mouvement': 'entree', 'quantite': 5}
+        reponse = self.envoyer([valide, {**valide, 'type_mouvement': 'sortie', 'quantite': 0}])
+        self.assertEqual(reponse.status_code, 400)
+        self.assertEqual([ligne['statut'] for ligne in reponse.data['resultats']], ['valide', 'erreur'])
+        self.assertIn('quantite', reponse.data['resultats'][1]['erreurs'])
+
+        # Références vérifiées en bloc une fois les lignes valides
+        reponse = self.envoyer([valide, {**valide, 'produit': 999999}])
+        self.assertEqual(reponse.status_code, 400)
+        self.assertIn('produit', reponse.data['resultats'][1]['erreurs'])
+        self.assertFalse(MouvementStock.objects.exists())
+
+    def test_stock_negatif_refuse(self):
+        produit, autre = self.produits[0].pk, self.produits[1].pk
+        reponse = self.envoyer([
+            {'produit': produit, 'type_mouvement': 'entree', 'quantite': 3},
+            {'produit': produit, 'type_mouvement': 'sortie', 'quantite': 2},
+            {'produit': produit, 'type_mouvement': 'ajustement', 'quantite': -4},
+            {'produit': autre, 'type_mouvement': 'entree', 'quantite': 1},
+        ])
+        self.assertEqual(reponse.status_code, 400)
+        self.assertEqual(
+            [ligne['statut'] for ligne in reponse.data['resultats']], ['valide', 'erreur', 'erreur', 'valide']
+        )
+        self.assertFalse(MouvementStock.objects.exists())
+        self.assertEqual(set(Produit.objects.values_list('quantite_stock', flat=True)), {0})
+
+        # Entrées et sorties qui se compensent : acceptées
+        reponse = self.envoyer([
+            {'produit': produit, 'type_mouvement': 'entree', 'quantite': 3},
+            {'produit': produit, 'type_mouvement': 'sortie', 'quantite': 3},
+        ])
+        self.assertEqual(reponse.status_code, 201)
+        self.assertEqual(reponse.data['resultats'][1]['quantite_stock'], 0)
+
+
+class ReceptionCommandeTests(TestCase):
+    """Réception des commandes fournisseurs : reliquats, statuts et journal"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = Utilisateur.objects.create_user(username='receptionniste', password='x')
+        tva = Taxe.objects.create(nom='TVA 18%', taux=Decimal('18'))
+        cls.fournisseur = Fournisseur.objects.create(
+            nom_fournisseur='Grossiste', adresse='-', code_postal='0', ville='-',
+            telephone='0', email='f@exemple.com', siret='0'
+        )
+        cls.produits = [
+            Produit.objects.create(designation=f'Ramette {i}', prix_vente=Decimal('6'), tva=tva) for i in range(2)
+        ]
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.utilisateur)
+        self.commande = Commande.objects.create(
+            utilisateur=self.utilisateur, fournisseur=self.fournisseur, type_produit='Papeterie', statut='VALIDEE'
+        )
+        self.lignes = [
+            LigneCommande.objects.create(
+                commande=self.commande, produit=produit, quantite=10,
+                prix_unitaire=Decimal('3'), remise_ligne=Decimal('0')
+            )
+            for produit in self.produits
+        ]
+
+    def recevoir(self, *quantites):
+        return self.api.post(
+            reverse('commande-reception', args=[self.commande.pk]),
+            {'lignes': [{'ligne': ligne.pk, 'quantite': quantite} for ligne, quantite in quantites]},
+            format='json'
+        )
+
+    def etat(self):
+        return [
+            (ligne.quantite_livree, ligne.statut_livraison, ligne.produit.quantite_stock)
+            for ligne in LigneCommande.objects.filter(commande=self.commande).select_related('produit').order_by('id')
+        ]
+
+    def test_reception_partielle_puis_complete(self):
+        self.assertEqual(self.recevoir((self.lignes[0], 4)).status_code, 200)
+        self.assertEqual(self.etat(), [(4, 'PARTIELLE', 4), (0, 'A_LIVRER', 0)])
+        self.commande.refresh_from_db()
+        self.assertEqual(self.commande.statut, 'VALIDEE')
+
+        reponse = self.recevoir((self.lignes[0], 6), (self.lignes[1], 10))
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.data['stocks'], {self.produits[0].pk: 10, self.produits[1].pk: 10})
+        self.assertEqual(self.etat(), [(10, 'LIVREE', 10), (10, 'LIVREE', 10)])
+        self.commande.refresh_from_db()
+        self.assertEqual(self.commande.statut, 'LIVREE')
+        self.assertEqual(MouvementStock.objects.filter(commande=self.commande, type_mouvement='entree').count(), 3)
+
+    def test_livraison_excedentaire_refusee(self):
+        self.recevoir((self.lignes[0], 8))
+        reponse = self.recevoir((self.lignes[0], 3), (self.lignes[1], 2))
+        self.assertEqual(reponse.status_code, 400)
+        self.assertIn(str(self.lignes[0].pk), {str(cle) for cle in reponse.data['lignes']})
+        # Rien n'est écrit, même pour la ligne valide
+        self.assertEqual(self.etat(), [(8, 'PARTIELLE', 8), (0, 'A_LIVRER', 0)])
+
+    def test_statut_de_livraison_non_modifiable_par_l_api(self):
+        ligne = {
+            'produit_id': self.produits[0].pk, 'quantite': 10, 'prix_unitaire': '3.00', 'remise_ligne': '0',
+            'statut_livraison': 'LIVREE', 'quantite_livree': 10,
+        }
+        reponse = self.api.post(reverse('commande-list'), {
+            'fournisseur': self.fournisseur.pk, 'type_produit': 'Papeterie', 'lignes': [ligne]
+        }, format='json')
+        self.assertEqual(reponse.status_code, 201)
+        self.assertEqual(
+            (reponse.data['lignes'][0]['statut_livraison'], reponse.data['lignes'][0]['quantite_livree']),
+            ('A_LIVRER', 0)
+        )
+
+
+class IndexRapportsTests(TestCase):
+    """
+    Les filtres de dates des rapports doivent rester sargables : EXPLAIN des
+    requêtes réellement émises, parcours séquentiels désactivés, et la
+    condition de date doit apparaître dans un « Index Cond ».
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = Utilisateur.objects.create_user(username='gerant', password='x')
+
+    def setUp(self):
+        # Les requêtes des rapports ne doivent pas être servies par le cache
+        caches['rapports'].clear()
+        self.api = APIClient()
+        self.api.force_authenticate(self.utilisateur)
+
+    def plans(self, table, appel):
+        """Plans EXPLAIN des SELECT émis sur `table` pendant `appel()`"""
+        with CaptureQueriesContext(connection) as requetes:
+            appel()
+        selects = [
+            requete['sql'] for requete in requetes.captured_queries
+            if requete['sql'].startswith('SELECT') and f'FROM "{table}"' in requete['sql']
+        ]
+        self.assertTrue(selects, f"Aucune requête sur {table}")
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            plans = []
+            for sql in selects:
+                cursor.execute(f"EXPLAIN {sql}")
+                plans.append('\n'.join(ligne for (ligne,) in cursor.fetchall()))
+        return plans
+
+    def assertIndexSur(self, plans, colonne):
+        self.assertTrue(
+            any(
+                'Index Cond' in ligne and colonne in ligne
+                for plan in plans for ligne in plan.splitlines()
+            ),
+            f"Pas de condition d'index sur {colonne} :\n" + '\n\n'.join(plans)
+        )
+
+    def test_statistiques_quotidiennes(self):
+        jour = timezone.localdate()
+        self.assertIndexSur(
+            self.plans('api_commandeclient', lambda: Statistique.update_daily_stats(jour)),
+            'date_creation'
+        )
+        self.assertIndexSur(
+            self.plans('api_mouvementstock', lambda: Statistique.update_daily_stats(jour)),
+            'date_mouvement'
+        )
+
+    def test_rapport_ventes(self):
+        jour = timezone.localdate().strftime('%Y-%m-%d')
+        plans = self.plans(
+            'api_commandeclient',
+            lambda: self.api.get(reverse('rapports'), {'type': 'ventes', 'debut': jour, 'fin': jour})
+        )
+        self.assertIndexSur(plans, 'date_creation')
+        self.assertIndexSur(plans, 'statut')
+
+    def test_rapport_utilisateurs(self):
+        jour = timezone.localdate().strftime('%Y-%m-%d')
+        self.assertIndexSur(
+            self.plans(
+                'api_commandeclient',
+                lambda: self.api.get(reverse('rapports'), {'type': 'utilisateurs', 'debut': jour, 'fin': jour})
+            ),
+            'utilisateur_id'
+        )
+
+    def test_performance_vendeur(self):
+        self.assertIndexSur(
+            self.plans(
+                'api_commande',
+                lambda: self.api.get(reverse('vendeur-performance', args=[self.utilisateur.pk]))
+            ),
+            'utilisateur_id'
+        )
+
+
+class RapportPaginationTests(TestCase):
+    """Paramètres de pagination des rapports validés (400) et bornés"""
+
+    def setUp(self):
+        caches['rapports'].clear()
+        self.api = APIClient()
+        self.api.force_authenticate(Utilisateur.objects.create_user(username='gerant', password='x'))
+        for numero in range(3):
+            Utilisateur.objects.create_user(username=f'vendeur{numero}', password='x')
+
+    def rapport(self, **parametres):
+        jour = timezone.localdate().strftime('%Y-%m-%d')
+        return self.api.get(reverse('rapports'), {'type': 'utilisateurs', 'debut': jour, 'fin': jour, **parametres})
+
+    def test_page_size_invalide(self):
+        for page_size in ('abc', '0', '-3'):
+            reponse = self.rapport(page_size=page_size)
+            self.assertEqual(reponse.status_code, 400, page_size)
+            self.assertNotIn('details', reponse.data)
+
+    def test_page_size_borne(self):
+        reponse = self.rapport(page_size='2', page='2')
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.data['data']['pagination']['total'], 4)
+        self.assertEqual(len(reponse.data['data']['utilisateurs']), 2)
+
+        reponse = self.rapport(page_size='100000')
+        self.assertEqual(reponse.data['data']['pagination']['page_size'], RapportAPIView.TAILLE_PAGE_MAX)
+
+
+class RapportCacheTests(TestCase):
+    """Périodes closes servies par le cache, période du jour invalidée par les écritures"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = Utilisateur.objects.create_user(username='comptable', password='x')
+        cls.tva = Taxe.objects.create(nom='TVA 18%', taux=Decimal('18'))
+        cls.client_commande = Client.objects.create(
+            nom_client='Client cache', adresse='1 rue du Test', code_postal='75000',
+            ville='Paris', telephone='0600000000', email='cache@test.fr'
+        )
+
+    def setUp(self):
+        caches['rapports'].clear()
+        self.api = APIClient()
+        self.api.force_authenticate(self.utilisateur)
+
+    def rapport(self, jour):
+        jour = jour.strftime('%Y-%m-%d')
+        return self.api.get(reverse('rapports'), {'type': 'ventes', 'debut': jour, 'fin': jour})
+
+    def rapport_sans_recalcul(self, jour):
+        # Seules restent les lectures du cache (DatabaseCache) : aucun recalcul
+        with CaptureQueriesContext(connection) as requetes:
+            reponse = self.rapport(jour)
+        self.assertTrue(all('api_cache_rapports' in requete['sql'] for requete in requetes.captured_queries))
+        return reponse
+
+    def test_periode_close_en_cache(self):
+        hier = timezone.localdate() - timedelta(days=1)
+        premiere = self.rapport(hier)
+        seconde = self.rapport_sans_recalcul(hier)
+        self.assertEqual(premiere.json(), seconde.json())
+
+    def test_periode_du_jour_invalidee(self):
+        aujourd_hui = timezone.localdate()
+        avant = self.rapport(aujourd_hui).json()['data']['stats_globales']['total_ventes']
+        self.rapport_sans_recalcul(aujourd_hui)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CommandeClient.objects.create(
+                numero_commande='CACHE-1', client=self.client_commande, utilisateur=self.utilisateur,
+                tva=self.tva, statut='VALIDEE', total_commande=Decimal('50')
+            )
+        apres = self.rapport(aujourd_hui).json()['data']['stats_globales']['total_ventes']
+        self.assertEqual(apres, avant + 1)
+
+    def test_utilisateur_modifie_invalide_les_periodes_closes(self):
+        vendeur = Utilisateur.objects.create_user(username='caissier', password='x')
+        hier = timezone.localdate() - timedelta(days=1)
+        parametres = {'type': 'utilisateurs', 'debut': hier.strftime('%Y-%m-%d'), 'fin': hier.strftime('%Y-%m-%d')}
+
+        def fiche():
+            utilisateurs = self.api.get(reverse('rapports'), parametres).json()['data']['utilisateurs']
+            return next((u['username'], u['role']) for u in utilisateurs if u['id'] == vendeur.pk)
+
+        self.assertEqual(fiche(), ('caissier', 'vendeur'))
+
+        # Une simple connexion garde le rapport en cache
+        with self.captureOnCommitCallbacks(execute=True) as rappels:
+            vendeur.save(update_fields=['last_login'])
+        self.assertEqual(rappels, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            vendeur.username = 'caissier2'
+            vendeur.role = 'gestionnaire'
+            vendeur.save()
+        self.assertEqual(fiche(), ('caissier2', 'gestionnaire'))
+
+
+class CacheRapportsPartageTests(TransactionTestCase):
+    """Une invalidation faite par un autre processus (commande, worker) atteint celui-ci"""
+
+    def test_invalidation_depuis_un_autre_processus(self):
+        hier = timezone.localdate() - timedelta(days=1)
+        avant, _ = cle_rapport('ventes', hier, hier, 'tous')
+
+        # Processus distinct sur la base de test : la génération n'y est
+        # visible que par le cache partagé
+        script = (
+            "import django; from django.conf import settings; "
+            f"settings.DATABASES['default']['NAME'] = {connection.settings_dict['NAME']!r}; "
+            "django.setup(); "
+            "from api.utils.cache_rapports import invalider_rapports; "
+            "invalider_rapports(historique=True)"
+        )
+        subprocess.run(
+            [sys.executable, '-c', script], check=True, cwd=settings.BASE_DIR,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'backend.settings'}
+        )
+
+        apres, _ = cle_rapport('ventes', hier, hier, 'tous')
+        self.assertNotEqual(avant, apres)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                               'rapports': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_cache_par_processus_signale(self):
+        self.assertEqual([alerte.id for alerte in verifier_cache_partage(None)], ['api.W001'])
+
+
+class TacheRapportTests(TestCase):
+    """Rapport demandé à l'API, calculé par le worker, puis téléchargé"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = Utilisateur.objects.create_user(username='analyste', password='x')
+
+    def setUp(self):
+        caches['rapports'].clear()
+        self.api = APIClient()
+        self.api.force_authenticate(self.utilisateur)
+
+    def test_cycle_complet(self):
+        demande = {'type_rapport': 'utilisateurs', 'parametres': {'debut': '2025-01-01', 'fin': '2025-12-31'}}
+        reponse = self.api.post(reverse('tacherapport-list'), demande, format='json')
+        self.assertEqual(reponse.status_code, 202)
+        tache_id = reponse.json()['id']
+
+        # Demande identique encore en file : même tâche
+        self.assertEqual(self.api.post(reverse('tacherapport-list'), demande, format='json').json()['id'], tache_id)
+        self.assertEqual(self.api.get(reverse('tacherapport-resultat', args=[tache_id])).status_code, 409)
+
+        # Ce que fait une itération du worker (traiter_rapports)
+        executer_tache(prendre_tache())
+        self.assertIsNone(prendre_tache())
+
+        self.assertEqual(self.api.get(reverse('tacherapport-detail', args=[tache_id])).json()['statut'], 'TERMINEE')
+        resultat = self.api.get(reverse('tacherapport-resultat', args=[tache_id]))
+        self.assertEqual(resultat.status_code, 200)
+        self.assertIn('attachment', resultat['Content-Disposition'])
+        self.assertEqual(resultat.json()['data']['periode'], {'debut': '2025-01-01', 'fin': '2025-12-31'})
+
+    def test_calcul_sans_cache(self):
+        tache, _ = soumettre_rapport(self.utilisateur, 'utilisateurs', {'debut': '2025-01-01', 'fin': '2025-12-31'})
+        with CaptureQueriesContext(connection) as requetes:
+            executer_tache(prendre_tache())
+        self.assertFalse(any('api_cache_rapports' in requete['sql'] for requete in requetes.captured_queries))
+        tache.refresh_from_db()
+        self.assertEqual(tache.statut, 'TERMINEE')
+
+    def test_une_seule_demande_active(self):
+        parametres = {'debut': '2025-01-01', 'fin': '2025-12-31'}
+        tache, creee = soumettre_rapport(self.utilisateur, 'ventes', parametres)
+        self.assertTrue(creee)
+        # Ce que verrait une demande concurrente qui n'a pas vu la première
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            TacheRapport.objects.create(utilisateur=self.utilisateur, type_rapport='ventes', parametres=parametres)
+
+        TacheRapport.objects.filter(pk=tache.pk).update(statut='TERMINEE')
+        nouvelle, creee = soumettre_rapport(self.utilisateur, 'ventes', parametres)
+        self.assertTrue(creee)
+        self.assertNotEqual(nouvelle.pk, tache.pk)
+
+    def test_parametres_invalides(self):
+        reponse = self.api.post(
+            reverse('tacherapport-list'),
+            {'type_rapport': 'ventes', 'parametres': {'debut': '2025-02-01', 'fin': '2025-01-01'}},
+            format='json'
+        )
+        self.assertEqual(reponse.status_code, 400)
+
+
+class AnalyseProduitsTests(TestCase):
+    """Indicateurs vectorisés du rapport analyse_produits"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = Utilisateur.objects.create_user(username='acheteur', password='x')
+        cls.tva = Taxe.objects.create(nom='TVA 18%', taux=Decimal('18'))
+        cls.client_commande = Client.objects.create(
+            nom_client='Client analyse', adresse='1 rue du Test', code_postal='75000',
+            ville='Paris', telephone='0600000000', email='analyse@test.fr'
+        )
+        # CA attendus : 900, 80, 20 -> classes A, B, C
+        cls.produits = [
+            Produit.objects.create(designation=f'Produit {i}', prix_vente=prix, prix_achat=achat, tva=cls.tva)
+            for i, (prix, achat) in enumerate([(Decimal('90'), Decimal('60')), (Decimal('8'), Decimal('0')), (Decimal('2'), Decimal('1'))])
+        ]
+        for produit in cls.produits:
+            MouvementStock(produit=produit, type_mouvement='entree', quantite=20).save()
+        commande = CommandeClient.objects.create(
+            numero_commande='ANALYSE-1', client=cls.client_commande, utilisateur=cls.utilisateur, tva=cls.tva
+        )
+        LigneCommandeClient.objects.bulk_create([
+            LigneCommandeClient(commande=commande, produit=produit, quantite=10, prix_unitaire=produit.prix_vente)
+            for produit in cls.produits
+        ])
+
+    def setUp(self):
+        caches['rapports'].clear()
+        self.api = APIClient()
+        self.api.force_authenticate(self.utilisateur)
+
+    def test_indicateurs(self):
+        jour = timezone.localdate().strftime('%Y-%m-%d')
+        reponse = self.api.get(reverse('rapports'), {'type': 'analyse_produits', 'debut': jour, 'fin': jour})
+        self.assertEqual(reponse.status_code, 200)
+        data = reponse.json()['data']
+        produits = {produit['id']: produit for produit in data['produits']}
+        premier, second, troisieme = (produits[produit.pk] for produit in self.produits)
+
+        self.assertEqual([premier['classe_abc'], second['classe_abc'], troisieme['classe_abc']], ['A', 'B', 'C'])
+        self.assertEqual(premier['chiffre_affaires'], 900)
+        self.assertEqual(premier['marge'], 300)
+        self.assertIsNone(second['marge'])  # Prix d'achat non renseigné
+        self.assertEqual(premier['taux_ecoulement'], 0.5)  # 10 vendus sur 20 entrés
+        self.assertEqual(data['resume']['produits_sans_prix_achat'], 1)
+        self.assertEqual(data['resume']['marge'], 310)
+
+    def test_parametres_valides(self):
+        url = reverse('rapports')
+        jour = timezone.localdate()
+        invalides = [
+            {'debut': jour.strftime('%Y-%m-%d')},
+            {'debut': (jour - timedelta(days=366)).strftime('%Y-%m-%d'), 'fin': jour.strftime('%Y-%m-%d')},
+            {'page_size': '0'},
+            {'page_size': 'tout'},
+            {'debut': '9999-12-25', 'fin': '9999-12-31'},
+        ]
+        for parametres in invalides:
+            with self.subTest(parametres=parametres):
+                reponse = self.api.get(url, {'type': 'analyse_produits', **parametres})
+                self.assertEqual(reponse.status_code, 400)
+
+        # Premier jour représentable : pas de stock antérieur à calculer
+        reponse = self.api.get(url, {'type': 'analyse_produits', 'debut': '0001-01-01', 'fin': '0001-01-31'})
+        self.assertEqual(reponse.status_code, 200)
+
+        reponse = self.api.get(url, {'type': 'analyse_produits', 'page_size': '2'})
+        self.assertEqual(len(reponse.json()['data']['produits']), 2)
+        self.assertEqual(reponse.json()['data']['pagination']['total'], 3)
+
+
+class PrevisionsTests(TestCase):
+    """Lissage hebdomadaire vectorisé et points de commande"""
+
+    def test_profil_hebdomadaire_reproduit(self):
+        import numpy as np
+
+        semaine = [10, 10, 10, 10, 10, 0, 0]
+        ventes = np.array([semaine * 8, [3] * 56], dtype=np.float64)
+        niveau, saisons, ecart_type = lisser(ventes)
+        prevues = prevoir(niveau, saisons, ventes.shape[1], 7)
+
+        np.testing.assert_allclose(prevues, [semaine, [3] * 7], atol=1e-9)
+        np.testing.assert_allclose(ecart_type, [0, 0], atol=1e-9)
+
+    def test_produit_sans_historique_garde_son_seuil(self):
+        tva = Taxe.objects.create(nom='TVA 18%', taux=Decimal('18'))
+        produit = Produit.objects.create(designation='Nouveau', prix_vente=Decimal('5'), tva=tva, seuil_alerte=4)
+
+        self.assertEqual(calculer_previsions(), 1)
+        produit.refresh_from_db()
+        self.assertIsNone(produit.point_commande)
+        self.assertIsNotNone(produit.date_prevision)
+        self.assertTrue(
+            Produit.objects.filter(pk=produit.pk, quantite_stock__lte=Produit.expression_seuil()).exists()
+        )
+
+
+class ReapprovisionnementTests(TestCase):
+    """Brouillons de commandes fournisseurs générés depuis les points de commande"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = Utilisateur.objects.create_user(username='gestionnaire', password='x', role='gestionnaire')
+        tva = Taxe.objects.create(nom='TVA 18%', taux=Decimal('18'))
+        champs = dict(adresse='-', code_postal='0', ville='-', telephone='0', email='f@exemple.com', siret='0')
+        cls.prefere = Fournisseur.objects.create(nom_fournisseur='Préféré', **champs)
+        cls.habituel = Fournisseur.objects.create(nom_fournisseur='Habituel', **champs)
+
+        def produit(**valeurs):
+            return Produit.objects.create(prix_vente=Decimal('10'), prix_achat=Decimal('4'), tva=tva, **valeurs)
+
+        cls.sous_seuil = produit(designation='Sous seuil', quantite_stock=2, seuil_alerte=5, fournisseur_prefere=cls.prefere)
+        cls.prevu = produit(designation='Prévu', quantite_stock=1, seuil_alerte=0, fournisseur_prefere=cls.prefere)
+        Produit.objects.filter(pk=cls.prevu.pk).update(point_commande=3, quantite_suggeree=12)
+        cls.historique = produit(designation='Historique', quantite_stock=0, seuil_alerte=2)
+        cls.orphelin = produit(designation='Orphelin', quantite_stock=0, seuil_alerte=2)
+        produit(designation='Suffisant', quantite_stock=50, seuil_alerte=5, fournisseur_prefere=cls.prefere)
+
+        # Ancienne commande livrée : fournisseur retenu faute de fournisseur préféré
+        livree = Commande.objects.create(
+            utilisateur=cls.utilisateur, fournisseur=cls.habituel, type_produit='Divers', statut='LIVREE'
+        )
+        LigneCommande.objects.create(
+            commande=livree, produit=cls.historique, quantite=3, quantite_livree=3,
+            prix_unitaire=Decimal('4'), remise_ligne=Decimal('0')
+        )
+
+    def test_une_commande_par_fournisseur_et_idempotence(self):
+        resultat = generer_commandes_reappro(self.utilisateur)
+
+        self.assertEqual((resultat['creees'], resultat['lignes']), (2, 3))
+        self.assertEqual(resultat['sans_fournisseur'], [self.orphelin.pk])
+        brouillons = Commande.objects.filter(statut='BROUILLON', reappro_auto=True)
+        self.assertEqual(sorted(brouillons.values_list('fournisseur_id', flat=True)), [self.prefere.pk, self.habituel.pk])
+
+        commande = brouillons.get(fournisseur=self.prefere)
+        quantites = dict(commande.lignes.values_list('produit_id', 'quantite'))
+        # Seuil manuel : remonté au double du seuil ; prévisions : quantité suggérée
+        self.assertEqual(quantites, {self.sous_seuil.pk: 8, self.prevu.pk: 12})
+        self.assertEqual(commande.prix_total, Decimal('80.00'))
+        self.assertTrue(commande.code_commande.startswith('CMD-'))
+
+        # Second passage : les reliquats couvrent les seuils, rien n'est ajouté
+        resultat = generer_commandes_reappro(self.utilisateur)
+        self.assertEqual((resultat['creees'], resultat['lignes']), (0, 0))
+        self.assertEqual(LigneCommande.objects.filter(commande__statut='BROUILLON').count(), 3)
+
+        # Nouveau besoin : le brouillon existant du fournisseur est complété
+        Produit.objects.filter(pk=self.sous_seuil.pk).update(quantite_stock=-10)
+        resultat = generer_commandes_reappro(self.utilisateur)
+        self.assertEqual((resultat['creees'], resultat['lignes'], resultat['commandes']), (0, 1, [commande.pk]))
+        self.assertEqual(brouillons.count(), 2)
+        # Produit déjà dans le brouillon : sa ligne est complétée, pas dupliquée
+        lignes = commande.lignes.filter(produit=self.sous_seuil)
+        self.assertEqual(lignes.count(), 1)
+        self.assertEqual(lignes.get().quantite, 8 + 12)
+        self.assertEqual(lignes.get().total_ligne_ht, Decimal('80.00'))
+        commande.refresh_from_db()
+        self.assertEqual(commande.prix_total, Decimal('128.00'))
+
+    def test_brouillon_manuel_non_complete(self):
+        # Même libellé saisi à la main : seul reappro_auto désigne un brouillon automatique
+        manuel = Commande.objects.create(
+            utilisateur=self.utilisateur, fournisseur=self.prefere, type_produit=TYPE_REAPPRO
+        )
+        resultat = generer_commandes_reappro(self.utilisateur)
+        self.assertNotIn(manuel.pk, resultat['commandes'])
+        self.assertFalse(manuel.lignes.exists())
@@ -5,8 +5,12 @@ from .views import (
     CurrentUserView,
     FournisseurViewSet, 
     ProduitViewSet, 
+    SynchroCatalogueView,
+    MouvementsStockBulkView,
+    ExportView,
     ClientViewSet,
     RapportAPIView,
+    TacheRapportViewSet,
     UserModulesView, 
     UtilisateurViewSet,
     CommandeClientViewSet,
@@ -41,6 +45,7 @@ router.register(r'users', UserViewSet, basename='user')
 router.register(r'groups', GroupViewSet, basename='group')
 router.register(r'permissions', PermissionViewSet, basename='permission')
 router.register(r'commandes', CommandeViewSet, basename='commande')
+router.register(r'rapports/taches', TacheRapportViewSet, basename='tacherapport')
 urlpatterns = [
     path('', include(router.urls)),
     
@@ -61,6 +66,9 @@ urlpatterns = [
     path('produits/<int:pk>/can_delete/', ProduitViewSet.as_view({'get': 'can_delete'}), name='produit-can-delete'),
     path('produits/<int:pk>/mark_inactive/', ProduitViewSet.as_view({'patch': 'mark_inactive'}), name='produit-mark-inactive'),
     path('rapports/', RapportAPIView.as_view(), name='rapports'),
+    path('sync/catalog/', SynchroCatalogueView.as_view(), name='sync-catalog'),
+    path('mouvements/bulk/', MouvementsStockBulkView.as_view(), name='mouvements-bulk'),
+    path('exports/<str:ressource>.<str:extension>', ExportView.as_view(), name='exports'),
 ]
 
 # urlpatterns = [
@@ -0,0 +1,215 @@
+from datetime import date, timedelta
+
+import numpy as np
+from django.db.models import DecimalField, F, Q, Sum
+from django.db.models.functions import TruncDate
+from api.models import LigneCommandeClient, MouvementStock, Produit
+from api.utils.inventaire import stock_a_date
+from api.utils.statistics import bornes_periode
+
+# Part cumulée du chiffre d'affaires couverte par les classes A puis B
+SEUIL_CLASSE_A = 0.80
+SEUIL_CLASSE_B = 0.95
+
+# Période maximale (jours) : les tableaux font produits x jours
+PERIODE_MAX_ANALYSE = 366
+
+
+def _cumuler(ids, debut, lignes, premier, second):
+    """
+    Range des lignes (produit_id, jour, valeur, valeur) dans deux tableaux
+    produits x jours ; `ids` est trié, la colonne 0 correspond à `debut`.
+    """
+    lignes = list(lignes)
+    if not lignes or not len(ids):
+        return
+    produit_ids, jours, valeurs_1, valeurs_2 = zip(*lignes)
+    produit_ids = np.array(produit_ids, dtype=np.int64)
+    rangs = np.searchsorted(ids, produit_ids)
+    colonnes = (np.array(jours, dtype='datetime64[D]') - np.datetime64(debut, 'D')).astype(np.int64)
+    connus = (rangs < len(ids)) & (ids[np.minimum(rangs, len(ids) - 1)] == produit_ids)
+    np.add.at(premier, (rangs[connus], colonnes[connus]), np.array(valeurs_1, dtype=np.float64)[connus])
+    np.add.at(second, (rangs[connus], colonnes[connus]), np.array(valeurs_2, dtype=np.float64)[connus])
+
+
+def ventes_quotidiennes(ids, debut, fin):
+    """
+    Quantités vendues et CA HT par produit (lignes, dans l'ordre de `ids`
+    trié) et par jour de debut à fin (colonnes), en une requête groupée.
+    """
+    borne_debut, borne_fin = bornes_periode(debut, fin)
+    forme = (len(ids), (fin - debut).days + 1)
+    quantites = np.zeros(forme, dtype=np.float64)
+    chiffre_affaires = np.zeros(forme, dtype=np.float64)
+    ventes = (
+        LigneCommandeClient.objects
+        .filter(
+            commande__date_creation__gte=borne_debut,
+            commande__date_creation__lt=borne_fin,
+            commande__statut='VALIDEE',
+            produit__isnull=False,
+        )
+        .annotate(jour=TruncDate('commande__date_creation'))
+        .values('produit_id', 'jour')
+        .annotate(
+            quantite_vendue=Sum('quantite'),
+            total_ca=Sum(
+                F('quantite') * F('prix_unitaire') * (1 - F('remise_ligne') / 100),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            ),
+        )
+        .values_list('produit_id', 'jour', 'quantite_vendue', 'total_ca')
+        .order_by()
+    )
+    _cumuler(ids, debut, ventes, quantites, chiffre_affaires)
+    return quantites, chiffre_affaires
+
+
+class DonneesProduits:
+    """
+    Ventes et stock quotidiens de tout le catalogue sur [debut, fin], en
+    tableaux NumPy (une ligne par produit, une colonne par jour), chargés
+    par trois requêtes groupées quel que soit le nombre de produits.
+    """
+
+    def __init__(self, debut, fin):
+        self.debut, self.fin = debut, fin
+        self.nb_jours = (fin - debut).days + 1
+        if not 1 <= self.nb_jours <= PERIODE_MAX_ANALYSE:
+            raise ValueError(f"Période de 1 à {PERIODE_MAX_ANALYSE} jours attendue")
+        borne_debut, borne_fin = bornes_periode(debut, fin)
+
+        produits = list(
+            Produit.objects.order_by('id')
+            .values_list('id', 'reference', 'designation', 'prix_achat', 'prix_vente')
+        )
+        self.ids = np.array([produit[0] for produit in produits], dtype=np.int64)
+        self.references = [produit[1] for produit in produits]
+        self.designations = [produit[2] for produit in produits]
+        # Prix d'achat absent ou nul : marge inconnue (NaN) plutôt que 100 %
+        self.prix_achat = np.array(
+            [float(produit[3]) if produit[3] else np.nan for produit in produits], dtype=np.float64
+        )
+
+        self.quantites, self.chiffre_affaires = ventes_quotidiennes(self.ids, debut, fin)
+        self.variations = np.zeros(self.quantites.shape, dtype=np.float64)
+        self.entrees = np.zeros(self.quantites.shape, dtype=np.float64)
+
+        mouvements = (
+            MouvementStock.objects
+            .filter(date_mouvement__gte=borne_debut, date_mouvement__lt=borne_fin)
+            .annotate(jour=TruncDate('date_mouvement'))
+            .values('produit_id', 'jour')
+            .annotate(
+                variation=Sum(MouvementStock.expression_variation()),
+                entree=Sum('quantite', filter=Q(type_mouvement='entree'), default=0),
+            )
+            .values_list('produit_id', 'jour', 'variation', 'entree')
+            .order_by()
+        )
+        _cumuler(self.ids, debut, mouvements, self.variations, self.entrees)
+
+        # Rien ne précède date.min (et debut - 1 jour y déborderait)
+        initial = stock_a_date(debut - timedelta(days=1)) if debut > date.min else {}
+        self.stock_initial = np.array([initial.get(i, 0) for i in self.ids.tolist()], dtype=np.float64)
+        # Stock en fin de chaque jour : stock initial + variations cumulées
+        self.stock = self.stock_initial[:, None] + np.cumsum(self.variations, axis=1)
+
+
+def classes_abc(chiffre_affaires):
+    """
+    Classe A/B/C de chaque produit selon la part cumulée du chiffre
+    d'affaires (produits triés par CA décroissant). Sans vente : C.
+    """
+    ordre = np.argsort(-chiffre_affaires, kind='stable')
+    total = chiffre_affaires.sum()
+    part_cumulee = np.empty_like(chiffre_affaires)
+    # Part cumulée *avant* le produit : le produit qui franchit le seuil reste dans la classe
+    part_cumulee[ordre] = (np.cumsum(chiffre_affaires[ordre]) - chiffre_affaires[ordre]) / total if total > 0 else 1
+    classes = np.where(
+        part_cumulee < SEUIL_CLASSE_A, 'A', np.where(part_cumulee < SEUIL_CLASSE_B, 'B', 'C')
+    )
+    classes[chiffre_affaires <= 0] = 'C'
+    return classes
+
+
+def _division(numerateur, denominateur):
+    """Division élément par élément, NaN si le dénominateur est nul"""
+    resultat = np.full(numerateur.shape, np.nan)
+    np.divide(numerateur, denominateur, out=resultat, where=denominateur != 0)
+    return resultat
+
+
+def indicateurs_produits(donnees):
+    """
+    Indicateurs de tout le catalogue, calculés en bloc sur les tableaux :
+    quantité vendue, CA, marge (prix d'achat courant), classe ABC, taux
+    d'écoulement (vendu / (stock initial + entrées)), jours de couverture
+    du stock de fin de période au rythme moyen de la période, jours de rupture.
+    """
+    quantite_vendue = donnees.quantites.sum(axis=1)
+    chiffre_affaires = donnees.chiffre_affaires.sum(axis=1)
+    marge = chiffre_affaires - quantite_vendue * donnees.prix_achat
+    stock_final = donnees.stock[:, -1]
+    vente_moyenne = quantite_vendue / donnees.nb_jours
+
+    return {
+        'quantite_vendue': quantite_vendue,
+        'chiffre_affaires': chiffre_affaires,
+        'marge': marge,
+        'taux_marge': _division(marge, chiffre_affaires),
+        'classe_abc': classes_abc(chiffre_affaires),
+        'taux_ecoulement': _division(quantite_vendue, donnees.stock_initial + donnees.entrees.sum(axis=1)),
+        'vente_moyenne_jour': vente_moyenne,
+        'stock_final': stock_final,
+        'jours_couverture': _division(np.maximum(stock_final, 0), vente_moyenne),
+        'jours_rupture': (donnees.stock <= 0).sum(axis=1),
+    }
+
+
+def analyse_produits(debut, fin):
+    """
+    Lignes du rapport (une par produit, triées par CA décroissant) et
+    résumé. Les valeurs non calculables (marge sans prix d'achat,
+    couverture sans vente...) valent None.
+    """
+    donnees = DonneesProduits(debut, fin)
+    indicateurs = indicateurs_produits(donnees)
+
+    def arrondi(tableau, decimales=2):
+        return [None if np.isnan(valeur) else valeur for valeur in np.round(tableau, decimales).tolist()]
+
+    colonnes = {
+        'quantite_vendue': indicateurs['quantite_vendue'].astype(np.int64).tolist(),
+        'chiffre_affaires': arrondi(indicateurs['chiffre_affaires']),
+        'marge': arrondi(indicateurs['marge']),
+        'taux_marge': arrondi(indicateurs['taux_marge'], 4),
+        'classe_abc': indicateurs['classe_abc'].tolist(),
+        'taux_ecoulement': arrondi(indicateurs['taux_ecoulement'], 4),
+        'vente_moyenne_jour': arrondi(indicateurs['vente_moyenne_jour'], 3),
+        'stock_final': indicateurs['stock_final'].astype(np.int64).tolist(),
+        'jours_couverture': arrondi(indicateurs['jours_couverture'], 1),
+        'jours_rupture': indicateurs['jours_rupture'].tolist(),
+    }
+    ordre = np.argsort(-indicateurs['chiffre_affaires'], kind='stable').tolist()
+    produits = [
+        {
+            'id': int(donnees.ids[rang]),
+            'reference': donnees.references[rang],
+            'designation': donnees.designations[rang],
+            **{nom: valeurs[rang] for nom, valeurs in colonnes.items()},
+        }
+        for rang in ordre
+    ]
+
+    marge_connue = ~np.isnan(indicateurs['marge'])
+    classes, effectifs = np.unique(indicateurs['classe_abc'], return_counts=True)
+    resume = {
+        'nb_produits': len(produits),
+        'chiffre_affaires': round(float(indicateurs['chiffre_affaires'].sum()), 2),
+        'marge': round(float(indicateurs['marge'][marge_connue].sum()), 2),
+        'produits_sans_prix_achat': int((~marge_connue).sum()),
+        'classes_abc': {'A': 0, 'B': 0, 'C': 0, **dict(zip(classes.tolist(), effectifs.tolist()))},
+        'produits_en_rupture': int((indicateurs['stock_final'] <= 0).sum()),
+    }
+    return produits, resume
@@ -0,0 +1,93 @@
+import threading
+from collections import OrderedDict
+
+from api.models import Produit
+
+# Champs renvoyés pour un scan. Le stock n'en fait pas partie : il est
+# décrémenté par des UPDATE ensemblistes qui ne déclenchent pas de signal.
+CHAMPS_SCAN = (
+    'id', 'reference', 'designation', 'prix_vente',
+    'code_barre', 'unite_mesure', 'tva', 'est_actif',
+)
+
+
+class CacheCodesBarres:
+    """
+    Cache LRU par processus : code barre -> (fiche produit compacte,
+    version_synchro de la ligne lue). La version est revérifiée à chaque
+    lecture (rechercher_par_code_barre) : les signaux ne couvrent ni les
+    autres processus, ni update() / bulk_update.
+    """
+
+    def __init__(self, taille_max=4096):
+        self.taille_max = taille_max
+        self._fiches = OrderedDict()
+        self._codes_par_produit = {}
+        self._lock = threading.Lock()
+
+    def get(self, code_barre):
+        """(fiche, version) ou None"""
+        with self._lock:
+            entree = self._fiches.get(code_barre)
+            if entree is not None:
+                self._fiches.move_to_end(code_barre)
+            return entree
+
+    def set(self, code_barre, fiche, version):
+        with self._lock:
+            self._fiches[code_barre] = (fiche, version)
+            self._fiches.move_to_end(code_barre)
+            self._codes_par_produit[fiche['id']] = code_barre
+            while len(self._fiches) > self.taille_max:
+                _, (ancienne, _) = self._fiches.popitem(last=False)
+                self._codes_par_produit.pop(ancienne['id'], None)
+
+    def invalider(self, produit_id, code_barre=None):
+        """Retire le produit (ancien et nouveau code barre)"""
+        with self._lock:
+            ancien_code = self._codes_par_produit.pop(produit_id, None)
+            for code in (ancien_code, code_barre):
+                if code is not None:
+                    entree = self._fiches.pop(code, None)
+                    if entree is not None and entree[0]['id'] != produit_id:
+                        self._codes_par_produit.pop(entree[0]['id'], None)
+
+    def clear(self):
+        with self._lock:
+            self._fiches.clear()
+            self._codes_par_produit.clear()
+
+
+cache_codes_barres = CacheCodesBarres()
+
+
+def rechercher_par_code_barre(code_barre):
+    """
+    Retourne la fiche compacte du produit actif portant ce code barre, ou
+    None. Une fiche en cache n'est servie que si la version_synchro du
+    produit (posée par trigger à chaque écriture, quel qu'en soit le
+    chemin) n'a pas changé : une lecture par clé primaire au lieu de la
+    fiche complète.
+    """
+    entree = cache_codes_barres.get(code_barre)
+    if entree is not None:
+        fiche, version = entree
+        actuelle = Produit.objects.filter(pk=fiche['id']).values_list('version_synchro', flat=True).first()
+        if actuelle == version:
+            return fiche
+        cache_codes_barres.invalider(fiche['id'], code_barre)
+
+    fiche = (
+        Produit.objects
+        .filter(code_barre=code_barre, est_actif=True)
+        .order_by('id')
+        .values(*CHAMPS_SCAN, 'version_synchro')
+        .first()
+    )
+    if fiche is not None:
+        version = fiche.pop('version_synchro')
+        # Sérialisable tel quel (API et diffusion WebSocket), comme ProduitSerializer
+        fiche['prix_vente'] = str(fiche['prix_vente'])
+        cache_codes_barres.set(code_barre, fiche, version)
+    return fiche
+
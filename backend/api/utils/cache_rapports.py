@@ -0,0 +1,150 @@
+import time
+from functools import partial
+
+from django.core import checks
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+ALIAS = 'rapports'
+
+# Rapports qui décrivent l'état présent (stock, nombre total de commandes
+# par fournisseur) quelle que soit la période : jamais considérés clos
+TYPES_INSTANTANES = {'produits', 'fournisseurs'}
+
+# Backends propres à un processus : chaque worker y aurait ses propres
+# générations, les invalidations des autres processus n'y arriveraient pas
+BACKENDS_PAR_PROCESSUS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+# Période close : résultat définitif, invalidé par la génération historique ;
+# la durée borne la vie d'un résultat que rien n'aurait invalidé
+DUREE_PERIODE_CLOSE = 24 * 3600
+
+# Période incluant aujourd'hui : invalidée par les signaux, la durée n'est
+# qu'un garde-fou pour les écritures qui n'en émettent pas (SQL brut)
+DUREE_PERIODE_OUVERTE = 300
+
+# Calcul en cours : durée de vie du verrou et attente des autres requêtes
+DUREE_VERROU = 60
+ATTENTE_MAX = 30
+INTERVALLE_ATTENTE = 0.05
+
+# Générations : `courant` change à chaque écriture du jour, `historique`
+# quand une donnée antérieure (ou un nom affiché) est modifiée
+GENERATION_COURANTE = 'rapports:generation:courant'
+GENERATION_HISTORIQUE = 'rapports:generation:historique'
+
+
+def _cache():
+    return caches[ALIAS]
+
+
+def _generations():
+    cache = _cache()
+    valeurs = cache.get_many([GENERATION_COURANTE, GENERATION_HISTORIQUE])
+    for nom in (GENERATION_COURANTE, GENERATION_HISTORIQUE):
+        if nom not in valeurs:
+            # Initialisée à l'horodatage : une génération évincée du cache ne
+            # repart pas d'une valeur déjà utilisée par des clés encore présentes
+            cache.add(nom, time.time_ns(), None)
+            valeurs[nom] = cache.get(nom)
+    return valeurs[GENERATION_COURANTE], valeurs[GENERATION_HISTORIQUE]
+
+
+def _incrementer(nom):
+    # Nouvelle valeur jamais utilisée plutôt que incr(), qui n'est pas
+    # atomique avec DatabaseCache : deux invalidations simultanées ne
+    # peuvent pas retomber sur la même génération
+    _cache().set(nom, time.time_ns(), None)
+
+
+@checks.register(checks.Tags.caches)
+def verifier_cache_partage(app_configs, **kwargs):
+    """Le cache des rapports doit être partagé entre processus"""
+    backend = caches[ALIAS].__class__
+    if f"{backend.__module__}.{backend.__qualname__}" in BACKENDS_PAR_PROCESSUS:
+        return [checks.Warning(
+            f"Le cache '{ALIAS}' est propre à chaque processus : les invalidations "
+            "des autres workers et des commandes n'y arrivent pas.",
+            hint="Utiliser DatabaseCache ou RedisCache pour CACHES['rapports'].",
+            id='api.W001',
+        )]
+    return []
+
+
+def invalider_rapports(jour=None, historique=False):
+    """
+    Invalide, après le commit, les rapports touchés par une écriture datée
+    de `jour` (aujourd'hui par défaut). Un jour passé, ou `historique`,
+    invalide aussi les périodes closes : cas rare (annulation tardive,
+    reconstruction des statistiques, fiche renommée), pas à chaque vente.
+    """
+    if historique or (jour is not None and jour < timezone.localdate()):
+        nom = GENERATION_HISTORIQUE
+    else:
+        nom = GENERATION_COURANTE
+    transaction.on_commit(partial(_incrementer, nom))
+
+
+def periode_close(type_rapport, debut, fin):
+    """Vrai si la période est entièrement passée (résultat définitif)"""
+    return (
+        type_rapport not in TYPES_INSTANTANES
+        and debut is not None and fin is not None
+        and fin < timezone.localdate()
+    )
+
+
+def cle_rapport(type_rapport, debut, fin, portee, parametres=()):
+    """
+    Clé de cache du rapport. Les générations sont lues maintenant, avant le
+    calcul : un résultat calculé pendant une écriture est rangé sous
+    l'ancienne génération et ne sera plus servi après son commit.
+    """
+    courante, historique = _generations()
+    close = periode_close(type_rapport, debut, fin)
+    morceaux = [
+        'rapports', type_rapport, str(debut), str(fin), portee,
+        f"h{historique}" if close else f"h{historique}.c{courante}",
+    ]
+    morceaux += [f"{nom}={valeur}" for nom, valeur in sorted(parametres)]
+    return ':'.join(morceaux), (DUREE_PERIODE_CLOSE if close else DUREE_PERIODE_OUVERTE)
+
+
+def rapport_en_cache(cle, duree, calculer):
+    """
+    Retourne le résultat en cache ou le calcule. Les requêtes identiques
+    simultanées sont regroupées : celle qui obtient le verrou (cache.add,
+    atomique) calcule, les autres attendent son résultat. `calculer` renvoie
+    None pour un résultat à ne pas mettre en cache (erreur).
+    Le cache étant partagé, le regroupement couvre tous les workers.
+    """
+    cache = _cache()
+    resultat = cache.get(cle)
+    if resultat is not None:
+        return resultat
+
+    verrou = f"{cle}:verrou"
+    echeance = time.monotonic() + ATTENTE_MAX
+    while True:
+        if cache.add(verrou, 1, DUREE_VERROU):
+            try:
+                resultat = cache.get(cle)
+                if resultat is None:
+                    resultat = calculer()
+                    if resultat is not None:
+                        cache.set(cle, resultat, duree)
+                return resultat
+            finally:
+                cache.delete(verrou)
+
+        time.sleep(INTERVALLE_ATTENTE)
+        resultat = cache.get(cle)
+        if resultat is not None:
+            return resultat
+        if time.monotonic() > echeance:
+            # Calcul concurrent anormalement long : on ne bloque pas la requête
+            return calculer()
@@ -0,0 +1,161 @@
+import os
+from datetime import timedelta
+from itertools import islice
+from pathlib import Path
+
+from django.db.models import Min
+from django.utils import timezone
+from api.models import CommandeClient, LigneCommandeClient
+from api.utils.exports import filtre_periode
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Dépendance facultative : pip install pyarrow
+    pa = pq = None
+
+FORMATS_COLONNES = {
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.file',
+}
+
+# Lignes par row group Parquet / record batch Arrow (et par lot du curseur)
+LIGNES_PAR_GROUPE = 50000
+
+# Table de faits des ventes : une ligne par LigneCommandeClient, avec les
+# dimensions commande, client, produit et vendeur dénormalisées.
+# (colonne, chemin ORM, type Arrow)
+COLONNES_FAITS = [
+    ('ligne_id', 'id', 'int64'),
+    ('commande_id', 'commande_id', 'int64'),
+    ('numero_commande', 'commande__numero_commande', 'string'),
+    ('date_commande', 'commande__date_creation', 'timestamp'),
+    ('statut', 'commande__statut', 'string'),
+    ('is_vente_directe', 'commande__is_vente_directe', 'bool'),
+    ('mode_retrait', 'commande__mode_retrait', 'string'),
+    ('remise_commande', 'commande__remise', 'decimal5'),
+    ('total_commande', 'commande__total_commande', 'decimal10'),
+    ('client_id', 'commande__client_id', 'int64'),
+    ('client_nom', 'commande__client__nom_client', 'string'),
+    ('client_ville', 'commande__client__ville', 'string'),
+    ('client_code_postal', 'commande__client__code_postal', 'string'),
+    ('client_pays', 'commande__client__pays', 'string'),
+    ('produit_id', 'produit_id', 'int64'),
+    ('produit_reference', 'produit__reference', 'string'),
+    ('produit_designation', 'produit__designation', 'string'),
+    ('categorie', 'produit__categorie__nom', 'string'),
+    ('prix_achat', 'produit__prix_achat', 'decimal10'),
+    ('vendeur_id', 'commande__utilisateur_id', 'int64'),
+    ('vendeur', 'commande__utilisateur__username', 'string'),
+    ('vendeur_role', 'commande__utilisateur__role', 'string'),
+    ('quantite', 'quantite', 'int32'),
+    ('prix_unitaire', 'prix_unitaire', 'decimal10'),
+    ('remise_ligne', 'remise_ligne', 'decimal5'),
+]
+
+
+def pyarrow_disponible():
+    return pa is not None
+
+
+def schema_faits():
+    """Schéma Arrow : décimaux exacts (decimal128), dates en UTC à la microseconde"""
+    types = {
+        'int64': pa.int64(),
+        'int32': pa.int32(),
+        'string': pa.string(),
+        'bool': pa.bool_(),
+        'timestamp': pa.timestamp('us', tz='UTC'),
+        'decimal5': pa.decimal128(5, 2),
+        'decimal10': pa.decimal128(10, 2),
+    }
+    return pa.schema([(nom, types[type_arrow]) for nom, _, type_arrow in COLONNES_FAITS])
+
+
+def lots_faits(debut=None, fin=None):
+    """RecordBatch de LIGNES_PAR_GROUPE lignes au plus, lus par curseur serveur"""
+    schema = schema_faits()
+    lignes = (
+        LigneCommandeClient.objects
+        .filter(**filtre_periode('commande__date_creation', debut, fin))
+        .order_by('commande_id', 'id')
+        .values_list(*[chemin for _, chemin, _ in COLONNES_FAITS])
+        .iterator(chunk_size=LIGNES_PAR_GROUPE)
+    )
+    while True:
+        lot = list(islice(lignes, LIGNES_PAR_GROUPE))
+        if not lot:
+            return
+        colonnes = zip(*lot)
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(valeurs, type=champ.type) for valeurs, champ in zip(colonnes, schema)],
+            schema=schema
+        )
+
+
+def ecrire_faits(sortie, debut=None, fin=None, format_fichier='parquet'):
+    """
+    Écrit les lignes de ventes de debut à fin (inclus) dans `sortie` (chemin
+    ou fichier binaire), un row group par lot : la mémoire reste bornée
+    quel que soit le volume. Un fichier est écrit même sans vente (schéma
+    seul). Retourne le nombre de lignes écrites.
+    """
+    schema = schema_faits()
+    if format_fichier == 'parquet':
+        writer = pq.ParquetWriter(sortie, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(sortie, schema)
+
+    nb_lignes = 0
+    with writer:
+        for lot in lots_faits(debut, fin):
+            writer.write_batch(lot)
+            nb_lignes += lot.num_rows
+    return nb_lignes
+
+
+def chemin_partition(dossier, jour, format_fichier='parquet'):
+    """Partition au format Hive (date=AAAA-MM-JJ), lisible par Spark, DuckDB, pandas..."""
+    return Path(dossier) / f"date={jour.isoformat()}" / f"ventes.{format_fichier}"
+
+
+def jours_exportes(dossier, format_fichier='parquet'):
+    """Jours dont la partition existe déjà dans ce format"""
+    return sorted(
+        timezone.datetime.strptime(fichier.parent.name[len('date='):], '%Y-%m-%d').date()
+        for fichier in Path(dossier).glob(f"date=*/ventes.{format_fichier}")
+    )
+
+
+def exporter_jours(dossier, debut=None, fin=None, format_fichier='parquet', reecrire=False):
+    """
+    Export incrémental : une partition par jour clos (jusqu'à hier par
+    défaut), seuls les jours absents du dossier sont écrits. Sans `debut`,
+    reprend au lendemain du dernier jour exporté (ou au premier jour de
+    vente). Chaque fichier est écrit à côté puis renommé : une partition
+    présente est toujours complète.
+    Retourne [(jour, nombre de lignes)] des partitions écrites.
+    """
+    fin = fin or timezone.localdate() - timedelta(days=1)
+    if debut is None:
+        deja = jours_exportes(dossier, format_fichier)
+        if deja:
+            debut = deja[-1] + timedelta(days=1)
+        else:
+            premiere = CommandeClient.objects.aggregate(premiere=Min('date_creation'))['premiere']
+            if premiere is None:
+                return []
+            debut = timezone.localtime(premiere).date()
+
+    ecrits = []
+    jour = debut
+    while jour <= fin:
+        chemin = chemin_partition(dossier, jour, format_fichier)
+        if reecrire or not chemin.exists():
+            chemin.parent.mkdir(parents=True, exist_ok=True)
+            provisoire = chemin.with_name(f".{chemin.name}.tmp")
+            nb_lignes = ecrire_faits(str(provisoire), jour, jour, format_fichier)
+            os.replace(provisoire, chemin)
+            ecrits.append((jour, nb_lignes))
+        jour += timedelta(days=1)
+    return ecrits
@@ -0,0 +1,179 @@
+import csv
+import io
+import json
+from collections import defaultdict
+from datetime import datetime
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from api.models import CommandeClient, LigneCommandeClient, MouvementStock, Produit
+from api.utils.statistics import bornes_periode
+
+# Lignes lues par aller-retour du curseur serveur, et lignes écrites par
+# morceau envoyé au client
+TAILLE_LOT = 2000
+LIGNES_PAR_MORCEAU = 500
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+CHAMPS_COMMANDE = [
+    'id', 'numero_commande', 'date_creation', 'statut', 'is_vente_directe', 'mode_retrait',
+    'client_id', 'client__nom_client', 'utilisateur__username', 'remise', 'total_commande',
+]
+CHAMPS_LIGNE = ['produit_id', 'produit__reference', 'produit__designation', 'quantite', 'prix_unitaire', 'remise_ligne']
+
+CHAMPS_MOUVEMENT = [
+    'id', 'date_mouvement', 'type_mouvement', 'quantite', 'variation',
+    'produit_id', 'produit__reference', 'produit__designation',
+    'utilisateur__username', 'commande__code_commande', 'fournisseur__nom_fournisseur', 'motif',
+]
+
+CHAMPS_PRODUIT = [
+    'id', 'reference', 'designation', 'categorie__nom', 'code_barre', 'unite_mesure',
+    'prix_achat', 'prix_vente', 'tva__taux', 'quantite_stock', 'seuil_alerte', 'est_actif',
+    'date_modification',
+]
+
+
+def filtre_periode(champ, debut, fin):
+    """Filtre semi-ouvert sur la colonne brute (index et partitions utilisables)"""
+    filtres = {}
+    if debut is not None:
+        filtres[f"{champ}__gte"] = bornes_periode(debut, debut)[0]
+    if fin is not None:
+        filtres[f"{champ}__lt"] = bornes_periode(fin, fin)[1]
+    return filtres
+
+
+def documents_ventes(debut=None, fin=None):
+    """
+    Commandes clients avec leurs lignes ({..., 'lignes': [...]}), par id.
+    Curseur serveur sur les commandes ; les lignes de chaque lot sont lues
+    en une requête : la mémoire reste bornée par TAILLE_LOT.
+    """
+    commandes = (
+        CommandeClient.objects
+        .filter(**filtre_periode('date_creation', debut, fin))
+        .order_by('id')
+        .values(*CHAMPS_COMMANDE)
+        .iterator(chunk_size=TAILLE_LOT)
+    )
+    while True:
+        lot = list(islice(commandes, TAILLE_LOT))
+        if not lot:
+            return
+        lignes = defaultdict(list)
+        for ligne in (
+            LigneCommandeClient.objects
+            .filter(commande_id__in=[commande['id'] for commande in lot])
+            .order_by('commande_id', 'id')
+            .values('commande_id', *CHAMPS_LIGNE)
+        ):
+            lignes[ligne.pop('commande_id')].append(ligne)
+        for commande in lot:
+            commande['lignes'] = lignes.get(commande['id'], [])
+            yield commande
+
+
+def documents_mouvements(debut=None, fin=None, produit_id=None):
+    """Journal de stock par id (ordre d'insertion) ; `variation` est signée"""
+    mouvements = MouvementStock.objects.filter(**filtre_periode('date_mouvement', debut, fin))
+    if produit_id is not None:
+        mouvements = mouvements.filter(produit_id=produit_id)
+    return (
+        mouvements
+        .annotate(variation=MouvementStock.expression_variation())
+        .order_by('id')
+        .values(*CHAMPS_MOUVEMENT)
+        .iterator(chunk_size=TAILLE_LOT)
+    )
+
+
+def documents_produits():
+    return Produit.objects.order_by('id').values(*CHAMPS_PRODUIT).iterator(chunk_size=TAILLE_LOT)
+
+
+def _valeur(valeur):
+    """Dates dans le fuseau du projet (comme l'affichage), le reste tel quel"""
+    if isinstance(valeur, datetime):
+        return timezone.localtime(valeur).isoformat()
+    return valeur
+
+
+def _en_morceaux(lignes):
+    """
+    Regroupe les lignes texte en morceaux pour limiter les écritures réseau.
+    La première ligne part seule, dès qu'elle est prête.
+    """
+    morceau = []
+    for numero, ligne in enumerate(lignes):
+        morceau.append(ligne)
+        if numero == 0 or len(morceau) >= LIGNES_PAR_MORCEAU:
+            yield ''.join(morceau)
+            morceau = []
+    if morceau:
+        yield ''.join(morceau)
+
+
+def flux_csv(documents, colonnes, sous_lignes=None, colonnes_sous_lignes=()):
+    """
+    CSV encodé au fil de l'eau. Avec `sous_lignes` (ex. 'lignes'), une ligne
+    CSV par sous-ligne, les colonnes du document parent étant répétées.
+    L'en-tête part immédiatement, avant la première requête.
+    """
+    tampon = io.StringIO()
+    writer = csv.writer(tampon)
+
+    def texte(valeurs):
+        writer.writerow([_valeur(valeur) for valeur in valeurs])
+        ligne = tampon.getvalue()
+        tampon.seek(0)
+        tampon.truncate()
+        return ligne
+
+    yield texte([*colonnes, *colonnes_sous_lignes])
+
+    def lignes():
+        for document in documents:
+            parent = [document[colonne] for colonne in colonnes]
+            if sous_lignes is None:
+                yield texte(parent)
+                continue
+            for sous_ligne in document[sous_lignes] or [{}]:
+                yield texte(parent + [sous_ligne.get(colonne) for colonne in colonnes_sous_lignes])
+
+    yield from _en_morceaux(lignes())
+
+
+def flux_ndjson(documents):
+    """Un objet JSON par ligne ; décimaux en chaînes (sans perte de précision)"""
+    def normaliser(document):
+        return {
+            cle: [normaliser(sous) for sous in valeur] if isinstance(valeur, list) else _valeur(valeur)
+            for cle, valeur in document.items()
+        }
+
+    yield from _en_morceaux(
+        json.dumps(normaliser(document), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+        for document in documents
+    )
+
+
+# Ressource -> (documents, colonnes, clé des sous-lignes, colonnes des sous-lignes)
+EXPORTS = {
+    'ventes': (documents_ventes, CHAMPS_COMMANDE, 'lignes', CHAMPS_LIGNE),
+    'mouvements': (documents_mouvements, CHAMPS_MOUVEMENT, None, ()),
+    'produits': (documents_produits, CHAMPS_PRODUIT, None, ()),
+}
+
+
+def flux_export(ressource, extension, **filtres):
+    """Générateur de texte de l'export demandé (voir EXPORTS et FORMATS)"""
+    documents, colonnes, sous_lignes, colonnes_sous_lignes = EXPORTS[ressource]
+    if extension == 'csv':
+        return flux_csv(documents(**filtres), colonnes, sous_lignes, colonnes_sous_lignes)
+    return flux_ndjson(documents(**filtres))
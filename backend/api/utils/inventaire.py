@@ -0,0 +1,104 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+from api.models import InstantaneStock, MouvementStock
+
+
+def fin_de_journee(jour):
+    """Instant (aware) qui suit le dernier mouvement du jour"""
+    return timezone.make_aware(datetime.combine(jour + timedelta(days=1), time.min))
+
+
+def variations_journal(debut=None, fin=None, produit_ids=None):
+    """
+    Variation nette du stock par produit pour les mouvements de
+    [debut, fin[ (bornes facultatives), en une requête groupée.
+    """
+    mouvements = MouvementStock.objects.all()
+    if debut is not None:
+        mouvements = mouvements.filter(date_mouvement__gte=debut)
+    if fin is not None:
+        mouvements = mouvements.filter(date_mouvement__lt=fin)
+    if produit_ids is not None:
+        mouvements = mouvements.filter(produit_id__in=produit_ids)
+    return dict(
+        mouvements
+        .values('produit')
+        .annotate(variation=Sum(MouvementStock.expression_variation()))
+        .values_list('produit', 'variation')
+        .order_by()
+    )
+
+
+def soldes_instantane(jour, produit_ids=None):
+    """{produit_id: quantité} de l'instantané d'un jour"""
+    lignes = InstantaneStock.objects.filter(date=jour)
+    if produit_ids is not None:
+        lignes = lignes.filter(produit_id__in=produit_ids)
+    return dict(lignes.values_list('produit_id', 'quantite'))
+
+
+def photographier_stock(jour):
+    """
+    Écrit l'instantané de fin de journée : dernier instantané antérieur
+    + variations du journal depuis (une requête groupée, en général sur
+    les seuls mouvements du jour). Sans instantané antérieur, le journal
+    est sommé depuis le début. Retourne le nombre de produits photographiés.
+    """
+    precedent = InstantaneStock.objects.filter(date__lt=jour).aggregate(date=Max('date'))['date']
+
+    if precedent is None:
+        soldes = {}
+        variations = variations_journal(fin=fin_de_journee(jour))
+    else:
+        soldes = soldes_instantane(precedent)
+        variations = variations_journal(debut=fin_de_journee(precedent), fin=fin_de_journee(jour))
+
+    for produit_id, variation in variations.items():
+        soldes[produit_id] = soldes.get(produit_id, 0) + variation
+
+    with transaction.atomic():
+        InstantaneStock.objects.bulk_create(
+            [
+                InstantaneStock(produit_id=produit_id, date=jour, quantite=quantite)
+                for produit_id, quantite in soldes.items()
+            ],
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['date', 'produit'],
+            update_fields=['quantite'],
+        )
+    return len(soldes)
+
+
+def stock_a_date(jour, produit_ids=None):
+    """
+    Stock de fin de journée par produit ({produit_id: quantité}) à partir de
+    l'instantané le plus proche du jour demandé, antérieur ou postérieur,
+    corrigé des mouvements entre les deux : seuls un instantané et au plus
+    quelques jours de journal sont lus. Sans instantané, le journal est
+    rejoué depuis le début.
+    """
+    dates = InstantaneStock.objects.values_list('date', flat=True)
+    avant = dates.filter(date__lte=jour).order_by('-date').first()
+    apres = dates.filter(date__gt=jour).order_by('date').first()
+
+    if avant is not None and (apres is None or jour - avant <= apres - jour):
+        soldes = soldes_instantane(avant, produit_ids)
+        variations = variations_journal(fin_de_journee(avant), fin_de_journee(jour), produit_ids)
+        signe = 1
+    elif apres is not None:
+        # Instantané postérieur : on retranche les mouvements intermédiaires
+        soldes = soldes_instantane(apres, produit_ids)
+        variations = variations_journal(fin_de_journee(jour), fin_de_journee(apres), produit_ids)
+        signe = -1
+    else:
+        soldes = {}
+        variations = variations_journal(fin=fin_de_journee(jour), produit_ids=produit_ids)
+        signe = 1
+
+    for produit_id, variation in variations.items():
+        soldes[produit_id] = soldes.get(produit_id, 0) + signe * variation
+    return soldes
@@ -0,0 +1,100 @@
+from datetime import date, datetime, time
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+# Tables partitionnées par mois (PostgreSQL) et leur colonne de partition
+TABLES_PARTITIONNEES = {
+    'api_mouvementstock': 'date_mouvement',
+    'api_commandeclient': 'date_creation',
+    'api_activitylog': 'timestamp',
+}
+
+
+def premier_du_mois(jour, decalage=0):
+    """Premier jour du mois de `jour`, décalé de `decalage` mois"""
+    mois = jour.year * 12 + jour.month - 1 + decalage
+    return date(mois // 12, mois % 12 + 1, 1)
+
+
+def nom_partition(table, mois):
+    return f"{table}_p{mois.strftime('%Y%m')}"
+
+
+def _borne(mois):
+    """Littéral timestamptz du début du mois, dans le fuseau du projet"""
+    return timezone.make_aware(datetime.combine(mois, time.min)).isoformat()
+
+
+def est_partitionnee(table):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table])
+        return cursor.fetchone() is not None
+
+
+def partitions(table):
+    """Partitions mensuelles attachées : [(mois, nom)] triées"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s)
+            """,
+            [table]
+        )
+        noms = [nom for (nom,) in cursor.fetchall()]
+    prefixe = f"{table}_p"
+    return sorted(
+        (datetime.strptime(nom[len(prefixe):], '%Y%m').date(), nom)
+        for nom in noms if nom.startswith(prefixe)
+    )
+
+
+def creer_partition(table, mois):
+    """
+    Crée la partition du mois si elle n'existe pas. Les lignes déjà tombées
+    dans la partition par défaut pour ce mois y sont déplacées avant
+    l'ATTACH, qui sinon échouerait. Retourne True si la partition a été créée.
+    """
+    nom = nom_partition(table, mois)
+    colonne = TABLES_PARTITIONNEES[table]
+    debut, fin = _borne(mois), _borne(premier_du_mois(mois, 1))
+    q = connection.ops.quote_name
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [nom])
+        if cursor.fetchone()[0] is not None:
+            return False
+        cursor.execute(f"CREATE TABLE {q(nom)} (LIKE {q(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        # Déplacement, pas suppression : les triggers d'intégrité (0022) l'ignorent
+        cursor.execute("SET LOCAL api.deplacement_partition = 'on'")
+        cursor.execute(
+            f"""
+            WITH deplacees AS (
+                DELETE FROM {q(table + '_defaut')}
+                WHERE {q(colonne)} >= %s AND {q(colonne)} < %s
+                RETURNING *
+            )
+            INSERT INTO {q(nom)} SELECT * FROM deplacees
+            """,
+            [debut, fin]
+        )
+        cursor.execute("SET LOCAL api.deplacement_partition = 'off'")
+        cursor.execute(
+            f"ALTER TABLE {q(table)} ATTACH PARTITION {q(nom)} FOR VALUES FROM ('{debut}') TO ('{fin}')"
+        )
+    return True
+
+
+def detacher_partition(table, mois):
+    """
+    Détache la partition du mois : la table reste en base (archivage,
+    export, DROP) mais n'est plus lue par les requêtes. Opération sur les
+    métadonnées seulement, sans réécriture de lignes.
+    """
+    q = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {q(table)} DETACH PARTITION {q(nom_partition(table, mois))}")
@@ -0,0 +1,120 @@
+import math
+from datetime import timedelta
+from statistics import NormalDist
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from api.models import LigneCommande, Produit
+from api.utils.analyse_produits import ventes_quotidiennes
+from api.utils.cache_rapports import invalider_rapports
+
+SAISON = 7  # Saisonnalité hebdomadaire (jours)
+
+# Lissage exponentiel : poids des dernières observations sur le niveau
+# et sur le profil hebdomadaire
+ALPHA = 0.2
+GAMMA = 0.1
+
+
+def lisser(ventes, alpha=ALPHA, gamma=GAMMA):
+    """
+    Lissage exponentiel additif à saisonnalité hebdomadaire (Holt-Winters
+    sans tendance), vectorisé : une itération par jour, tous les produits
+    à la fois. `ventes` : produits x jours (au moins deux semaines).
+    Retourne (niveau, saisons, écart type de l'erreur à un jour), la
+    saison d'indice i correspondant au jour de rang i modulo SAISON.
+    """
+    premiere_semaine = ventes[:, :SAISON]
+    niveau = premiere_semaine.mean(axis=1)
+    saisons = premiere_semaine - niveau[:, None]
+    erreurs = np.zeros(ventes.shape[0])
+
+    for jour in range(SAISON, ventes.shape[1]):
+        rang = jour % SAISON
+        observe = ventes[:, jour]
+        erreur = observe - (niveau + saisons[:, rang])
+        erreurs += erreur ** 2
+        nouveau_niveau = alpha * (observe - saisons[:, rang]) + (1 - alpha) * niveau
+        saisons[:, rang] = gamma * (observe - nouveau_niveau) + (1 - gamma) * saisons[:, rang]
+        niveau = nouveau_niveau
+
+    ecart_type = np.sqrt(erreurs / max(ventes.shape[1] - SAISON, 1))
+    return niveau, saisons, ecart_type
+
+
+def prevoir(niveau, saisons, debut, horizon):
+    """Ventes prévues par produit et par jour pour les `horizon` jours à partir du rang `debut`"""
+    rangs = (debut + np.arange(horizon)) % SAISON
+    return np.maximum(niveau[:, None] + saisons[:, rangs], 0)
+
+
+def quantites_en_commande(ids):
+    """Reliquats des commandes fournisseurs en cours (brouillons compris), dans l'ordre de `ids`"""
+    reliquats = dict(
+        LigneCommande.objects
+        .filter(commande__statut__in=['BROUILLON', 'VALIDEE'], quantite__gt=F('quantite_livree'))
+        .values('produit_id')
+        .annotate(reliquat=Sum(F('quantite') - F('quantite_livree')))
+        .values_list('produit_id', 'reliquat')
+        .order_by()
+    )
+    return np.array([reliquats.get(i, 0) for i in ids.tolist()], dtype=np.float64)
+
+
+def calculer_previsions(semaines=12, delai=7, couverture=14, service=0.95, jour=None):
+    """
+    Prévisions de demande et points de commande de tout le catalogue actif,
+    à partir des ventes des `semaines` dernières semaines closes avant
+    `jour` (aujourd'hui par défaut) :
+    - point de commande = demande prévue sur le délai de réappro +
+      stock de sécurité (z du taux de service × écart type sur le délai) ;
+    - quantité suggérée = de quoi couvrir délai + `couverture` jours
+      (plus la sécurité), moins le stock et les reliquats en commande.
+    Les produits sans aucune vente sur l'historique gardent leur seuil
+    manuel (point_commande à NULL). Écrit les champs en un bulk_update.
+    Retourne le nombre de produits mis à jour.
+    """
+    jour = jour or timezone.localdate()
+    fin = jour - timedelta(days=1)
+    debut = jour - timedelta(days=semaines * SAISON)
+
+    produits = list(Produit.objects.filter(est_actif=True).order_by('id').only('id', 'quantite_stock'))
+    if not produits:
+        return 0
+    ids = np.array([produit.id for produit in produits], dtype=np.int64)
+    stocks = np.array([produit.quantite_stock for produit in produits], dtype=np.float64)
+
+    ventes, _ = ventes_quotidiennes(ids, debut, fin)
+    niveau, saisons, ecart_type = lisser(ventes)
+
+    horizon = delai + couverture
+    prevues = prevoir(niveau, saisons, ventes.shape[1], horizon)
+    demande_delai = prevues[:, :delai].sum(axis=1)
+    securite = NormalDist().inv_cdf(service) * ecart_type * math.sqrt(delai)
+    points_commande = np.ceil(demande_delai + securite)
+    a_commander = np.ceil(prevues.sum(axis=1) + securite) - stocks - quantites_en_commande(ids)
+    quantites_suggerees = np.maximum(a_commander, 0)
+    demande_jour = prevues.mean(axis=1)
+    avec_historique = ventes.sum(axis=1) > 0
+
+    maintenant = timezone.now()
+    for produit, historique, demande, point, quantite in zip(
+        produits, avec_historique.tolist(), np.round(demande_jour, 2).tolist(),
+        points_commande.astype(np.int64).tolist(), quantites_suggerees.astype(np.int64).tolist()
+    ):
+        produit.demande_prevue = demande if historique else None
+        produit.point_commande = point if historique else None
+        produit.quantite_suggeree = quantite if historique else None
+        produit.date_prevision = maintenant
+
+    with transaction.atomic():
+        Produit.objects.bulk_update(
+            produits,
+            ['demande_prevue', 'point_commande', 'quantite_suggeree', 'date_prevision'],
+            batch_size=1000,
+        )
+        # bulk_update n'émet pas de signal : alertes des rapports à rafraîchir
+        invalider_rapports()
+    return len(produits)
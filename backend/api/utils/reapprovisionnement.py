@@ -0,0 +1,163 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from api.models import Commande, LigneCommande, Produit
+from api.utils.cache_rapports import invalider_rapports
+
+# Libellé (type_produit) des brouillons générés, repérés par reappro_auto :
+# un nouveau passage complète le brouillon du fournisseur au lieu d'en
+# ouvrir un second
+TYPE_REAPPRO = 'Réapprovisionnement automatique'
+
+# Verrou PostgreSQL (pg_advisory_xact_lock) : deux générations simultanées
+# s'exécutent l'une après l'autre
+VERROU_REAPPRO = 250025
+
+
+def produits_a_commander():
+    """
+    Produits actifs dont la position de stock (stock + reliquats des
+    commandes fournisseurs en cours, brouillons compris) est au niveau du
+    seuil effectif ou en dessous, avec leur fournisseur : le fournisseur
+    préféré, sinon celui de la dernière commande non annulée du produit.
+    Une seule requête (sous-requêtes corrélées).
+    """
+    en_commande = (
+        LigneCommande.objects
+        .filter(
+            produit=OuterRef('pk'),
+            commande__statut__in=['BROUILLON', 'VALIDEE'],
+            quantite__gt=F('quantite_livree'),
+        )
+        .values('produit')
+        .annotate(reliquat=Sum(F('quantite') - F('quantite_livree')))
+        .values('reliquat')
+    )
+    dernier_fournisseur = (
+        LigneCommande.objects
+        .filter(produit=OuterRef('pk'))
+        .exclude(commande__statut='ANNULEE')
+        .order_by('-commande__date_creation', '-id')
+        .values('commande__fournisseur_id')[:1]
+    )
+    return (
+        Produit.objects
+        .filter(est_actif=True)
+        .annotate(
+            en_commande=Coalesce(Subquery(en_commande, output_field=IntegerField()), 0),
+            seuil=Produit.expression_seuil(),
+            fournisseur_reappro=Coalesce(
+                F('fournisseur_prefere_id'), Subquery(dernier_fournisseur), output_field=IntegerField()
+            ),
+        )
+        .alias(position=F('quantite_stock') + F('en_commande'))
+        .filter(position__lte=F('seuil'))
+        .order_by('id')
+        .values_list(
+            'id', 'fournisseur_reappro', 'quantite_stock', 'en_commande',
+            'seuil', 'quantite_suggeree', 'prix_achat'
+        )
+    )
+
+
+def quantite_a_commander(stock, en_commande, seuil, quantite_suggeree):
+    """
+    Quantité suggérée par les prévisions, sinon de quoi remonter au double
+    du seuil ; toujours assez pour repasser au-dessus du seuil, ce qui
+    rend la génération idempotente.
+    """
+    position = stock + en_commande
+    quantite = quantite_suggeree if quantite_suggeree is not None else 2 * seuil - position
+    return max(quantite, seuil - position + 1)
+
+
+def generer_commandes_reappro(utilisateur):
+    """
+    Commandes fournisseurs BROUILLON des produits à réapprovisionner :
+    une par fournisseur (le brouillon automatique déjà ouvert est complété,
+    la quantité s'ajoutant à la ligne du produit s'il y figure déjà),
+    écrites par bulk_create / bulk_update, totaux recalculés en une
+    requête. Relancer sans changement de stock ne crée rien : les produits
+    commandés ont des reliquats qui les remontent au-dessus du seuil.
+    Retourne {'commandes': [ids], 'creees': n, 'lignes': n (créées ou
+    complétées), 'sans_fournisseur': [ids produits]}.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [VERROU_REAPPRO])
+
+        par_fournisseur = defaultdict(list)
+        sans_fournisseur = []
+        for produit_id, fournisseur_id, stock, en_commande, seuil, suggeree, prix_achat in produits_a_commander():
+            if fournisseur_id is None:
+                sans_fournisseur.append(produit_id)
+                continue
+            par_fournisseur[fournisseur_id].append(
+                (produit_id, quantite_a_commander(stock, en_commande, seuil, suggeree), prix_achat or Decimal('0'))
+            )
+
+        commandes = {}
+        for commande in (
+            Commande.objects
+            .select_for_update()
+            .filter(statut='BROUILLON', reappro_auto=True, fournisseur_id__in=par_fournisseur)
+            .order_by('id')
+        ):
+            commandes.setdefault(commande.fournisseur_id, commande)
+
+        # Lignes déjà présentes dans ces brouillons : (commande, produit) -> ligne
+        existantes = {}
+        for ligne in (
+            LigneCommande.objects
+            .select_for_update()
+            .filter(commande__in=list(commandes.values()))
+            .order_by('id')
+        ):
+            existantes.setdefault((ligne.commande_id, ligne.produit_id), ligne)
+
+        nouvelles = [
+            Commande(
+                utilisateur=utilisateur, fournisseur_id=fournisseur_id, type_produit=TYPE_REAPPRO,
+                statut='BROUILLON', reappro_auto=True
+            )
+            for fournisseur_id in par_fournisseur if fournisseur_id not in commandes
+        ]
+        # save() n'est pas appelé : codes générés ici
+        for commande in nouvelles:
+            commande.code_commande = commande.generate_code()
+        for commande in Commande.objects.bulk_create(nouvelles):
+            commandes[commande.fournisseur_id] = commande
+
+        lignes, completees = [], []
+        for fournisseur_id, produits in par_fournisseur.items():
+            commande = commandes[fournisseur_id]
+            for produit_id, quantite, prix_achat in produits:
+                ligne = existantes.get((commande.pk, produit_id))
+                if ligne is None:
+                    lignes.append(LigneCommande(
+                        commande=commande, produit_id=produit_id,
+                        quantite=quantite, prix_unitaire=prix_achat, total_ligne_ht=quantite * prix_achat
+                    ))
+                    continue
+                # Même calcul que LigneCommande.save(), au prix déjà négocié
+                ligne.quantite += quantite
+                ligne.total_ligne_ht = (ligne.quantite * ligne.prix_unitaire) * (1 - ligne.remise_ligne / 100)
+                completees.append(ligne)
+        LigneCommande.objects.bulk_create(lignes, batch_size=1000)
+        LigneCommande.objects.bulk_update(completees, ['quantite', 'total_ligne_ht'], batch_size=1000)
+
+        # bulk_create n'émet pas de signal : totaux et rapports mis à jour ici
+        ids = [commandes[fournisseur_id].pk for fournisseur_id in par_fournisseur]
+        if ids:
+            Commande.recalculer_prix_total(*ids)
+            invalider_rapports()
+
+    return {
+        'commandes': sorted(ids),
+        'creees': len(nouvelles),
+        'lignes': len(lignes) + len(completees),
+        'sans_fournisseur': sans_fournisseur,
+    }
@@ -0,0 +1,64 @@
+import os
+import threading
+
+from django.db import connection
+
+# Taille des blocs réservés par processus. Doit rester égale à
+# l'INCREMENT BY des séquences (migration 0011) : changer l'un impose un
+# ALTER SEQUENCE ... INCREMENT BY sur l'autre.
+TAILLE_BLOC = 50
+
+
+class GenerateurSequence:
+    """
+    Numéros uniques tirés d'une séquence PostgreSQL par blocs (hi/lo).
+    Chaque appel à nextval() réserve TAILLE_BLOC numéros pour le processus,
+    distribués ensuite sans requête. Les blocs ne se chevauchent jamais,
+    donc pas de collision entre workers ; un bloc entamé puis abandonné
+    (redémarrage, rollback) laisse simplement un trou dans la numérotation.
+    """
+
+    def __init__(self, sequence, format_numero, taille_bloc=TAILLE_BLOC):
+        self.sequence = sequence
+        self.format_numero = format_numero
+        self.taille_bloc = taille_bloc
+        self._verrou = threading.Lock()
+        self._pid = None
+        self._prochain = 0
+        self._fin_bloc = 0
+
+    def _nouveau_bloc(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval(%s)", [self.sequence])
+            debut = cursor.fetchone()[0]
+        self._prochain = debut
+        self._fin_bloc = debut + self.taille_bloc
+        self._pid = os.getpid()
+
+    def reserver(self, nombre):
+        """Retourne `nombre` numéros formatés, en ne touchant la base qu'à chaque nouveau bloc"""
+        numeros = []
+        with self._verrou:
+            # Un processus fils (fork) ne doit pas réutiliser le bloc du parent
+            if self._pid != os.getpid():
+                self._prochain = self._fin_bloc = 0
+            while len(numeros) < nombre:
+                if self._prochain >= self._fin_bloc:
+                    self._nouveau_bloc()
+                numeros.append(self.format_numero.format(self._prochain))
+                self._prochain += 1
+        return numeros
+
+    def suivant(self):
+        return self.reserver(1)[0]
+
+    def attribuer(self, objets, champ):
+        """Renseigne `champ` sur les objets qui n'en ont pas (avant un bulk_create)"""
+        sans_numero = [objet for objet in objets if not getattr(objet, champ)]
+        for objet, numero in zip(sans_numero, self.reserver(len(sans_numero))):
+            setattr(objet, champ, numero)
+        return objets
+
+
+references_produit = GenerateurSequence('api_produit_reference_seq', 'PRD{:05d}')
+numeros_commande_client = GenerateurSequence('api_commandeclient_numero_seq', 'CMD-{:03d}')
@@ -1,23 +1,334 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from functools import partial
 
+from django.db import transaction
+from django.db.models import Count, Sum, Q
+from django.db.models.functions import TruncDate, TruncHour, TruncMonth
 from django.utils import timezone
-from api.models import Statistique, CommandeClient, Produit
-from django.db.models import Sum, Count, Q, F
-
-def update_daily_stats():
-    """Met à jour les statistiques du jour"""
-    today = timezone.now().date()
-    stats, _ = Statistique.objects.get_or_create(date=today)
-    
-    # Commandes clients
-    stats.total_ventes = CommandeClient.objects.filter(
-        date_creation__date=today,
-        statut__in=['VALIDEE', 'LIVREE']
-    ).count()
-    
-    # Produits en alerte
-    stats.produits_en_alerte = Produit.objects.filter(
-        quantite_stock__lte=F('seuil_alerte'),
-        quantite_stock__gt=0
-    ).count()
-    
-    stats.save()
\ No newline at end of file
+from api.models import (
+    Statistique, StatistiqueHoraire, StatistiqueMensuelle,
+    Commande, CommandeClient, Client, Fournisseur, MouvementStock
+)
+from api.utils.cache_rapports import invalider_rapports
+
+# Compteurs recalculables pour n'importe quel jour passé. Les compteurs
+# d'état du stock (produits_actifs, produits_rupture...) sont une photo
+# de l'instant et ne peuvent pas être reconstruits après coup.
+CHAMPS_HISTORIQUES = [
+    'nb_commandes', 'nb_ventes', 'nb_ventes_directes', 'nb_commandes_clients',
+    'montant_total', 'montant_ventes_directes', 'montant_commandes',
+    'nouveaux_clients', 'nouveaux_fournisseurs', 'mouvements_stock',
+]
+
+# Compteurs tenus aussi par heure et par mois
+CHAMPS_VENTES = [
+    'nb_ventes', 'nb_ventes_directes', 'nb_commandes_clients',
+    'montant_total', 'montant_ventes_directes', 'montant_commandes',
+]
+
+# Nombre de points visé pour une série : on prend la granularité la plus
+# fine qui reste sous ce seuil (5 ans de données = 60 lignes mensuelles)
+POINTS_MAX_SERIE = 100
+
+
+def deltas_vente(etat, signe):
+    """
+    Variations des compteurs pour une vente (+1) ou son retrait (-1) :
+    retourne les lignes concernées [(modèle, période)] et les deltas.
+    """
+    heure, vente_directe, montant = etat
+    jour = heure.date()
+    periodes = [
+        (Statistique, jour),
+        (StatistiqueHoraire, heure),
+        (StatistiqueMensuelle, jour.replace(day=1)),
+    ]
+    return periodes, {
+        'nb_ventes': signe,
+        'nb_ventes_directes' if vente_directe else 'nb_commandes_clients': signe,
+        'montant_total': signe * montant,
+        'montant_ventes_directes' if vente_directe else 'montant_commandes': signe * montant,
+    }
+
+
+def appliquer_changement_vente(ancien, nouveau):
+    """
+    Répercute sur Statistique et ses rollups (heure, mois) le passage d'une
+    commande client de l'état `ancien` à l'état `nouveau`
+    (voir CommandeClient.etat_statistique).
+    Les variations sont appliquées après le commit pour ne pas garder les
+    lignes du jour verrouillées pendant la vente.
+    """
+    if ancien == nouveau:
+        return
+
+    changements = defaultdict(lambda: defaultdict(int))
+    for etat, signe in ((ancien, -1), (nouveau, 1)):
+        if etat is None:
+            continue
+        periodes, deltas = deltas_vente(etat, signe)
+        for periode in periodes:
+            for champ, delta in deltas.items():
+                changements[periode][champ] += delta
+
+    for (modele, periode), deltas in changements.items():
+        transaction.on_commit(partial(modele.appliquer_delta, periode, **deltas))
+
+
+def update_daily_stats(jour=None):
+    """Recalcul complet des stats d'un jour (réconciliation)"""
+    return Statistique.update_daily_stats(jour)
+
+
+def bornes_periode(debut, fin):
+    """Intervalle [debut 00:00, lendemain de fin 00:00[ dans le fuseau courant"""
+    return (
+        timezone.make_aware(datetime.combine(debut, time.min)),
+        timezone.make_aware(datetime.combine(fin + timedelta(days=1), time.min)),
+    )
+
+
+def commandes_clients_periode(debut, fin, **filtres):
+    """
+    CommandeClient créées de debut à fin (inclus). Filtre en plage
+    semi-ouverte sur la colonne brute (et non date_creation__date, qui
+    caste la colonne) : index et élagage des partitions restent utilisables.
+    """
+    borne_debut, borne_fin = bornes_periode(debut, fin)
+    return CommandeClient.objects.filter(
+        date_creation__gte=borne_debut, date_creation__lt=borne_fin, **filtres
+    )
+
+
+def calculer_statistiques(debut, fin):
+    """
+    Compteurs historiques de chaque jour de debut à fin (inclus),
+    avec une requête groupée par jour et par table.
+    """
+    borne_debut, borne_fin = bornes_periode(debut, fin)
+    jours = {}
+    jour = debut
+    while jour <= fin:
+        jours[jour] = {
+            champ: Decimal('0') if champ.startswith('montant') else 0
+            for champ in CHAMPS_HISTORIQUES
+        }
+        jour += timedelta(days=1)
+
+    def par_jour(queryset, champ_date):
+        return (
+            queryset
+            .filter(**{f'{champ_date}__gte': borne_debut, f'{champ_date}__lt': borne_fin})
+            .annotate(jour=TruncDate(champ_date))
+            .values('jour')
+            .order_by()
+        )
+
+    comptages = [
+        (Commande.objects, 'date_creation', 'nb_commandes'),
+        (Client.objects, 'date_creation', 'nouveaux_clients'),
+        (Fournisseur.objects, 'date_creation', 'nouveaux_fournisseurs'),
+        (MouvementStock.objects, 'date_mouvement', 'mouvements_stock'),
+    ]
+    for queryset, champ_date, champ in comptages:
+        for ligne in par_jour(queryset, champ_date).annotate(nombre=Count('id')):
+            jours[ligne['jour']][champ] = ligne['nombre']
+
+    ventes = par_jour(
+        CommandeClient.objects.filter(statut__in=CommandeClient.STATUTS_STATISTIQUE),
+        'date_creation'
+    ).annotate(
+        nb_ventes=Count('id'),
+        nb_ventes_directes=Count('id', filter=Q(is_vente_directe=True)),
+        montant_total=Sum('total_commande'),
+        montant_ventes_directes=Sum('total_commande', filter=Q(is_vente_directe=True)),
+    )
+    for ligne in ventes:
+        stats = jours[ligne['jour']]
+        stats['nb_ventes'] = ligne['nb_ventes']
+        stats['nb_ventes_directes'] = ligne['nb_ventes_directes']
+        stats['nb_commandes_clients'] = ligne['nb_ventes'] - ligne['nb_ventes_directes']
+        stats['montant_total'] = ligne['montant_total'] or Decimal('0')
+        stats['montant_ventes_directes'] = ligne['montant_ventes_directes'] or Decimal('0')
+        stats['montant_commandes'] = stats['montant_total'] - stats['montant_ventes_directes']
+
+    return [{'date': jour, **valeurs} for jour, valeurs in jours.items()]
+
+
+def enregistrer_statistiques(lignes, batch_size=500):
+    """Upsert en masse des compteurs historiques (une ligne Statistique par jour)"""
+    Statistique.objects.bulk_create(
+        [Statistique(**valeurs) for valeurs in lignes],
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['date'],
+        update_fields=CHAMPS_HISTORIQUES,
+    )
+    if lignes:
+        invalider_rapports(min(valeurs['date'] for valeurs in lignes))
+
+
+def _agreger_ventes(queryset):
+    """Annotations des compteurs de ventes sur un queryset de CommandeClient groupé"""
+    return queryset.annotate(
+        nb_ventes=Count('id'),
+        nb_ventes_directes=Count('id', filter=Q(is_vente_directe=True)),
+        montant_total=Sum('total_commande'),
+        montant_ventes_directes=Sum('total_commande', filter=Q(is_vente_directe=True)),
+    )
+
+
+def calculer_ventes_horaires(debut, fin):
+    """Compteurs de ventes par heure de debut à fin (inclus), en une requête groupée"""
+    borne_debut, borne_fin = bornes_periode(debut, fin)
+    lignes = []
+    for ligne in _agreger_ventes(
+        CommandeClient.objects
+        .filter(
+            statut__in=CommandeClient.STATUTS_STATISTIQUE,
+            date_creation__gte=borne_debut,
+            date_creation__lt=borne_fin,
+        )
+        .annotate(periode=TruncHour('date_creation'))
+        .values('periode')
+        .order_by()
+    ):
+        montant_total = ligne['montant_total'] or Decimal('0')
+        montant_directes = ligne['montant_ventes_directes'] or Decimal('0')
+        lignes.append({
+            'periode': ligne['periode'],
+            'nb_ventes': ligne['nb_ventes'],
+            'nb_ventes_directes': ligne['nb_ventes_directes'],
+            'nb_commandes_clients': ligne['nb_ventes'] - ligne['nb_ventes_directes'],
+            'montant_total': montant_total,
+            'montant_ventes_directes': montant_directes,
+            'montant_commandes': montant_total - montant_directes,
+        })
+    return lignes
+
+
+def enregistrer_ventes_horaires(debut, fin, lignes, batch_size=500):
+    """Remplace les lignes StatistiqueHoraire de la période"""
+    borne_debut, borne_fin = bornes_periode(debut, fin)
+    with transaction.atomic():
+        StatistiqueHoraire.objects.filter(periode__gte=borne_debut, periode__lt=borne_fin).delete()
+        StatistiqueHoraire.objects.bulk_create(
+            [StatistiqueHoraire(**valeurs) for valeurs in lignes],
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['periode'],
+            update_fields=CHAMPS_VENTES,
+        )
+
+
+def reconstruire_statistiques_mensuelles(debut, fin):
+    """Recalcule, à partir des lignes Statistique, les mois couvrant la période"""
+    premier_mois = debut.replace(day=1)
+    apres_dernier_mois = (fin.replace(day=1) + timedelta(days=31)).replace(day=1)
+    mois = (
+        Statistique.objects
+        .filter(date__gte=premier_mois, date__lt=apres_dernier_mois)
+        .annotate(periode=TruncMonth('date'))
+        .values('periode')
+        .annotate(**{champ: Sum(champ) for champ in CHAMPS_VENTES})
+        .order_by()
+    )
+    with transaction.atomic():
+        StatistiqueMensuelle.objects.filter(
+            periode__gte=premier_mois, periode__lt=apres_dernier_mois
+        ).delete()
+        StatistiqueMensuelle.objects.bulk_create(
+            [StatistiqueMensuelle(**valeurs) for valeurs in mois],
+            update_conflicts=True,
+            unique_fields=['periode'],
+            update_fields=CHAMPS_VENTES,
+        )
+    invalider_rapports(premier_mois)
+
+
+def recalculer_rollups(debut, fin):
+    """Recalcule les rollups horaires et mensuels d'une période"""
+    enregistrer_ventes_horaires(debut, fin, calculer_ventes_horaires(debut, fin))
+    reconstruire_statistiques_mensuelles(debut, fin)
+
+
+def choisir_granularite(nb_jours):
+    """
+    Granularité la plus fine dont la série reste sous POINTS_MAX_SERIE
+    points : la table la plus grossière n'est lue que lorsque la plus fine
+    dépasserait ce plafond (cinq ans : 60 lignes mensuelles).
+    """
+    if nb_jours * 24 <= POINTS_MAX_SERIE:
+        return 'heure'
+    if nb_jours <= POINTS_MAX_SERIE:
+        return 'jour'
+    return 'mois'
+
+
+def serie_ventes(debut, fin, granularite=None):
+    """
+    Série des ventes de debut à fin (inclus) lue dans la table pré-agrégée
+    adaptée (StatistiqueHoraire, Statistique ou StatistiqueMensuelle),
+    périodes sans vente complétées à zéro, et totaux de la série.
+    En granularité mensuelle, les mois entamés aux bornes sont calculés
+    sur les seuls jours demandés (Statistique) : les totaux couvrent
+    exactement [debut, fin].
+    """
+    granularite = granularite or choisir_granularite((fin - debut).days + 1)
+
+    if granularite == 'heure':
+        borne_debut, borne_fin = bornes_periode(debut, fin)
+        lignes = StatistiqueHoraire.objects.filter(periode__gte=borne_debut, periode__lt=borne_fin)
+        periodes = []
+        periode = borne_debut
+        while periode < borne_fin:
+            periodes.append(periode)
+            periode += timedelta(hours=1)
+        libelle = lambda p: timezone.localtime(p).strftime('%Y-%m-%dT%H:00')
+    elif granularite == 'jour':
+        lignes = Statistique.objects.filter(date__gte=debut, date__lte=fin)
+        periodes = [debut + timedelta(days=i) for i in range((fin - debut).days + 1)]
+        libelle = lambda p: p.strftime('%Y-%m-%d')
+    elif granularite == 'mois':
+        periodes = []
+        partiels = {}
+        periode = debut.replace(day=1)
+        while periode <= fin:
+            suivant = (periode + timedelta(days=31)).replace(day=1)
+            if periode < debut or suivant - timedelta(days=1) > fin:
+                # Mois entamé : jours de la période seulement
+                partiels[periode] = Statistique.objects.filter(
+                    date__gte=max(periode, debut), date__lte=min(suivant - timedelta(days=1), fin)
+                ).aggregate(**{champ: Sum(champ, default=0) for champ in CHAMPS_VENTES})
+            periodes.append(periode)
+            periode = suivant
+        lignes = StatistiqueMensuelle.objects.filter(
+            periode__gte=debut, periode__lte=fin
+        ).exclude(periode__in=list(partiels))
+        libelle = lambda p: p.strftime('%Y-%m')
+    else:
+        raise ValueError("Granularité inconnue (heure, jour ou mois)")
+
+    cle = 'date' if granularite == 'jour' else 'periode'
+    par_periode = {ligne[cle]: ligne for ligne in lignes.values(cle, *CHAMPS_VENTES)}
+    if granularite == 'mois':
+        par_periode.update(partiels)
+
+    totaux = {champ: Decimal('0') if champ.startswith('montant') else 0 for champ in CHAMPS_VENTES}
+    serie = []
+    for periode in periodes:
+        ligne = par_periode.get(periode)
+        if ligne:
+            for champ in CHAMPS_VENTES:
+                totaux[champ] += ligne[champ]
+        serie.append({
+            'date': libelle(periode),
+            'ca_ht': float(ligne['montant_total']) if ligne else 0.0,
+            'ventes': ligne['nb_ventes'] if ligne else 0,
+            'ventes_directes': ligne['nb_ventes_directes'] if ligne else 0,
+            'commandes_clients': ligne['nb_commandes_clients'] if ligne else 0,
+        })
+
+    return granularite, debut, serie, totaux
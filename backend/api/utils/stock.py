@@ -0,0 +1,222 @@
+from collections import defaultdict
+
+from django.db import connection, transaction
+from api.models import Produit, MouvementStock, LigneCommande
+from api.utils.cache_rapports import invalider_rapports
+
+
+def reserver_stock(quantites, utilisateur_id=None, motif=''):
+    """
+    Décrémente le stock de toutes les lignes d'une vente en une seule requête.
+
+    `quantites` est un dict {produit_id: quantité totale demandée}.
+    Les produits sont verrouillés dans l'ordre de leur id (pas d'interblocage
+    entre caisses qui vendent les mêmes articles), puis un UPDATE ensembliste
+    décrémente chaque ligne dont le stock suffit (quantite_stock >= demandé)
+    et inscrit la sortie correspondante au journal MouvementStock.
+
+    Retourne la liste des lignes en rupture (vide si tout a été réservé).
+    Si elle n'est pas vide, l'appelant doit annuler la transaction : les lignes
+    suffisantes ont déjà été décrémentées. Doit être appelé dans un
+    transaction.atomic().
+    """
+    if not quantites:
+        return []
+
+    produit_ids = sorted(quantites)
+    table = connection.ops.quote_name(Produit._meta.db_table)
+    journal = connection.ops.quote_name(MouvementStock._meta.db_table)
+    valeurs = ', '.join(['(%s::bigint, %s::integer)'] * len(produit_ids))
+    params = []
+    for produit_id in produit_ids:
+        params.extend([produit_id, quantites[produit_id]])
+    params.extend([utilisateur_id, motif])
+
+    sql = f"""
+        WITH demande (id, quantite) AS (VALUES {valeurs}),
+        verrou AS (
+            SELECT p.id, p.designation, p.quantite_stock
+            FROM {table} p
+            WHERE p.id IN (SELECT id FROM demande)
+            ORDER BY p.id
+            FOR UPDATE
+        ),
+        maj AS (
+            UPDATE {table} p
+            SET quantite_stock = p.quantite_stock - d.quantite,
+                date_modification = NOW()
+            FROM demande d, verrou v
+            WHERE p.id = d.id AND v.id = d.id AND v.quantite_stock >= d.quantite
+            RETURNING p.id
+        ),
+        sorties AS (
+            INSERT INTO {journal} (produit_id, utilisateur_id, type_mouvement, quantite, date_mouvement, motif)
+            SELECT d.id, %s, 'sortie', d.quantite, NOW(), %s
+            FROM maj m JOIN demande d ON d.id = m.id
+        )
+        SELECT d.id, v.designation, d.quantite, COALESCE(v.quantite_stock, 0)
+        FROM demande d
+        LEFT JOIN verrou v ON v.id = d.id
+        LEFT JOIN maj m ON m.id = d.id
+        WHERE m.id IS NULL
+        ORDER BY d.id
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    # Sorties insérées en SQL brut : pas de signal MouvementStock
+    invalider_rapports()
+
+    return [
+        {
+            'produit_id': produit_id,
+            'designation': designation,
+            'quantite_demandee': quantite,
+            'quantite_stock': quantite_stock,
+        }
+        for produit_id, designation, quantite, quantite_stock in rows
+    ]
+
+
+def appliquer_variations(variations):
+    """
+    Ajoute à quantite_stock la variation nette de chaque produit
+    (`variations` : dict {produit_id: variation signée}) en un seul UPDATE.
+    Les lignes sont verrouillées dans l'ordre des id, comme reserver_stock.
+    Comme reserver_stock, une variation négative ne peut pas faire passer
+    le stock sous zéro : s'il y a une rupture, aucun stock n'est modifié
+    (même requête, pas d'annulation à faire).
+    Retourne ({produit_id: nouveau stock}, {produit_id: stock actuel des produits en rupture}).
+    """
+    variations = {produit_id: delta for produit_id, delta in variations.items() if delta}
+    if not variations:
+        return {}, {}
+
+    produit_ids = sorted(variations)
+    table = connection.ops.quote_name(Produit._meta.db_table)
+    valeurs = ', '.join(['(%s::bigint, %s::integer)'] * len(produit_ids))
+    params = []
+    for produit_id in produit_ids:
+        params.extend([produit_id, variations[produit_id]])
+
+    sql = f"""
+        WITH variation (id, delta) AS (VALUES {valeurs}),
+        verrou AS (
+            SELECT p.id, p.quantite_stock FROM {table} p
+            WHERE p.id IN (SELECT id FROM variation)
+            ORDER BY p.id
+            FOR UPDATE
+        ),
+        rupture AS (
+            SELECT v.id, verrou.quantite_stock
+            FROM variation v JOIN verrou ON verrou.id = v.id
+            WHERE v.delta < 0 AND verrou.quantite_stock + v.delta < 0
+        ),
+        maj AS (
+            UPDATE {table} p
+            SET quantite_stock = p.quantite_stock + v.delta,
+                date_modification = NOW()
+            FROM variation v, verrou
+            WHERE p.id = v.id AND verrou.id = v.id AND NOT EXISTS (SELECT 1 FROM rupture)
+            RETURNING p.id, p.quantite_stock
+        )
+        SELECT FALSE, id, quantite_stock FROM maj
+        UNION ALL
+        SELECT TRUE, id, quantite_stock FROM rupture
+    """
+    stocks, ruptures = {}, {}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for en_rupture, produit_id, quantite_stock in cursor.fetchall():
+            (ruptures if en_rupture else stocks)[produit_id] = quantite_stock
+    return stocks, ruptures
+
+
+def enregistrer_mouvements(mouvements, batch_size=500):
+    """
+    Applique la variation nette par produit en une requête, puis inscrit
+    les MouvementStock au journal par bulk_create (au lieu d'un UPDATE par
+    mouvement via MouvementStock.save()).
+    Retourne (mouvements créés, {produit_id: nouveau stock}, ruptures) ;
+    si `ruptures` ({produit_id: stock actuel}) n'est pas vide, rien n'a
+    été écrit.
+    """
+    variations = defaultdict(int)
+    for mouvement in mouvements:
+        variations[mouvement.produit_id] += mouvement.variation_stock()
+
+    with transaction.atomic():
+        stocks, ruptures = appliquer_variations(variations)
+        if ruptures:
+            return [], {}, ruptures
+        crees = MouvementStock.objects.bulk_create(mouvements, batch_size=batch_size)
+        invalider_rapports()
+
+        # Produits sans variation nette : stock inchangé, relu pour la réponse
+        inchanges = set(variations) - set(stocks)
+        if inchanges:
+            stocks.update(
+                Produit.objects.filter(pk__in=inchanges).values_list('id', 'quantite_stock')
+            )
+    return crees, stocks, ruptures
+
+
+def receptionner_commande(commande, quantites, utilisateur_id=None, motif=None):
+    """
+    Enregistre une livraison fournisseur : `quantites` est un dict
+    {ligne_id: quantité reçue}. Met à jour quantite_livree et
+    statut_livraison des lignes en un UPDATE (bulk_update), inscrit les
+    entrées au journal et incrémente le stock via enregistrer_mouvements.
+    La commande passe à LIVREE quand toutes ses lignes le sont.
+
+    Retourne (erreurs, stocks) : si `erreurs` ({ligne_id: message}) n'est
+    pas vide, rien n'a été écrit. Doit être appelé dans un transaction.atomic().
+    """
+    lignes = {
+        ligne.id: ligne
+        for ligne in LigneCommande.objects.select_for_update().filter(commande=commande).order_by('id')
+    }
+
+    erreurs = {}
+    for ligne_id, quantite in quantites.items():
+        ligne = lignes.get(ligne_id)
+        if ligne is None:
+            erreurs[ligne_id] = "Ligne absente de cette commande"
+        elif quantite <= 0:
+            erreurs[ligne_id] = "La quantité reçue doit être positive"
+        elif ligne.quantite_livree + quantite > ligne.quantite:
+            erreurs[ligne_id] = (
+                f"Quantité reçue supérieure au reliquat "
+                f"({ligne.quantite - ligne.quantite_livree} restant à livrer)"
+            )
+    if erreurs:
+        return erreurs, {}
+
+    motif = motif or f"Réception commande {commande.code_commande}"
+    mouvements = []
+    for ligne_id, quantite in quantites.items():
+        ligne = lignes[ligne_id]
+        ligne.quantite_livree += quantite
+        ligne.statut_livraison = ligne.statut_pour(ligne.quantite_livree)
+        mouvements.append(MouvementStock(
+            produit_id=ligne.produit_id,
+            utilisateur_id=utilisateur_id,
+            commande=commande,
+            fournisseur_id=commande.fournisseur_id,
+            type_mouvement='entree',
+            quantite=quantite,
+            motif=motif,
+        ))
+
+    LigneCommande.objects.bulk_update(
+        [lignes[ligne_id] for ligne_id in quantites],
+        ['quantite_livree', 'statut_livraison'],
+    )
+    # Entrées seulement : pas de rupture possible
+    _, stocks, _ = enregistrer_mouvements(mouvements)
+
+    if all(ligne.statut_livraison == 'LIVREE' for ligne in lignes.values()):
+        commande.statut = 'LIVREE'
+        commande.save(update_fields=['statut'])
+
+    return erreurs, stocks
@@ -0,0 +1,83 @@
+from django.db import connection
+from django.utils.dateparse import parse_datetime
+from api.models import Produit, Taxe, Categorie, SuppressionCatalogue
+
+# Le jeton est ordonné par les commits, pas par l'horloge : chaque ligne
+# du catalogue porte l'identifiant de la transaction qui l'a écrite
+# (version_synchro, posé par trigger, voir migration 0021) et le jeton est
+# le xmin de l'instantané pris avant la lecture, c'est-à-dire la plus
+# ancienne transaction encore en cours. Toute transaction non validée au
+# moment de la synchro a un identifiant >= xmin : ses lignes seront
+# renvoyées à la synchro suivante, quelle que soit sa durée. Les caisses
+# appliquent les lignes par id, recevoir deux fois une ligne est sans effet.
+
+CHAMPS_PRODUIT = [
+    'id', 'reference', 'designation', 'prix_vente', 'quantite_stock',
+    'seuil_alerte', 'unite_mesure', 'code_barre', 'categorie', 'tva',
+]  # Toute colonne ajoutée ici doit l'être au trigger version_synchro de api_produit
+
+
+def jeton_courant():
+    """Plus ancienne transaction en cours (xmin de l'instantané courant)"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        return cursor.fetchone()[0]
+
+
+def ecrire_jeton(jeton):
+    return str(jeton)
+
+
+def lire_jeton(jeton):
+    """
+    Convertit un jeton de synchro en version (ValueError si invalide).
+    Les anciens jetons horodatés retournent None : synchro complète.
+    """
+    if jeton.isdigit():
+        return int(jeton)
+    if parse_datetime(jeton) is not None:
+        return None
+    raise ValueError("Jeton de synchronisation invalide")
+
+
+def delta_catalogue(depuis=None):
+    """
+    Retourne les querysets du catalogue modifiés depuis le jeton `depuis`
+    (tout le catalogue actif si None) et le nouveau jeton, lu avant les
+    données.
+    """
+    jeton = jeton_courant()
+    produits = Produit.objects.order_by('id')
+    taxes = Taxe.objects.order_by('id')
+    categories = Categorie.objects.order_by('id')
+
+    if depuis is None:
+        return {
+            'jeton': jeton,
+            'produits': produits.filter(est_actif=True),
+            'produits_archives': [],
+            'taxes': taxes,
+            'taxes_supprimees': [],
+            'categories': categories,
+            'categories_supprimees': [],
+        }
+
+    modifies = produits.filter(version_synchro__gte=depuis)
+    suppressions = SuppressionCatalogue.objects.filter(version_synchro__gte=depuis)
+
+    def supprimes(modele):
+        return list(suppressions.filter(modele=modele).values_list('objet_id', flat=True))
+
+    return {
+        'jeton': jeton,
+        'produits': modifies.filter(est_actif=True),
+        'produits_archives': (
+            list(modifies.filter(est_actif=False).values_list('id', flat=True))
+            + supprimes('produit')
+        ),
+        'taxes': taxes.filter(version_synchro__gte=depuis),
+        'taxes_supprimees': supprimes('taxe'),
+        'categories': categories.filter(version_synchro__gte=depuis),
+        'categories_supprimees': supprimes('categorie'),
+    }
+
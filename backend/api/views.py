@@ -49,12 +49,55 @@ class IsVendeurOrCaissier(BasePermission):
 
 
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from .pagination import ProduitCursorPagination, CommandePagination
+from .utils.barcode import rechercher_par_code_barre
+from .utils.sync import CHAMPS_PRODUIT, delta_catalogue, ecrire_jeton, lire_jeton
+from .utils.statistics import serie_ventes, bornes_periode, commandes_clients_periode
+from .utils.stock import enregistrer_mouvements, receptionner_commande
+from .utils.inventaire import stock_a_date
+from .utils.cache_rapports import cle_rapport, rapport_en_cache
+from .utils.exports import EXPORTS, FORMATS, flux_export
+from .utils.analyse_produits import PERIODE_MAX_ANALYSE, analyse_produits
+from .utils.export_colonnes import FORMATS_COLONNES, ecrire_faits, pyarrow_disponible
+import tempfile
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from .serializers import TaxeSerializer, CategorieSerializer, MouvementStockLigneSerializer
 
 class ProduitViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     authentication_classes = [JWTAuthentication]
     queryset = Produit.objects.all()
     serializer_class = ProduitSerializer
+    pagination_class = ProduitCursorPagination
+
+    def get_sparse_fields(self):
+        """Champs demandés via ?fields=id,designation,... (lecture seule)"""
+        if self.action not in ('list', 'retrieve'):
+            return None
+        fields = self.request.query_params.get('fields')
+        if not fields:
+            return None
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+        inconnus = sorted(set(fields) - set(self.serializer_class().fields))
+        if inconnus:
+            raise ValidationError({'fields': f"Champs inconnus : {', '.join(inconnus)}"})
+        return fields
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_sparse_fields()
+        if fields:
+            # Ne charge que les colonnes demandées (l'id est toujours inclus)
+            colonnes = {f.name for f in Produit._meta.concrete_fields}
+            queryset = queryset.only('id', *[f for f in fields if f in colonnes])
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_sparse_fields()
+        if fields:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
 
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -70,9 +113,253 @@ class ProduitViewSet(viewsets.ModelViewSet):
                 {'error': str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
-    
-    
-   
+
+    @action(detail=False, methods=['get'], url_path=r'by-barcode/(?P<ean>[^/]+)')
+    def by_barcode(self, request, ean=None):
+        """Résout un scan en fiche produit compacte (cache LRU par processus, revérifié par version)"""
+        fiche = rechercher_par_code_barre(ean)
+        if fiche is None:
+            return Response({'error': 'Produit introuvable'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(fiche)
+
+    @action(detail=False, methods=['get'], url_path='as-of')
+    def as_of(self, request):
+        """
+        Stock et valorisation (au prix d'achat actuel) en fin de journée :
+        GET /api/produits/as-of/?date=AAAA-MM-JJ[&produits=1,2,3]
+        """
+        try:
+            jour = timezone.datetime.strptime(request.query_params.get('date', ''), '%Y-%m-%d').date()
+            produit_ids = request.query_params.get('produits')
+            produit_ids = [int(pk) for pk in produit_ids.split(',')] if produit_ids else None
+        except ValueError:
+            return Response(
+                {'error': "Paramètres invalides : date=AAAA-MM-JJ, produits=id1,id2..."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        soldes = stock_a_date(jour, produit_ids)
+        produits = Produit.objects.filter(pk__in=soldes).values('id', 'reference', 'designation', 'prix_achat').order_by('id')
+
+        lignes = []
+        valeur_totale = Decimal('0')
+        for produit in produits:
+            quantite = soldes[produit['id']]
+            valeur = quantite * (produit['prix_achat'] or Decimal('0'))
+            valeur_totale += valeur
+            lignes.append({**produit, 'quantite': quantite, 'valeur': valeur})
+
+        return Response({
+            'date': jour.strftime('%Y-%m-%d'),
+            'produits': lignes,
+            'valeur_totale': valeur_totale,
+        })
+
+
+
+
+class SynchroCatalogueView(APIView):
+    """
+    Synchro différentielle du catalogue pour les caisses :
+    GET /api/sync/catalog/?since=<jeton> ne renvoie que ce qui a changé
+    (ou a été archivé/supprimé) depuis le jeton, avec un nouveau jeton.
+    Sans `since`, renvoie tout le catalogue actif.
+    """
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [JWTAuthentication]
+
+    def get(self, request):
+        jeton = request.query_params.get('since')
+        try:
+            depuis = lire_jeton(jeton) if jeton else None
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        delta = delta_catalogue(depuis)
+        return Response({
+            'token': ecrire_jeton(delta['jeton']),
+            'complet': depuis is None,
+            'produits': ProduitSerializer(delta['produits'], many=True, fields=CHAMPS_PRODUIT).data,
+            'produits_archives': delta['produits_archives'],
+            'taxes': TaxeSerializer(delta['taxes'], many=True).data,
+            'taxes_supprimees': delta['taxes_supprimees'],
+            'categories': CategorieSerializer(delta['categories'], many=True).data,
+            'categories_supprimees': delta['categories_supprimees'],
+        })
+
+class ExportView(APIView):
+    """
+    Export en flux : GET /api/exports/<ventes|mouvements|produits>.<csv|ndjson>
+    ?debut=AAAA-MM-JJ&fin=AAAA-MM-JJ (ventes, mouvements) &produit=<id> (mouvements).
+    Lu par curseur serveur et envoyé au fil de l'eau : mémoire constante
+    quel que soit le volume, premier octet immédiat.
+    GET /api/exports/ventes.<parquet|arrow> renvoie la table de faits des
+    ventes (décimaux exacts), écrite dans un fichier temporaire (pied de
+    fichier Parquet) puis envoyée ; nécessite pyarrow.
+    """
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [JWTAuthentication]
+
+    def get(self, request, ressource, extension):
+        colonnes = extension in FORMATS_COLONNES
+        if ressource not in EXPORTS or (extension not in FORMATS and not (colonnes and ressource == 'ventes')):
+            return Response(
+                {'error': (
+                    f"Export disponible : {', '.join(EXPORTS)} en {', '.join(FORMATS)}, "
+                    f"ventes en {', '.join(FORMATS_COLONNES)}"
+                )},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        if colonnes and not pyarrow_disponible():
+            return Response(
+                {'error': "Export colonnaire indisponible : pyarrow n'est pas installé sur le serveur"},
+                status=status.HTTP_501_NOT_IMPLEMENTED
+            )
+
+        filtres = {}
+        try:
+            if ressource in ('ventes', 'mouvements'):
+                for nom in ('debut', 'fin'):
+                    valeur = request.query_params.get(nom)
+                    filtres[nom] = timezone.datetime.strptime(valeur, '%Y-%m-%d').date() if valeur else None
+                if filtres['debut'] and filtres['fin'] and filtres['debut'] > filtres['fin']:
+                    raise ValueError("La date de début doit être antérieure à la date de fin")
+            if ressource == 'mouvements' and request.query_params.get('produit'):
+                filtres['produit_id'] = int(request.query_params['produit'])
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        horodatage = timezone.localtime().strftime('%Y%m%d-%H%M')
+        nom_fichier = f"{ressource}-{horodatage}.{extension}"
+        if colonnes:
+            fichier = tempfile.TemporaryFile()
+            ecrire_faits(fichier, format_fichier=extension, **filtres)
+            fichier.seek(0)
+            return FileResponse(
+                fichier, as_attachment=True, filename=nom_fichier, content_type=FORMATS_COLONNES[extension]
+            )
+
+        reponse = StreamingHttpResponse(
+            flux_export(ressource, extension, **filtres), content_type=FORMATS[extension]
+        )
+        reponse['Content-Disposition'] = f'attachment; filename="{nom_fichier}"'
+        # Pas de mise en tampon par un proxy nginx : les morceaux partent tout de suite
+        reponse['X-Accel-Buffering'] = 'no'
+        return reponse
+
+
+class MouvementsStockBulkView(APIView):
+    """
+    POST /api/mouvements/bulk/ : enregistre en une transaction une série de
+    mouvements de stock (réception, inventaire...).
+    Corps : {"mouvements": [{produit, type_mouvement, quantite, ...}],
+    "commande", "fournisseur", "motif"} (valeurs communes facultatives).
+    Tout ou rien : si une ligne est invalide, ou si les sorties et ajustements
+    négatifs d'un produit dépassent son stock, rien n'est écrit et la
+    réponse donne les erreurs ligne par ligne.
+    """
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [JWTAuthentication]
+    MAX_LIGNES = 5000
+
+    def post(self, request):
+        lignes = request.data.get('mouvements')
+        if not isinstance(lignes, list) or not lignes:
+            return Response({'error': "'mouvements' doit être une liste non vide"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(lignes) > self.MAX_LIGNES:
+            return Response(
+                {'error': f"{self.MAX_LIGNES} mouvements maximum par envoi"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        communs = {
+            champ: request.data[champ]
+            for champ in ('commande', 'fournisseur', 'motif')
+            if request.data.get(champ) not in (None, '')
+        }
+        serializer = MouvementStockLigneSerializer(
+            data=[{**communs, **ligne} if isinstance(ligne, dict) else ligne for ligne in lignes],
+            many=True
+        )
+        serializer.is_valid()
+        # Avec many=True, errors contient un dict par ligne (vide si valide)
+        erreurs = list(serializer.errors) or [{} for _ in lignes]
+
+        if not any(erreurs):
+            # Existence des références vérifiée en une requête par table
+            donnees = serializer.validated_data
+
+            def ids_existants(modele, champ):
+                ids = {ligne[champ] for ligne in donnees if ligne.get(champ)}
+                return set(modele.objects.filter(pk__in=ids).values_list('pk', flat=True)) if ids else set()
+
+            produits = ids_existants(Produit, 'produit')
+            commandes = ids_existants(Commande, 'commande')
+            fournisseurs = ids_existants(Fournisseur, 'fournisseur')
+
+            for index, ligne in enumerate(donnees):
+                if ligne['produit'] not in produits:
+                    erreurs[index]['produit'] = ["Produit introuvable"]
+                if ligne.get('commande') and ligne['commande'] not in commandes:
+                    erreurs[index]['commande'] = ["Commande introuvable"]
+                if ligne.get('fournisseur') and ligne['fournisseur'] not in fournisseurs:
+                    erreurs[index]['fournisseur'] = ["Fournisseur introuvable"]
+
+        if any(erreurs):
+            return Response({
+                'success': False,
+                'resultats': [
+                    {'ligne': index, 'statut': 'erreur', 'erreurs': erreur} if erreur
+                    else {'ligne': index, 'statut': 'valide'}
+                    for index, erreur in enumerate(erreurs)
+                ]
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        mouvements = [
+            MouvementStock(
+                produit_id=ligne['produit'],
+                utilisateur_id=request.user.id,
+                type_mouvement=ligne['type_mouvement'],
+                quantite=ligne['quantite'],
+                commande_id=ligne.get('commande'),
+                fournisseur_id=ligne.get('fournisseur'),
+                motif=ligne.get('motif'),
+            )
+            for ligne in serializer.validated_data
+        ]
+        crees, stocks, ruptures = enregistrer_mouvements(mouvements)
+        if ruptures:
+            # Comme la vente directe : pas de stock négatif, rien n'est enregistré.
+            # Lignes en erreur : celles qui diminuent le stock d'un produit en rupture
+            return Response({
+                'success': False,
+                'resultats': [
+                    {
+                        'ligne': index,
+                        'statut': 'erreur',
+                        'erreurs': {'quantite': [
+                            f"Stock insuffisant (stock actuel: {ruptures[ligne['produit']]})"
+                        ]},
+                    } if ligne['produit'] in ruptures and mouvement.variation_stock() < 0
+                    else {'ligne': index, 'statut': 'valide'}
+                    for index, (ligne, mouvement) in enumerate(zip(serializer.validated_data, mouvements))
+                ]
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'success': True,
+            'nb_mouvements': len(crees),
+            'resultats': [
+                {
+                    'ligne': index,
+                    'statut': 'cree',
+                    'id': mouvement.id,
+                    'produit': mouvement.produit_id,
+                    'quantite_stock': stocks.get(mouvement.produit_id),
+                }
+                for index, mouvement in enumerate(crees)
+            ]
+        }, status=status.HTTP_201_CREATED)
 
 class FournisseurViewSet(viewsets.ModelViewSet):
     queryset = Fournisseur.objects.all()
@@ -251,20 +538,6 @@ def user_activity(request, user_id):
 
 
 
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-
-@receiver(post_save, sender=MouvementStock)
-def update_stock(sender, instance, **kwargs):
-    produit = instance.produit
-    if instance.type_mouvement == 'entree':
-        produit.quantite_stock += instance.quantite
-    elif instance.type_mouvement == 'sortie':
-        produit.quantite_stock -= instance.quantite
-    produit.save()
-
-
-
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from .models import CommandeClient, LigneCommandeClient
@@ -282,7 +555,7 @@ from rest_framework.decorators import action
 from django.core.exceptions import ValidationError
 from rest_framework.exceptions import APIException
 
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
@@ -291,7 +564,8 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.db import transaction
 from .models import CommandeClient, Produit, LigneCommandeClient
-from .serializers import CommandeClientSerializer
+from .serializers import CommandeClientSerializer, CommandeClientResumeSerializer
+from .utils.stock import reserver_stock
 
 
 class CommandeClientViewSet(viewsets.ModelViewSet):
@@ -300,6 +574,18 @@ class CommandeClientViewSet(viewsets.ModelViewSet):
     queryset = CommandeClient.objects.all()
     serializer_class = CommandeClientSerializer
 
+    def get_queryset(self):
+        # Client, TVA, vendeur et lignes chargés en un nombre fixe de requêtes
+        return CommandeClient.objects.select_related(
+            'client', 'tva', 'utilisateur'
+        ).prefetch_related('lignes__produit')
+
+    def get_serializer_class(self):
+        # ?lignes=resume : produit des lignes réduit à id + désignation
+        if self.action in ('list', 'retrieve') and self.request.query_params.get('lignes') == 'resume':
+            return CommandeClientResumeSerializer
+        return CommandeClientSerializer
+
     @transaction.atomic
     def create(self, request, *args, **kwargs):
         data = request.data.copy()
@@ -323,42 +609,40 @@ class CommandeClientViewSet(viewsets.ModelViewSet):
             produits_a_verifier = {}
             
             for line in lignes_data:
-                produit_id = line['produit_id']
+                produit_id = int(line['produit_id'])
                 quantite = int(line['quantite'])
-                
+
                 if quantite <= 0:
                     raise ValidationError(f"Quantité invalide pour le produit ID {produit_id}")
-                
+
                 if produit_id in produits_a_verifier:
                     produits_a_verifier[produit_id] += quantite
                 else:
                     produits_a_verifier[produit_id] = quantite
 
-            # Vérification du stock en une seule requête par produit
-            for produit_id, quantite_totale in produits_a_verifier.items():
-                produit = Produit.objects.select_for_update().get(id=produit_id)
-                if produit.quantite_stock < quantite_totale:
-                    raise ValidationError(
-                        f"Stock insuffisant pour {produit.designation}. "
-                        f"Stock actuel: {produit.quantite_stock}, "
-                        f"Quantité demandée: {quantite_totale}"
-                    )
-
         try:
             commande = serializer.save()
-            
-            # Mise à jour du stock pour les ventes directes
-            if is_vente_directe:
-                for produit_id, quantite_totale in produits_a_verifier.items():
-                    produit = Produit.objects.get(id=produit_id)
-                    produit.quantite_stock -= quantite_totale
-                    produit.save(update_fields=['quantite_stock'])
-
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-
         except Exception as e:
             raise APIException(f"Erreur lors de la création de la commande: {str(e)}")
 
+        # Décrément du stock en une seule requête, en fin de transaction
+        # pour tenir les verrous le moins longtemps possible
+        if is_vente_directe:
+            ruptures = reserver_stock(
+                produits_a_verifier,
+                utilisateur_id=request.user.id,
+                motif=f"Vente {commande.numero_commande}"
+            )
+            if ruptures:
+                raise ValidationError([
+                    f"Stock insuffisant pour {rupture['designation'] or rupture['produit_id']}. "
+                    f"Stock actuel: {rupture['quantite_stock']}, "
+                    f"Quantité demandée: {rupture['quantite_demandee']}"
+                    for rupture in ruptures
+                ])
+
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
         try:
             commande = serializer.save(utilisateur=request.user)
             print(f"Commande créée - ID: {commande.id}")
@@ -464,38 +748,30 @@ def statistiques_commandes(request):
         end_date = timezone.now().date()
         start_date = end_date - timedelta(days=days)
         
-        # Récupération des stats
-        stats_queryset = Statistique.objects.filter(
-            date__gte=start_date,
-            date__lte=end_date
-        ).order_by('date')
-        
-        # Calculs manuels des totaux
+        # Série lue dans la table pré-agrégée adaptée à la longueur de la
+        # période (heure, jour ou mois), forçable avec ?granularite=
+        granularite = request.GET.get('granularite')
+        if granularite not in (None, 'heure', 'jour', 'mois'):
+            return Response({
+                'success': False,
+                'error': "Granularité invalide (heure, jour ou mois)"
+            }, status=400)
+        granularite, start_date, daily_stats, totaux = serie_ventes(start_date, end_date, granularite)
+
         total_data = {
-            'total_ca': sum(s.montant_total for s in stats_queryset),
-            'total_ventes': sum(s.nb_ventes for s in stats_queryset),
-            'ventes_directes': sum(s.nb_ventes_directes for s in stats_queryset),
-            'commandes_clients': sum(s.nb_commandes_clients for s in stats_queryset),
-            'ca_ventes_directes': sum(s.montant_ventes_directes for s in stats_queryset),
-            'ca_commandes': sum(s.montant_commandes for s in stats_queryset),
-            'avg_ventes': sum(s.nb_ventes for s in stats_queryset) / days if days > 0 else 0
+            'total_ca': totaux['montant_total'],
+            'total_ventes': totaux['nb_ventes'],
+            'ventes_directes': totaux['nb_ventes_directes'],
+            'commandes_clients': totaux['nb_commandes_clients'],
+            'ca_ventes_directes': totaux['montant_ventes_directes'],
+            'ca_commandes': totaux['montant_commandes'],
+            'avg_ventes': totaux['nb_ventes'] / days if days > 0 else 0
         }
         
-        # Détails quotidiens
-        daily_stats = [
-            {
-                'date': s.date.strftime('%Y-%m-%d'),
-                'ca_ht': float(s.montant_total),
-                'ventes': s.nb_ventes,
-                'ventes_directes': s.nb_ventes_directes,
-                'commandes_clients': s.nb_commandes_clients
-            } for s in stats_queryset
-        ]
-        
         # Commandes récentes
         recent_commands = CommandeClient.objects.filter(
-            date_creation__gte=start_date
-        ).order_by('-date_creation')[:10]
+            date_creation__gte=bornes_periode(start_date, end_date)[0]
+        ).select_related('client').order_by('-date_creation')[:10]
         
         return Response({
             'success': True,
@@ -504,6 +780,7 @@ def statistiques_commandes(request):
                     'debut': start_date.strftime('%Y-%m-%d'),
                     'fin': end_date.strftime('%Y-%m-%d')
                 },
+                'granularite': granularite,
                 'stats_globales': total_data,
                 'stats_quotidiennes': daily_stats,
                 'commandes_recentes': [
@@ -718,12 +995,13 @@ class BarcodeConsumer(AsyncWebsocketConsumer):
 def scan_barcode(request):
     if request.method == 'POST':
         barcode = request.POST.get('barcode')
-        
+        produit = rechercher_par_code_barre(barcode) if barcode else None
+
         # Envoi temps réel via WebSocket
         channel_layer = get_channel_layer()
         async_to_sync(channel_layer.group_send)(
             "barcode_group",
-            {"type": "broadcast_barcode", "data": {"barcode": barcode}}
+            {"type": "broadcast_barcode", "data": {"barcode": barcode, "produit": produit}}
         )
         
         return JsonResponse({"status": "success"})
@@ -737,19 +1015,77 @@ class CommandeViewSet(viewsets.ModelViewSet):
     authentication_classes = [JWTAuthentication]
     queryset = Commande.objects.all()
     serializer_class = CommandeSerializer
+    pagination_class = CommandePagination
+
+    # Tris autorisés via ?ordering= (préfixe "-" pour décroissant)
+    TRIS = ('date_creation', 'prix_total', 'date_validation', 'code_commande')
+
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().prefetch_related('lignes__produit')
         
         # Filtres possibles
         fournisseur = self.request.query_params.get('fournisseur')
         statut = self.request.query_params.get('statut')
+        prix_min = self.request.query_params.get('prix_min')
+        prix_max = self.request.query_params.get('prix_max')
         
         if fournisseur:
             queryset = queryset.filter(fournisseur_id=fournisseur)
         if statut:
             queryset = queryset.filter(statut=statut)
-            
-        return queryset.order_by('-date_creation')
+        try:
+            if prix_min:
+                queryset = queryset.filter(prix_total__gte=Decimal(prix_min))
+            if prix_max:
+                queryset = queryset.filter(prix_total__lte=Decimal(prix_max))
+        except InvalidOperation:
+            raise ValidationError({'prix': "prix_min et prix_max doivent être des nombres"})
+
+        tri = self.request.query_params.get('ordering', '-date_creation')
+        if tri.lstrip('-') not in self.TRIS:
+            tri = '-date_creation'
+        # L'id départage les égalités pour une pagination stable
+        return queryset.order_by(tri, '-id' if tri.startswith('-') else 'id')
+
+    @action(detail=True, methods=['post'])
+    @transaction.atomic
+    def reception(self, request, pk=None):
+        """
+        Réception (partielle ou totale) d'une commande fournisseur :
+        {"lignes": [{"ligne": <id>, "quantite": <reçue>}], "motif": "..."}
+        """
+        commande = get_object_or_404(Commande.objects.select_for_update(), pk=pk)
+        if commande.statut != 'VALIDEE':
+            return Response(
+                {'error': f"Seule une commande validée peut être réceptionnée (statut: {commande.get_statut_display()})"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        quantites = {}
+        try:
+            for ligne in request.data.get('lignes') or []:
+                ligne_id = int(ligne['ligne'])
+                quantites[ligne_id] = quantites.get(ligne_id, 0) + int(ligne['quantite'])
+        except (KeyError, TypeError, ValueError):
+            return Response(
+                {'error': "Chaque ligne doit indiquer 'ligne' (id) et 'quantite' (entier)"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not quantites:
+            return Response({'error': "Aucune ligne réceptionnée"}, status=status.HTTP_400_BAD_REQUEST)
+
+        erreurs, stocks = receptionner_commande(
+            commande, quantites,
+            utilisateur_id=request.user.id,
+            motif=request.data.get('motif')
+        )
+        if erreurs:
+            return Response({'error': "Réception refusée", 'lignes': erreurs}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'commande': self.get_serializer(self.get_queryset().get(pk=commande.pk)).data,
+            'stocks': stocks,
+        })
     
     
 from django.db.models import Sum, ExpressionWrapper, F, DecimalField, Q
@@ -761,6 +1097,7 @@ from rest_framework.response import Response
 from rest_framework import status
 from django.db.models import Sum, Count, F, Q, Avg, Max
 from django.db.models.functions import TruncDay, TruncMonth, Coalesce
+from django.core.paginator import Paginator
 from django.utils import timezone
 from datetime import datetime, timedelta
 import logging
@@ -781,6 +1118,8 @@ class RapportAPIView(APIView):
     """
     Vue API complète pour générer différents types de rapports
     """
+    # Les tâches en arrière-plan (api.tasks) calculent sans passer par le cache
+    utiliser_cache = True
 
     def get(self, request):
         report_type = request.query_params.get('type', 'ventes')
@@ -808,7 +1147,8 @@ class RapportAPIView(APIView):
             'clients': self._get_rapport_clients,
             'fournisseurs': self._get_rapport_fournisseurs,
             'utilisateurs': self._get_rapport_utilisateurs,
-            'statistiques_commandes': self.statistiques_commandes
+            'statistiques_commandes': self.statistiques_commandes,
+            'analyse_produits': self._get_analyse_produits,
         }
         
         if report_type not in handlers:
@@ -816,17 +1156,64 @@ class RapportAPIView(APIView):
                 {"error": "Type de rapport non supporté"},
                 status=status.HTTP_400_BAD_REQUEST
             )
-            
-        return handlers[report_type](start_date, end_date, request)
+
+        if not self.utiliser_cache:
+            return handlers[report_type](start_date, end_date, request)
+
+        # Cache par (type, période, portée) ; paramètres annexes (page...) inclus
+        cle, duree = cle_rapport(
+            report_type, start_date, end_date,
+            portee=getattr(request.user, 'role', ''),
+            parametres=[
+                (nom, valeur) for nom, valeur in request.query_params.items()
+                if nom not in ('type', 'debut', 'fin')
+            ]
+        )
+        reponses = []
+
+        def calculer():
+            reponse = handlers[report_type](start_date, end_date, request)
+            reponses.append(reponse)
+            return reponse.data if reponse.status_code == status.HTTP_200_OK else None
+
+        data = rapport_en_cache(cle, duree, calculer)
+        if data is None:
+            return reponses[-1]
+        return Response(data)
     
     
+    # Taille de page maximale des rapports paginés (?page_size=)
+    TAILLE_PAGE_MAX = 500
+
+    def _paginer(self, objets, request):
+        """
+        Pagination optionnelle (?page=&page_size=), page_size ramené à
+        TAILLE_PAGE_MAX. Retourne (objets de la page, infos de pagination
+        ou None). ValueError si page_size n'est pas un entier positif.
+        """
+        page_size = request.query_params.get('page_size')
+        if not page_size:
+            return list(objets), None
+        try:
+            page_size = int(page_size)
+        except ValueError:
+            page_size = 0
+        if page_size < 1:
+            raise ValueError("page_size doit être un entier positif")
+
+        page = Paginator(objets, min(page_size, self.TAILLE_PAGE_MAX)).get_page(request.query_params.get('page'))
+        return list(page.object_list), {
+            "page": page.number,
+            "page_size": page.paginator.per_page,
+            "total": page.paginator.count,
+            "pages": page.paginator.num_pages,
+        }
+
     def _get_top_produits(self, start_date, end_date):
         """Version finale avec protection contre les doublons"""
         # 1. Récupération des IDs de commandes valides
-        commande_ids = CommandeClient.objects.filter(
-            date_creation__date__gte=start_date,
-            date_creation__date__lte=end_date,
-            statut='VALIDEE'
+        commande_ids = commandes_clients_periode(
+            start_date, end_date, statut='VALIDEE'
         ).values_list('id', flat=True)
 
         # 2. Agrégation des lignes
@@ -845,6 +1232,56 @@ class RapportAPIView(APIView):
         )
 
 
+    def _stats_quotidiennes(self, commandes, start_date, end_date):
+        """
+        Série quotidienne des ventes en une requête groupée par jour ;
+        les jours sans vente sont complétés à zéro en mémoire.
+        Retourne (stats_quotidiennes, totaux de la période).
+        """
+        par_jour = {
+            ligne['jour'].date(): ligne
+            for ligne in commandes
+            .annotate(jour=TruncDay('date_creation'))
+            .values('jour')
+            .annotate(
+                ca_ht=Sum('total_commande'),
+                ca_ventes_directes=Sum('total_commande', filter=Q(is_vente_directe=True)),
+                ventes=Count('id'),
+                ventes_directes=Count('id', filter=Q(is_vente_directe=True))
+            )
+            .order_by('jour')
+        }
+
+        totaux = {
+            'total_ca': Decimal('0'),
+            'ca_ventes_directes': Decimal('0'),
+            'total_ventes': 0,
+            'ventes_directes': 0,
+        }
+        stats_quotidiennes = []
+        current_date = start_date
+        while current_date <= end_date:
+            ligne = par_jour.get(current_date, {})
+            ca_ht = ligne.get('ca_ht') or Decimal('0')
+            ventes = ligne.get('ventes', 0)
+            ventes_directes = ligne.get('ventes_directes', 0)
+
+            totaux['total_ca'] += ca_ht
+            totaux['ca_ventes_directes'] += ligne.get('ca_ventes_directes') or Decimal('0')
+            totaux['total_ventes'] += ventes
+            totaux['ventes_directes'] += ventes_directes
+
+            stats_quotidiennes.append({
+                'date': current_date.strftime('%Y-%m-%d'),
+                'ca_ht': float(ca_ht),
+                'ventes': ventes,
+                'ventes_directes': ventes_directes,
+                'commandes_clients': ventes - ventes_directes
+            })
+            current_date += timedelta(days=1)
+
+        return stats_quotidiennes, totaux
+
     def statistiques_commandes(self, start_date, end_date, request):
         """Génère les statistiques des commandes"""
         try:
@@ -854,47 +1291,22 @@ class RapportAPIView(APIView):
             days = (end_date - start_date).days + 1  # Nombre de jours inclusifs
 
             # Récupération des commandes valides dans la période
-            commandes = CommandeClient.objects.filter(
-                date_creation__date__gte=start_date,
-                date_creation__date__lte=end_date,
-            )
+            commandes = commandes_clients_periode(start_date, end_date)
 
-            # Calcul des statistiques globales
-            total_ca = commandes.aggregate(total=Sum('total_commande'))['total'] or 0
-            total_ventes = commandes.count()
-            
-            ventes_directes = commandes.filter(is_vente_directe=True).count()
-            commandes_clients = commandes.filter(is_vente_directe=False).count()
-            
-            ca_ventes_directes = commandes.filter(
-                is_vente_directe=True
-            ).aggregate(total=Sum('total_commande'))['total'] or 0
-            
-            ca_commandes = commandes.filter(
-                is_vente_directe=False
-            ).aggregate(total=Sum('total_commande'))['total'] or 0
-            
-            avg_ventes = total_ventes / days if days > 0 else 0
+            # Données quotidiennes et totaux en une seule requête groupée
+            stats_quotidiennes, totaux = self._stats_quotidiennes(commandes, start_date, end_date)
 
-            # Préparation des données quotidiennes
-            stats_quotidiennes = []
-            current_date = start_date
-            while current_date <= end_date:
-                daily_commandes = commandes.filter(date_creation__date=current_date)
-                daily_ca = daily_commandes.aggregate(total=Sum('total_commande'))['total'] or 0
-                daily_ventes = daily_commandes.count()
-                
-                stats_quotidiennes.append({
-                    'date': current_date.strftime('%Y-%m-%d'),
-                    'ca_ht': float(daily_ca),
-                    'ventes': daily_ventes,
-                    'ventes_directes': daily_commandes.filter(is_vente_directe=True).count(),
-                    'commandes_clients': daily_commandes.filter(is_vente_directe=False).count()
-                })
-                current_date += timedelta(days=1)
+            total_ca = totaux['total_ca']
+            total_ventes = totaux['total_ventes']
+            ventes_directes = totaux['ventes_directes']
+            commandes_clients = total_ventes - ventes_directes
+            ca_ventes_directes = totaux['ca_ventes_directes']
+            ca_commandes = total_ca - ca_ventes_directes
+
+            avg_ventes = total_ventes / days if days > 0 else 0
 
             # Commandes récentes (10 dernières)
-            recent_commands = commandes.order_by('-date_creation')[:10]
+            recent_commands = commandes.select_related('client').order_by('-date_creation')[:10]
 
             return Response({
                 'success': True,
@@ -954,44 +1366,15 @@ class RapportAPIView(APIView):
             days = (end_date - start_date).days + 1
 
             # Requête de base pour les commandes validées
-            commandes = CommandeClient.objects.filter(
-                date_creation__date__gte=start_date,
-                date_creation__date__lte=end_date,
-                statut='VALIDEE'
-            )
+            commandes = commandes_clients_periode(start_date, end_date, statut='VALIDEE')
 
-            # Statistiques globales (en une seule requête)
-            stats_globales = commandes.aggregate(
-                total_ca=Sum('total_commande'),
-                total_ventes=Count('id'),
-                ventes_directes=Count('id', filter=Q(is_vente_directe=True)),
-                ca_ventes_directes=Sum('total_commande', filter=Q(is_vente_directe=True))
-            )
+            # Statistiques quotidiennes et globales (en une seule requête groupée)
+            stats_quotidiennes, totaux = self._stats_quotidiennes(commandes, start_date, end_date)
 
-            # Calcul des dérivés
-            total_ca = stats_globales['total_ca'] or 0
-            ca_ventes_directes = stats_globales['ca_ventes_directes'] or 0
-            total_ventes = stats_globales['total_ventes'] or 0
-            ventes_directes = stats_globales['ventes_directes'] or 0
-
-            # Statistiques quotidiennes
-            stats_quotidiennes = []
-            current_date = start_date
-            while current_date <= end_date:
-                daily_stats = commandes.filter(date_creation__date=current_date).aggregate(
-                    ca_ht=Sum('total_commande'),
-                    ventes=Count('id'),
-                    ventes_directes=Count('id', filter=Q(is_vente_directe=True))
-                )
-                
-                stats_quotidiennes.append({
-                    'date': current_date.strftime('%Y-%m-%d'),
-                    'ca_ht': float(daily_stats['ca_ht'] or 0),
-                    'ventes': daily_stats['ventes'] or 0,
-                    'ventes_directes': daily_stats['ventes_directes'] or 0,
-                    'commandes_clients': (daily_stats['ventes'] or 0) - (daily_stats['ventes_directes'] or 0)
-                })
-                current_date += timedelta(days=1)
+            total_ca = totaux['total_ca']
+            ca_ventes_directes = totaux['ca_ventes_directes']
+            total_ventes = totaux['total_ventes']
+            ventes_directes = totaux['ventes_directes']
 
             top_produits = self._get_top_produits(start_date, end_date)
 
@@ -1047,10 +1430,13 @@ class RapportAPIView(APIView):
     def _get_rapport_produits(self, start_date, end_date, request):
         """Génère le rapport des produits/stock"""
         try:
-            # Produits en rupture
+            # Produits en rupture (sous le point de commande calculé, sinon le seuil manuel)
             produits_rupture = Produit.objects.filter(
-                quantite_stock__lte=F('seuil_alerte')
-            ).values('id', 'designation', 'quantite_stock', 'seuil_alerte')
+                quantite_stock__lte=Produit.expression_seuil()
+            ).values(
+                'id', 'designation', 'quantite_stock', 'seuil_alerte',
+                'point_commande', 'quantite_suggeree', 'demande_prevue'
+            )
             
             # Top produits
             top_produits = self._get_top_produits(start_date, end_date)
@@ -1080,6 +1466,53 @@ class RapportAPIView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def _get_analyse_produits(self, start_date, end_date, request):
+        """
+        Analyse de tout le catalogue (ABC, marge, écoulement, couverture,
+        ruptures) ; ?classe=A|B|C pour filtrer, ?page=&page_size= facultatifs.
+        Période : debut et fin, ou aucun des deux (30 derniers jours), au
+        plus PERIODE_MAX_ANALYSE jours (tableaux produits x jours en mémoire).
+        """
+        try:
+            if bool(start_date) != bool(end_date):
+                raise ValueError("Indiquer debut et fin, ou aucun des deux")
+            if not start_date:
+                end_date = timezone.localdate()
+                start_date = end_date - timedelta(days=30)
+            if (end_date - start_date).days + 1 > PERIODE_MAX_ANALYSE:
+                raise ValueError(f"Période limitée à {PERIODE_MAX_ANALYSE} jours")
+
+            produits, resume = analyse_produits(start_date, end_date)
+
+            classe = request.query_params.get('classe')
+            if classe:
+                produits = [produit for produit in produits if produit['classe_abc'] == classe]
+
+            produits, pagination = self._paginer(produits, request)
+
+            return Response({
+                "success": True,
+                "data": {
+                    "resume": resume,
+                    "produits": produits,
+                    "pagination": pagination,
+                    "periode": {
+                        "debut": start_date.strftime('%Y-%m-%d'),
+                        "fin": end_date.strftime('%Y-%m-%d')
+                    }
+                }
+            })
+
+        except (ValueError, OverflowError) as e:
+            # OverflowError : bornes au-delà de date.max
+            return Response({"success": False, "error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Erreur analyse produits: {str(e)}", exc_info=True)
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
     def _get_rapport_clients(self, start_date, end_date, request):
         """Génère le rapport clients"""
         try:
@@ -1093,20 +1526,22 @@ class RapportAPIView(APIView):
             if isinstance(end_date, str):
                 end_date = timezone.datetime.strptime(end_date, '%Y-%m-%d').date()
 
+            borne_debut, borne_fin = bornes_periode(start_date, end_date)
+
             # Clients actifs (ayant au moins une commande validée dans la période)
             clients_actifs = Client.objects.filter(
-                commandes__date_creation__date__gte=start_date,
-                commandes__date_creation__date__lte=end_date,
+                commandes__date_creation__gte=borne_debut,
+                commandes__date_creation__lt=borne_fin,
                 commandes__statut='VALIDEE'
             ).annotate(
                 total_commandes=Count('commandes', filter=Q(
-                    commandes__date_creation__date__gte=start_date,
-                    commandes__date_creation__date__lte=end_date,
+                    commandes__date_creation__gte=borne_debut,
+                    commandes__date_creation__lt=borne_fin,
                     commandes__statut='VALIDEE'
                 )),
                 total_ca=Sum('commandes__total_commande', filter=Q(
-                    commandes__date_creation__date__gte=start_date,
-                    commandes__date_creation__date__lte=end_date,
+                    commandes__date_creation__gte=borne_debut,
+                    commandes__date_creation__lt=borne_fin,
                     commandes__statut='VALIDEE'
                 ))
             ).exclude(
@@ -1117,8 +1552,8 @@ class RapportAPIView(APIView):
 
             # Répartition géographique (tous clients ayant commandé dans la période)
             repartition_geo = Client.objects.filter(
-                commandes__date_creation__date__gte=start_date,
-                commandes__date_creation__date__lte=end_date,
+                commandes__date_creation__gte=borne_debut,
+                commandes__date_creation__lt=borne_fin,
                 commandes__statut='VALIDEE'
             ).values(
                 'ville', 'pays'
@@ -1180,75 +1615,87 @@ class RapportAPIView(APIView):
 
     def _get_rapport_utilisateurs(self, start_date, end_date, request):
         try:
-            start_date = timezone.make_aware(datetime.combine(start_date, datetime_time.min))
-            end_date = timezone.make_aware(datetime.combine(end_date, datetime_time.max))
+            borne_debut, borne_fin = bornes_periode(start_date, end_date)
 
-            utilisateurs = Utilisateur.objects.all()
-            result = []
+            # Pagination optionnelle (?page=&page_size=) pour les grandes équipes
+            utilisateurs, pagination = self._paginer(Utilisateur.objects.order_by('id'), request)
+            utilisateur_ids = [u.id for u in utilisateurs]
 
             # Expression dynamique pour le total_ligne_ht
             total_expr = ExpressionWrapper(
                 F('lignes__prix_unitaire') * F('lignes__quantite'),
                 output_field=DecimalField()
             )
+            zero = Value(0, output_field=DecimalField())
 
-            for u in utilisateurs:
-                # --- Commandes Fournisseurs ---
-                commandes_fournisseur = Commande.objects.filter(
-                    utilisateur=u,
-                    date_creation__range=(start_date, end_date)
-                )
-                nb_commandes_fournisseur = commandes_fournisseur.count()
-
-                total_fournisseur = commandes_fournisseur.aggregate(
-                    total=Coalesce(Sum(total_expr), Value(0), output_field=DecimalField())
-                )['total'] or 0
-
-                fournisseurs = list(
-                    commandes_fournisseur.values_list('fournisseur__nom_fournisseur', flat=True).distinct()
+            # --- Commandes Fournisseurs (une requête groupée par utilisateur) ---
+            commandes_fournisseur = Commande.objects.filter(
+                utilisateur_id__in=utilisateur_ids,
+                date_creation__gte=borne_debut,
+                date_creation__lt=borne_fin
+            )
+            fournisseur_par_user = {
+                ligne['utilisateur_id']: ligne
+                for ligne in commandes_fournisseur
+                .values('utilisateur_id')
+                .annotate(
+                    nombre=Count('id', distinct=True),
+                    total=Coalesce(Sum(total_expr), zero)
                 )
+                .order_by()
+            }
 
-                # --- Commandes Clients (vente normale) ---
-                commandes_client = CommandeClient.objects.filter(
-                    utilisateur=u,
-                    date_creation__range=(start_date, end_date),
-                    is_vente_directe=False
+            noms_fournisseurs = {}
+            for utilisateur_id, nom in (
+                commandes_fournisseur
+                .values_list('utilisateur_id', 'fournisseur__nom_fournisseur')
+                .distinct()
+                .order_by()
+            ):
+                noms_fournisseurs.setdefault(utilisateur_id, []).append(nom)
+
+            # --- Commandes Clients et ventes directes (une requête groupée) ---
+            ventes_par_user = {
+                (ligne['utilisateur_id'], ligne['is_vente_directe']): ligne
+                for ligne in CommandeClient.objects.filter(
+                    utilisateur_id__in=utilisateur_ids,
+                    date_creation__gte=borne_debut,
+                    date_creation__lt=borne_fin
                 )
-                nb_commandes_client = commandes_client.count()
-                total_commande_client = commandes_client.aggregate(
-                    total=Coalesce(Sum(total_expr), Value(0), output_field=DecimalField())
-                )['total'] or 0
-
-                # --- Ventes directes ---
-                ventes_directes = CommandeClient.objects.filter(
-                    utilisateur=u,
-                    date_creation__range=(start_date, end_date),
-                    is_vente_directe=True
+                .values('utilisateur_id', 'is_vente_directe')
+                .annotate(
+                    nombre=Count('id', distinct=True),
+                    total=Coalesce(Sum(total_expr), zero)
                 )
-                nb_ventes_directes = ventes_directes.count()
-                total_ventes_directes = ventes_directes.aggregate(
-                    total=Coalesce(Sum(total_expr), Value(0), output_field=DecimalField())
-                )['total'] or 0
+                .order_by()
+            }
+
+            vide = {'nombre': 0, 'total': Decimal('0')}
+            result = []
+            for u in utilisateurs:
+                fournisseur = fournisseur_par_user.get(u.id, vide)
+                commandes_client = ventes_par_user.get((u.id, False), vide)
+                ventes_directes = ventes_par_user.get((u.id, True), vide)
 
                 # --- Total global CA ---
-                total_ca = total_commande_client + total_ventes_directes
+                total_ca = commandes_client['total'] + ventes_directes['total']
 
                 result.append({
                     "id": u.id,
                     "username": u.username,
                     "role": u.role,
                     "Commandes fournisseurs": {
-                        "nombre": nb_commandes_fournisseur,
-                        "total": round(total_fournisseur, 2),
-                        "fournisseurs": fournisseurs
+                        "nombre": fournisseur['nombre'],
+                        "total": round(fournisseur['total'], 2),
+                        "fournisseurs": noms_fournisseurs.get(u.id, [])
                     },
                     "Commandes clients effectuées": {
-                        "nombre": nb_commandes_client,
-                        "total": round(total_commande_client, 2)
+                        "nombre": commandes_client['nombre'],
+                        "total": round(commandes_client['total'], 2)
                     },
                     "Ventes directes effectuées": {
-                        "nombre": nb_ventes_directes,
-                        "total": round(total_ventes_directes, 2)
+                        "nombre": ventes_directes['nombre'],
+                        "total": round(ventes_directes['total'], 2)
                     },
                     "Chiffre d'affaires total": round(total_ca, 2),
                 })
@@ -1257,6 +1704,7 @@ class RapportAPIView(APIView):
                 "success": True,
                 "data": {
                     "utilisateurs": result,
+                    "pagination": pagination,
                     "periode": {
                         "debut": start_date.strftime('%Y-%m-%d'),
                         "fin": end_date.strftime('%Y-%m-%d')
@@ -1264,10 +1712,56 @@ class RapportAPIView(APIView):
                 }
             })
 
+        except ValueError as e:
+            return Response({"success": False, "error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.error(f"Erreur rapport utilisateurs: {str(e)}", exc_info=True)
             return Response({
                 "success": False,
-                "error": "Erreur lors du calcul du rapport des utilisateurs",
-                "details": str(e)
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+                "error": "Erreur lors du calcul du rapport des utilisateurs"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+from rest_framework import mixins
+from .models import TacheRapport
+from .serializers import TacheRapportSerializer
+from .tasks import soumettre_rapport
+
+class TacheRapportViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                          mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Rapports en arrière-plan, calculés par le worker `manage.py traiter_rapports` :
+    POST /api/rapports/taches/ {type_rapport, parametres: {debut, fin, ...}} -> 202 + id,
+    GET /api/rapports/taches/<id>/ pour suivre l'état,
+    GET /api/rapports/taches/<id>/resultat/ pour télécharger le rapport terminé.
+    """
+    serializer_class = TacheRapportSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        taches = TacheRapport.objects.filter(utilisateur=self.request.user)
+        if self.action != 'resultat':
+            taches = taches.defer('resultat')
+        return taches
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tache, _ = soumettre_rapport(
+            request.user, serializer.validated_data['type_rapport'],
+            serializer.validated_data.get('parametres', {})
+        )
+        return Response(self.get_serializer(tache).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def resultat(self, request, pk=None):
+        tache = self.get_object()
+        if tache.statut != 'TERMINEE':
+            return Response(
+                {"error": f"Rapport non disponible ({tache.get_statut_display()})", "statut": tache.statut,
+                 "details": tache.erreur},
+                status=status.HTTP_409_CONFLICT
+            )
+        reponse = Response(tache.resultat)
+        reponse['Content-Disposition'] = f'attachment; filename="rapport-{tache.type_rapport}-{tache.pk}.json"'
+        return reponse
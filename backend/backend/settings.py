@@ -249,6 +249,23 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Cache des rapports (api.utils.cache_rapports)
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Partagé par tous les processus (workers web, worker de rapports,
+    # commandes) : une invalidation faite par l'un vaut pour les autres.
+    # Pas de LocMemCache ici (cache par processus, voir api.W001)
+    "rapports": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",  # Table créée par la migration 0023
+        "LOCATION": "api_cache_rapports",
+        # "BACKEND": "django.core.cache.backends.redis.RedisCache",  # Alternative partagée
+        # "LOCATION": "redis://localhost:6379/1",
+        "OPTIONS": {"MAX_ENTRIES": 2000},
+    },
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -59,11 +59,13 @@ const ProductForm = ({ product, onSave, onCancel }) => {
           margin="normal"
           required
           fullWidth
-          label="Quantité en stock"
+          label={product?.id ? "Quantité en stock" : "Stock initial"}
           name="quantite_stock"
           type="number"
           value={formData.quantite_stock}
           onChange={handleChange}
+          disabled={!!product?.id}
+          helperText={product?.id ? "Modifiable par un mouvement de stock (ajustement)" : undefined}
           InputProps={{
             inputProps: { min: 0 }
           }}
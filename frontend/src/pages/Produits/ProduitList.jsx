@@ -224,9 +224,12 @@ function ProduitList() {
       const dataToSend = {
         designation: produitData.designation,
         prix_vente: Number(produitData.prix_vente),
-        quantite_stock: Number(produitData.quantite_stock),
         unite_mesure: produitData.unite_mesure,
       };
+      // Stock initial à la création seulement : ensuite, mouvements de stock
+      if (!isEdit) {
+        dataToSend.quantite_stock = Number(produitData.quantite_stock);
+      }
 
       const response = await fetch(url, {
         method: isEdit ? 'PUT' : 'POST',
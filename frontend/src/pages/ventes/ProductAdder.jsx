@@ -26,7 +26,7 @@ const ProductAdder = ({
     const fetchProducts = async () => {
       try {
         const token = localStorage.getItem('access_token');
-        const response = await fetch('/api/produits/', {
+        const response = await fetch('/api/produits/?fields=id,reference,designation,prix_vente,code_barre,quantite_stock', {
           headers: {
             Authorization: `Bearer ${token}`
           }